@@ -0,0 +1,1048 @@
+#!/usr/bin/env python3
+"""
+Scripts to benchmark the GPIO parts of the donkey tank
+
+Usage:
+    benchmark.py (script|gpio|transport|rc|driver|alloc|js|stop) [--loops=<n>] [--myconfig=<filename>] [--backend=<name>] [--stub] [--latency=<sec>] [--json=<filename>]
+
+Options:
+    -h --help               Show this screen.
+    --loops=<n>             Number of drivetrain updates per path. [default: 2000]
+    --myconfig=filename     Specify myconfig file to use.
+                            [default: myconfig.py]
+    --backend=<name>        GPIO backend (pigpio|gpiod|fake), defaults to GPIO_BACKEND in myconfig.
+    --stub                  Run against an in-process pigpiod stand-in (parts/pigpiod_stub.py)
+                            instead of the pigpiod given by PIGPIO_ADDR/PIGPIO_PORT.
+    --latency=<sec>         Response latency injected by the stand-in. [default: 0.0]
+    --json=<filename>       Store the results as JSON.
+
+The driver subcommand exits with status 1 when run_batch does not match run,
+and the alloc subcommand when a part allocates memory in a steady-state call.
+"""
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+
+from docopt import docopt
+
+import donkeycar as dk
+
+
+def make_trace(loops):
+    """
+    ジョイスティック操作を模したスロットル/ステアリング値の列を生成する。
+    引数：
+        loops       int     生成する件数
+    戻り値：
+        trace       list    (throttle, steering) のリスト
+    """
+    trace = []
+    for i in range(loops):
+        throttle = round(math.sin(i / 40.0), 2)
+        steering = round(math.sin(i / 97.0) * 0.8, 2)
+        trace.append((throttle, steering))
+    return trace
+
+
+def measure(func, trace, counter=None):
+    """
+    trace の各値で func を呼び出し、呼び出しごとの処理時間を計測する。
+    引数：
+        func        callable    func(throttle, steering) の形式で呼び出す関数
+        trace       list        (throttle, steering) のリスト
+        counter     callable    送信済みコマンド数を返却する関数、Noneの場合コマンド数は計測しない
+    戻り値：
+        stats       dict        calls/sec、commands/sec、p50/p99/max(マイクロ秒)
+    """
+    times = []
+    commands = counter() if counter is not None else 0
+    start = time.perf_counter()
+    for throttle, steering in trace:
+        t0 = time.perf_counter_ns()
+        func(throttle, steering)
+        times.append(time.perf_counter_ns() - t0)
+    elapsed = time.perf_counter() - start
+    commands = counter() - commands if counter is not None else None
+    times.sort()
+    return {
+        'calls': len(times),
+        'calls_per_sec': len(times) / elapsed if elapsed > 0 else 0.0,
+        'commands': commands,
+        'commands_per_sec': commands / elapsed \
+            if commands is not None and elapsed > 0 else None,
+        'p50_us': times[len(times) // 2] / 1000.0,
+        'p99_us': times[min(len(times) - 1, int(len(times) * 0.99))] / 1000.0,
+        'max_us': times[-1] / 1000.0,
+    }
+
+
+def print_stats(name, stats):
+    commands = '{:>10.1f} cmds/s'.format(stats['commands_per_sec']) \
+        if stats.get('commands_per_sec') is not None else '{:>17}'.format('')
+    print('{:<24} {:>10.1f} calls/s {}  p50 {:>9.1f}us  p99 {:>9.1f}us  max {:>9.1f}us'.format(
+        name, stats['calls_per_sec'], commands, stats['p50_us'], stats['p99_us'], stats['max_us']))
+
+
+def start_stub(latency):
+    """
+    pigpiod 互換サーバを同一プロセス内で起動し、以降に生成する
+    パーツがそのサーバへ接続するよう環境変数 PIGPIO_ADDR/PIGPIO_PORT/
+    PIGPIO_PIPE_DIR を設定する。パイプは一時ディレクトリに生成する。
+    引数：
+        latency     float   応答前に挿入する遅延(秒)
+    戻り値：
+        stub        PigpiodStub     起動したサーバ
+    """
+    from parts.pigpiod_stub import PigpiodStub
+    stub = PigpiodStub(host='localhost', port=0, latency=latency).start()
+    stub.serve_pipe(tempfile.mkdtemp(prefix='pigpio'))
+    os.environ['PIGPIO_ADDR'] = 'localhost'
+    os.environ['PIGPIO_PORT'] = str(stub.port)
+    os.environ['PIGPIO_PIPE_DIR'] = stub.pipe_dir
+    return stub
+
+
+def part_counter(*parts):
+    """
+    パーツの送信済みコマンド数の合計を返却する関数を生成する。
+    """
+    return lambda: sum(part.get_elision_stats()[0] for part in parts)
+
+
+def save_json(filename, cfg, args, results):
+    """
+    計測結果を実行条件とともにJSONファイルへ書き出す。
+    """
+    report = {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'host': platform.node(),
+        'python': platform.python_version(),
+        'loops': int(args['--loops']),
+        'backend': os.environ['GPIO_BACKEND'],
+        'stub': bool(args['--stub']),
+        'latency': float(args['--latency']),
+        'config': {key: getattr(cfg, key, None) for key in (
+            'PWM_FREQ', 'PWM_RANGE', 'PWM_HARDWARE', 'PIGPIO_TRANSPORT', 'PIGPIO_USE_BANK_WRITE',
+            'PIGPIO_WRITE_ELISION', 'PIGPIO_REFRESH_INTERVAL',
+            'PIGPIO_USE_DISPATCHER', 'PIGPIO_USE_MOTOR_SCRIPT')},
+        'results': results,
+    }
+    with open(filename, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('results written to {}'.format(filename))
+
+
+def bench_script(cfg, loops):
+    """
+    PIGPIO_MOTOR_SCRIPT のスクリプト経路とピンごとの経路を比較する。
+    pigpiod (もしくは互換サーバ)が起動している必要がある。
+    """
+    from parts import CaterpillerMotorDriver, PIGPIO_MOTOR_SCRIPT
+
+    driver = CaterpillerMotorDriver(
+        left_balance=cfg.LEFT_PWM_BALANCE, right_balance=cfg.RIGHT_PWM_BALANCE)
+    trace = make_trace(loops)
+    results = {}
+    for name, use_script in (('per-pin', False), ('script', True)):
+        motor = PIGPIO_MOTOR_SCRIPT(
+            left_pwm=cfg.LEFT_MOTOR_PWM_GPIO,
+            left_in1=cfg.LEFT_MOTOR_IN1_GPIO, left_in2=cfg.LEFT_MOTOR_IN2_GPIO,
+            right_pwm=cfg.RIGHT_MOTOR_PWM_GPIO,
+            right_in1=cfg.RIGHT_MOTOR_IN1_GPIO, right_in2=cfg.RIGHT_MOTOR_IN2_GPIO,
+            stby=cfg.TB6612_STBY_GPIO, freq=cfg.PWM_FREQ, range=cfg.PWM_RANGE,
+            hardware=cfg.PWM_HARDWARE, use_script=use_script)
+        if use_script and motor.script_id is None:
+            print('script path unavailable, skipped')
+            motor.shutdown()
+            continue
+        def update(throttle, steering):
+            motor.run(*driver.run(throttle, steering))
+        results[name] = measure(update, trace,
+            part_counter(motor, motor.bank, motor.left, motor.right))
+        print_stats(name, results[name])
+        motor.shutdown()
+    return results
+
+
+def bench_gpio(cfg, loops):
+    """
+    CaterpillerMotorDriver、PIGPIO_OUT（トレース記録あり/なし）、PIGPIO_PWM、PIGPIO_SPI_ADC 単体と
+    manage.py と同じ構成のドライブトレイン全体を、ジョイスティック操作を
+    模したトレースで駆動して計測する。ドライブトレインは Vehicle 経由でも
+    個別パーツ登録と TankDriveTrain の場合を計測する。
+    pigpiod (もしくは互換サーバ)が起動している必要がある。
+    """
+    from parts import CaterpillerMotorDriver, TankDriveTrain, PIGPIO_OUT, PIGPIO_OUT_BANK, PIGPIO_PWM, PIGPIO_TRACE, \
+        PIGPIO_STATS
+    from parts.pigpio_wrapper import PIGPIO_SPI_ADC, DEFAULT_TRACE_SIZE
+
+    driver = CaterpillerMotorDriver(
+        left_balance=cfg.LEFT_PWM_BALANCE, right_balance=cfg.RIGHT_PWM_BALANCE)
+    trace = make_trace(loops)
+    outputs = [driver.run(throttle, steering) for throttle, steering in trace]
+    pin_opts = dict(elision=cfg.PIGPIO_WRITE_ELISION,
+        refresh_interval=cfg.PIGPIO_REFRESH_INTERVAL)
+    results = {}
+
+    def report(name, stats):
+        results[name] = stats
+        print_stats(name, stats)
+
+    report('driver', measure(driver.run, trace))
+
+    out = PIGPIO_OUT(pin=cfg.LEFT_MOTOR_IN1_GPIO, **pin_opts)
+    values = iter([o[1] for o in outputs])
+    report('out', measure(lambda t, s: out.run(next(values)), trace, part_counter(out)))
+    out.shutdown()
+
+    # トレース記録のオーバーヘッド（out と比較する）
+    recorder = PIGPIO_TRACE(size=cfg.PIGPIO_TRACE_SIZE or DEFAULT_TRACE_SIZE)
+    out = PIGPIO_OUT(pin=cfg.LEFT_MOTOR_IN1_GPIO, trace=recorder, **pin_opts)
+    values = iter([o[1] for o in outputs])
+    report('out+trace', measure(lambda t, s: out.run(next(values)), trace, part_counter(out)))
+    out.shutdown()
+
+    pwm = PIGPIO_PWM(pin=cfg.LEFT_MOTOR_PWM_GPIO, freq=cfg.PWM_FREQ, range=cfg.PWM_RANGE,
+        hardware=cfg.PWM_HARDWARE, **pin_opts)
+    values = iter([o[0] for o in outputs])
+    report('pwm', measure(lambda t, s: pwm.run(next(values)), trace, part_counter(pwm)))
+    pwm.shutdown()
+
+    # 8チャネルを read_all（1往復）とチャネルごとの read_volts（8往復）で比較する
+    adc = PIGPIO_SPI_ADC()
+    channels = list(range(8))
+    adc_calls = [0]
+    def read_adc(throttle, steering):
+        adc.read_all(channels)
+        adc_calls[0] += 1
+    report('adc', measure(read_adc, trace, lambda: adc_calls[0] * len(channels)))
+    adc_calls[0] = 0
+    def read_adc_channels(throttle, steering):
+        for channel in channels:
+            adc.read_volts(channel)
+        adc_calls[0] += 1
+    report('adc/per-channel', measure(read_adc_channels, trace,
+        lambda: adc_calls[0] * len(channels)))
+    adc.shutdown()
+
+    if cfg.PIGPIO_USE_BANK_WRITE:
+        pins = [PIGPIO_OUT_BANK(
+            left_in1=cfg.LEFT_MOTOR_IN1_GPIO, left_in2=cfg.LEFT_MOTOR_IN2_GPIO,
+            right_in1=cfg.RIGHT_MOTOR_IN1_GPIO, right_in2=cfg.RIGHT_MOTOR_IN2_GPIO,
+            stby=cfg.TB6612_STBY_GPIO, **pin_opts)]
+        def write_pins(in1, in2, in3, in4):
+            pins[0].run(in1, in2, in3, in4)
+    else:
+        pins = [PIGPIO_OUT(pin=pin, **pin_opts) for pin in (
+            cfg.LEFT_MOTOR_IN1_GPIO, cfg.LEFT_MOTOR_IN2_GPIO,
+            cfg.RIGHT_MOTOR_IN1_GPIO, cfg.RIGHT_MOTOR_IN2_GPIO)]
+        def write_pins(*values):
+            for pin, value in zip(pins, values):
+                pin.run(value)
+    left = PIGPIO_PWM(pin=cfg.LEFT_MOTOR_PWM_GPIO, freq=cfg.PWM_FREQ, range=cfg.PWM_RANGE,
+        hardware=cfg.PWM_HARDWARE, **pin_opts)
+    right = PIGPIO_PWM(pin=cfg.RIGHT_MOTOR_PWM_GPIO, freq=cfg.PWM_FREQ, range=cfg.PWM_RANGE,
+        hardware=cfg.PWM_HARDWARE, **pin_opts)
+    def update(throttle, steering):
+        left_vref, left_in1, left_in2, right_vref, right_in1, right_in2 = \
+            driver.run(throttle, steering)
+        write_pins(left_in1, left_in2, right_in1, right_in2)
+        left.run(left_vref)
+        right.run(right_vref)
+    stats = PIGPIO_STATS(parts=[left, right] + pins)
+    stats.run()
+    report('drivetrain', measure(update, trace, part_counter(left, right, *pins)))
+    # pigpiod 呼び出しの操作ごとの内訳
+    calls, total_us, max_us, detail = stats.run()
+    for key, (count, total, longest) in sorted(detail.items()):
+        print('  {:<28} {:>8} calls  avg {:>8.1f}us  max {:>8.1f}us'.format(
+            key, count, total / count, longest))
+
+    # Vehicle.update_parts 経由の1ループ（個別パーツ登録と TankDriveTrain の比較）
+    from donkeycar.vehicle import Vehicle
+    motor_keys = ['left_motor_vref', 'left_motor_in1', 'left_motor_in2',
+        'right_motor_vref', 'right_motor_in1', 'right_motor_in2']
+    separate = Vehicle()
+    separate.add(driver, inputs=['throttle', 'angle'], outputs=motor_keys)
+    if cfg.PIGPIO_USE_BANK_WRITE:
+        separate.add(pins[0], inputs=['left_motor_in1', 'left_motor_in2',
+            'right_motor_in1', 'right_motor_in2'])
+        drive_opts = {'bank': pins[0]}
+    else:
+        for pin, key in zip(pins, ['left_motor_in1', 'left_motor_in2',
+            'right_motor_in1', 'right_motor_in2']):
+            separate.add(pin, inputs=[key])
+        drive_opts = {'in_pins': pins}
+    separate.add(left, inputs=['left_motor_vref'])
+    separate.add(right, inputs=['right_motor_vref'])
+    fused = Vehicle()
+    fused.add(TankDriveTrain(driver, left_pwm=left, right_pwm=right, **drive_opts),
+        inputs=['throttle', 'angle'])
+    for name, vehicle in (('vehicle/parts', separate), ('vehicle/fused', fused)):
+        def step(throttle, steering):
+            vehicle.mem.put(['throttle', 'angle'], [throttle, steering])
+            vehicle.update_parts()
+        report(name, measure(step, trace, part_counter(left, right, *pins)))
+
+    for part in [left, right] + pins:
+        part.shutdown()
+    return results
+
+
+def bench_transport(cfg, loops):
+    """
+    write/set_PWM_dutycycle/read の1コマンドあたりの遅延を
+    ソケット経由とパイプ経由(/dev/pigpio, /dev/pigout)で比較する。
+    パイプが存在しない場合はパイプ経由の計測を省略する。
+    """
+    from parts.pigpio_connection import acquire, release
+
+    trace = make_trace(loops)
+    pin = cfg.LEFT_MOTOR_IN1_GPIO
+    pwm_pin = cfg.LEFT_MOTOR_PWM_GPIO
+    results = {}
+    for transport in ('socket', 'pipe'):
+        try:
+            pgio = acquire(transport=transport)
+        except (OSError, ConnectionError) as e:
+            print('{} transport unavailable ({}), skipped'.format(transport, str(e)))
+            continue
+        pgio.set_mode(pin, 1)
+        pgio.set_PWM_range(pwm_pin, cfg.PWM_RANGE)
+        ops = (
+            ('write', lambda t, s: pgio.write(pin, 1 if t > 0 else 0)),
+            ('set_PWM_dutycycle', lambda t, s: pgio.set_PWM_dutycycle(
+                pwm_pin, int(abs(t) * cfg.PWM_RANGE))),
+            ('read', lambda t, s: pgio.read(pin)),
+        )
+        for op, func in ops:
+            name = '{}/{}'.format(transport, op)
+            results[name] = measure(func, trace)
+            print_stats(name, results[name])
+        pgio.write(pin, 0)
+        pgio.set_PWM_dutycycle(pwm_pin, 0)
+        release(pgio)
+    return results
+
+
+def bench_rc(cfg, loops):
+    """
+    RCレシーバ3チャネル(50Hz)の1ループ分の通知レポートを、pigpio.pi の
+    通知スレッドと同じくレポートごとに解析してピンごとのコールバック
+    （RCReceiver と同じ1エッジ1呼び出し）で処理した場合と、
+    PIGPIO_RC_RECEIVER で一括デコードした場合とで比較する。
+    レポートは合成したものを使用するため pigpiod は不要。
+    """
+    import struct
+    from parts import PIGPIO_RC_RECEIVER
+    from parts.gpio_backend import tick_diff
+    from parts.pigpio_connection import acquire, release
+
+    pins = [cfg.STEERING_RC_GPIO, cfg.THROTTLE_RC_GPIO, cfg.DATA_WIPER_RC_GPIO]
+    trace = make_trace(loops)
+    loop_us = int(1000000 / cfg.DRIVE_LOOP_HZ)
+    # 1ループ分の通知レポート
+    batches = []
+    tick = 0
+    levels = 0
+    for throttle, steering in trace:
+        reports = bytearray()
+        end = tick + loop_us
+        while tick < end:
+            for pin, value in zip(pins, (steering, throttle, -1.0)):
+                for level, offset in ((1, 0), (0, int(1500 + 500 * value))):
+                    levels = levels | (1 << pin) if level else levels & ~(1 << pin)
+                    reports += struct.pack('HHII', 0, 0, (tick + offset) & 0xffffffff, levels)
+                tick += 2500
+            tick += 20000 - 3 * 2500
+        batches.append(bytes(reports))
+    results = {}
+
+    # pigpio.pi の通知スレッドと同じく、レポートごとに解析してコールバックを呼び出す
+    high = {}
+    widths = {}
+    def on_edge(gpio, level, tick):
+        if level == 1:
+            high[gpio] = tick
+        elif gpio in high:
+            widths[gpio] = tick_diff(high[gpio], tick)
+    callbacks = [(1 << pin, pin, on_edge) for pin in pins]
+    last_level = [0]
+    it = iter(batches)
+    def run_callbacks(throttle, steering):
+        data = next(it)
+        for offset in range(0, len(data), 12):
+            seq, flags, tick, level = struct.unpack('HHII', data[offset:offset + 12])
+            if flags == 0:
+                changed = level ^ last_level[0]
+                last_level[0] = level
+                for bit, gpio, func in callbacks:
+                    if bit & changed:
+                        func(gpio, 1 if bit & level else 0, tick)
+    results['rc/callback'] = measure(run_callbacks, trace)
+    print_stats('rc/callback', results['rc/callback'])
+
+    pgio = acquire(backend='fake')
+    rc = PIGPIO_RC_RECEIVER(pins, pgio=pgio, timeout=float('inf'))
+    it = iter(batches)
+    def run_notify(throttle, steering):
+        rc.feed(next(it))
+        rc.run()
+    results['rc/notify'] = measure(run_notify, trace)
+    print_stats('rc/notify', results['rc/notify'])
+    print('widths callback:{} notify:{}'.format(
+        str([widths.get(pin) for pin in pins]), str(rc.widths.tolist())))
+    rc.shutdown()
+    release(pgio)
+    return results
+
+
+def check_driver_batch(loops):
+    """
+    CaterpillerMotorDriver.run_batch の結果が run の結果とビット単位で一致することを、
+    境界値（範囲外、±0.0、inf、nan、None）とランダム値、複数のバランス値で確認する。
+    戻り値：
+        mismatches  int     一致しなかった要素数
+    """
+    import itertools
+    import random
+    import numpy as np
+    from parts import CaterpillerMotorDriver
+
+    edges = [None, float('nan'), float('inf'), -float('inf'), -1.5, -1.0, -0.5,
+        -1e-300, -0.0, 0.0, 1e-300, 0.25, 0.5, 1.0, 1.5]
+    pairs = list(itertools.product(edges, edges))
+    rnd = random.Random(0)
+    pairs += [(rnd.uniform(-1.2, 1.2), rnd.uniform(-1.2, 1.2)) for _ in range(loops)]
+    throttle = np.array([p[0] for p in pairs], dtype=object)
+    steering = np.array([p[1] for p in pairs], dtype=object)
+    mismatches = 0
+    for left_balance, right_balance in ((1.0, 1.0), (0.85, 1.0), (1.0, 0.3), (0.0, 2.0),
+        (-0.5, None)):
+        driver = CaterpillerMotorDriver(left_balance=left_balance, right_balance=right_balance)
+        expected = [driver.run(t, s) for t, s in pairs]
+        actual = driver.run_batch(throttle, steering)
+        for i, values in enumerate(actual):
+            want = np.array([e[i] for e in expected], dtype=values.dtype)
+            if values.dtype == np.float64:
+                same = (values.view(np.int64) == want.view(np.int64)) | \
+                    (np.isnan(values) & np.isnan(want))
+            else:
+                same = values == want
+            for j in np.nonzero(~same)[0][:5]:
+                print('mismatch balance:({}, {}) input:{} output[{}] run:{} run_batch:{}'.format(
+                    str(left_balance), str(right_balance), str(pairs[j]), str(i),
+                    str(want[j]), str(values[j])))
+            mismatches += int((~same).sum())
+        driver.shutdown()
+    print('run_batch equivalence: {} samples x 5 balances, {} mismatches'.format(
+        str(len(pairs)), str(mismatches)))
+    return mismatches
+
+
+def bench_driver(cfg, loops):
+    """
+    CaterpillerMotorDriver.run_batch を run と照合した後、
+    1サンプルあたりの変換時間を run と run_batch で比較する。
+    （入力を量子化して変換表を引く方式は、201分割で約20%の短縮にとどまり、
+    小さいスロットル値などで IN1/IN2 が正確な変換と食い違うため採用していない）
+    """
+    import numpy as np
+    from parts import CaterpillerMotorDriver
+
+    results = {'mismatches': check_driver_batch(loops)}
+    driver = CaterpillerMotorDriver(
+        left_balance=cfg.LEFT_PWM_BALANCE, right_balance=cfg.RIGHT_PWM_BALANCE)
+    trace = make_trace(loops)
+    throttle = np.array([t for t, s in trace])
+    steering = np.array([s for t, s in trace])
+    start = time.perf_counter()
+    for t, s in trace:
+        driver.run(t, s)
+    scalar = time.perf_counter() - start
+    start = time.perf_counter()
+    driver.run_batch(throttle, steering)
+    batch = time.perf_counter() - start
+    for name, elapsed in (('driver/run', scalar), ('driver/run_batch', batch)):
+        results[name] = {'samples': loops, 'samples_per_sec': loops / elapsed,
+            'ns_per_sample': elapsed * 1e9 / loops}
+        print('{:<24} {:>12.1f} samples/s  {:>9.1f}ns/sample'.format(
+            name, results[name]['samples_per_sec'], results[name]['ns_per_sample']))
+    return results
+
+
+class NullPi:
+    """
+    全メソッドが何もせず0を返却する pigpio.pi 互換クラス。
+    バックエンド側のメモリ確保を除外してパーツ自身の確保量を計測するために使用する。
+    """
+    connected = True
+
+    def __getattr__(self, name):
+        return self.noop
+
+    def noop(self, *args):
+        return 0
+
+
+def check_alloc(loops):
+    """
+    タンク駆動の各パーツの run を定常状態で loops 回呼び出し、
+    tracemalloc で1呼び出しごとの一時確保量のピーク（呼び出し前からの増分）を計測し、
+    0 であることを確認する。
+    例外はハードウェアPWMのみで、pigpio の hardware_PWM へ渡すサイクル値
+    （最大1,000,000の int）が呼び出しごとに確保されるため、整数1個分（実測）を許容する。
+    戻り値：
+        results     dict    ケース名 → ピーク/許容量(バイト)と判定
+    """
+    import random
+    import tracemalloc
+    from parts import CaterpillerMotorDriver, TankDriveTrain, PIGPIO_OUT, PIGPIO_PWM
+
+    class Duty:
+        value = 0
+
+    def measure(func, repeat=3):
+        """
+        func を values の各値で呼び出し、1呼び出しあたりの確保量のピークの最大値を返却する。
+        インタプリタの特殊化の再試行などで稀に一時確保が起きるため、
+        repeat 回計測して呼び出しごとに最小値をとり、毎回確保される量のみを対象とする。
+        """
+        # 前回送信値の辞書や小数のフリーリストが定常状態になるまでウォームアップする
+        for _ in range(2):
+            for v in values:
+                func(v)
+        tracemalloc.start()
+        for v in values:
+            func(v)
+        passes = []
+        # 計測用の変数の再代入で解放される整数が計上されないよう、
+        # ループ前にそれぞれ別の整数を代入しておく
+        start, peak = tracemalloc.get_traced_memory()
+        for _ in range(repeat):
+            peaks = [0] * len(values)
+            for i, v in enumerate(values):
+                start = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                func(v)
+                peak = tracemalloc.get_traced_memory()[1]
+                peaks[i] = peak - start
+            passes.append(peaks)
+        tracemalloc.stop()
+        return max(min(call) for call in zip(*passes))
+
+    pi = NullPi()
+    rnd = random.Random(0)
+    values = [rnd.uniform(-1.0, 1.0) for _ in range(loops)]
+    # ハードウェアPWMの許容量：257以上のサイクル値1個の生成で確保される量
+    duty = Duty()
+    def to_duty(v):
+        duty.value = int(1e6 * (1.0 + v))
+    int_bytes = measure(to_duty)
+
+    driver = CaterpillerMotorDriver(left_balance=0.9, right_balance=1.0)
+    out = PIGPIO_OUT(pin=5, pgio=pi, elision=True)
+    same = PIGPIO_OUT(pin=6, pgio=pi, elision=True)
+    pwm = PIGPIO_PWM(pin=12, pgio=pi, elision=True)
+    hw = PIGPIO_PWM(pin=13, pgio=pi, hardware=True)
+    drive = TankDriveTrain(CaterpillerMotorDriver(left_balance=0.9, right_balance=1.0),
+        left_pwm=PIGPIO_PWM(pin=18, pgio=pi, elision=True),
+        right_pwm=PIGPIO_PWM(pin=19, pgio=pi, elision=True),
+        in_pins=[PIGPIO_OUT(pin=pin, pgio=pi, elision=True) for pin in (20, 21, 22, 23)])
+    # (ケース名, 呼び出し, 許容量(バイト))
+    cases = [
+        ('driver/run', lambda v: driver.run(v, -v / 2), 0),
+        ('out/run', lambda v: out.run(v), 0),
+        ('out/elided', lambda v: same.run(1), 0),
+        ('pwm/run', lambda v: pwm.run(v), 0),
+        ('pwm/hardware', lambda v: hw.run(v), int_bytes),
+        ('drivetrain/fused', lambda v: drive.run(v, -v / 2), 0),
+    ]
+    results = {}
+    for name, func, budget in cases:
+        peak = measure(func)
+        ok = peak <= budget
+        results[name] = {'calls': loops, 'peak_bytes': peak,
+            'budget_bytes': budget, 'ok': ok}
+        print('{:<24} peak {:>6} bytes  budget {:>6} bytes  {}'.format(
+            name, str(peak), str(budget), 'OK' if ok else 'NG'))
+    return results
+
+
+def make_js_bursts(loops, burst):
+    """
+    アナログスティックを動かし続けた場合の /dev/input/js* のイベント列を、
+    Vehicle ループ1回分ずつ生成する。10ループに1回ボタンの押下/離脱を挟む。
+    引数：
+        loops       int     ループ数
+        burst       int     1ループあたりのアナログ入力イベント数
+    戻り値：
+        bursts      list    ループごとのイベントのバイト列
+    """
+    import struct
+    from parts.controller import JS_EVENT_FORMAT, JS_EVENT_AXIS, JS_EVENT_BUTTON
+
+    bursts = []
+    tval = 0
+    for i in range(loops):
+        events = []
+        for j in range(burst):
+            tval += 1
+            value = int(32767 * math.sin((i * burst + j) / 50.0))
+            # 左アナログ上下(1)と左右(0)を交互に動かす
+            events.append(struct.pack(JS_EVENT_FORMAT, tval, value, JS_EVENT_AXIS, j % 2))
+            if i % 10 == 0 and j == burst // 2:
+                # 右ボタン群：上（通常停止）の押下と離脱
+                events.append(struct.pack(JS_EVENT_FORMAT, tval, 1, JS_EVENT_BUTTON, 0))
+                events.append(struct.pack(JS_EVENT_FORMAT, tval, 0, JS_EVENT_BUTTON, 0))
+        bursts.append(b''.join(events))
+    return bursts
+
+
+def open_pipe_js(js):
+    """
+    Joystick の jsdev をパイプの読み出し側に差し替え、ボタン/アナログ入力の
+    割り当てを axis_names/button_names の先頭から順に設定する。
+    引数：
+        js          Joystick    対象のジョイスティック
+    戻り値：
+        fd          int         パイプの書き込み側
+    """
+    r, w = os.pipe()
+    js.jsdev = os.fdopen(r, 'rb')
+    js.axis_map = list(js.axis_names.values())
+    js.button_map = list(js.button_names.values())
+    js.axis_states = {name: 0.0 for name in js.axis_map}
+    js.button_states = {name: 0 for name in js.button_map}
+    return w
+
+
+def make_pipe_js_controller(cfg=None):
+    """
+    JC-U3912T の割り当て定義の MappedJoystickController を生成し、
+    ジョイスティックをパイプに差し替える。
+    引数：
+        cfg         config  設定、Noneの場合はスケール等を既定値とする
+    戻り値：
+        ctr         MappedJoystickController    対象のコントローラ（配列変換前）
+        w           int         パイプの書き込み側
+    """
+    from parts.controller import JOYSTICK_MAPPINGS, MappedJoystick, MappedJoystickController
+
+    mapping = JOYSTICK_MAPPINGS['JCU3912T']
+    if cfg is None:
+        ctr = MappedJoystickController(mapping, auto_record_on_throttle=False)
+    else:
+        ctr = MappedJoystickController(mapping, throttle_dir=cfg.JOYSTICK_THROTTLE_DIR,
+            throttle_scale=cfg.JOYSTICK_MAX_THROTTLE,
+            steering_scale=cfg.JOYSTICK_STEERING_SCALE, auto_record_on_throttle=False)
+    ctr.js = MappedJoystick(button_names=mapping['buttons'], axis_names=mapping['axes'])
+    w = open_pipe_js(ctr.js)
+    return ctr, w
+
+
+def dispatch_by_name(ctr, button, button_state, axis, axis_val):
+    """
+    donkeycar の JoystickController.update と同じく、poll() の戻り値の名前で
+    trigger map を引いて関数を呼び出す（配列変換前の処理）。
+    """
+    if axis is not None and axis in ctr.axis_trigger_map:
+        ctr.axis_trigger_map[axis](axis_val)
+    if button and button_state >= 1 and button in ctr.button_down_trigger_map:
+        ctr.button_down_trigger_map[button]()
+    if button and button_state == 0 and button in ctr.button_up_trigger_map:
+        ctr.button_up_trigger_map[button]()
+
+
+def bench_js(cfg, loops):
+    """
+    JC-U3912T の割り当て定義の MappedJoystickController で、1イベントずつ poll() して
+    名前で処理する場合と、溜まったイベントを drain() でまとめて配列で処理する場合の
+    1ループあたりの処理時間、トリガ関数の呼び出し回数、処理後のステアリング/スロットル値を比較する。
+    """
+    import logging
+
+    # poll() のイベントごとのログ出力を抑止する
+    logging.getLogger('donkeycar.parts.controller').setLevel(logging.WARNING)
+    results = {}
+    for burst in (1, 2, 8, 32):
+        bursts = make_js_bursts(loops, burst)
+        outputs = {}
+        for name in ('poll', 'drain'):
+            ctr, w = make_pipe_js_controller(cfg)
+            calls = [0]
+            for maps in (ctr.axis_trigger_map, ctr.button_down_trigger_map):
+                for key, func in list(maps.items()):
+                    maps[key] = lambda *args, func=func: (
+                        calls.__setitem__(0, calls[0] + 1), func(*args))
+            ctr.compile_tables()
+            if name == 'drain':
+                ctr.js.open_selector()
+            it = iter(bursts)
+            def run(throttle, steering):
+                data = next(it)
+                os.write(w, data)
+                if name == 'drain':
+                    ctr.dispatch_events(ctr.js.drain(0))
+                else:
+                    for _ in range(len(data) // 8):
+                        dispatch_by_name(ctr, *ctr.js.poll())
+            label = 'js/{}/{}'.format(name, str(burst))
+            results[label] = measure(run, make_trace(loops))
+            results[label]['triggers'] = calls[0]
+            outputs[name] = (ctr.angle, ctr.throttle)
+            print_stats(label, results[label])
+            os.close(w)
+            ctr.js.jsdev.close()
+        print('{:<24} triggers poll:{} drain:{}  final (angle, throttle) poll:{} drain:{}'.format(
+            '', str(results['js/poll/{}'.format(str(burst))]['triggers']),
+            str(results['js/drain/{}'.format(str(burst))]['triggers']),
+            str(outputs['poll']), str(outputs['drain'])))
+    results['js/dispatch'] = bench_js_dispatch(loops)
+    results['js/latency'] = bench_js_latency(cfg, loops)
+    results['js/replay'] = check_js_replay(cfg, loops)
+    return results
+
+
+def bench_js_dispatch(loops, burst=32, repeat=5):
+    """
+    デバイスの読み出しを除き、1イベントあたりの呼び出し先の決定と呼び出しの時間を
+    名前の辞書検索（poll() の戻り値）、配列の添字で1件ずつ（dispatch、1件の dispatch_events）、
+    配列の添字でまとめて（dispatch_events、drain() の戻り値）の順に比較する。
+    各方式 repeat 回計測した最小値を用いる。
+    戻り値：
+        results     dict    1イベントあたりの処理時間(マイクロ秒)
+    """
+    import struct
+    from parts.controller import JS_EVENT_FORMAT, JS_EVENT_AXIS
+
+    ctr, w = make_pipe_js_controller()
+    ctr.compile_tables()
+    os.close(w)
+    ctr.js.jsdev.close()
+    named = []
+    numbered = []
+    for data in make_js_bursts(loops, burst):
+        for _, value, typev, number in struct.iter_unpack(JS_EVENT_FORMAT, data):
+            if typev == JS_EVENT_AXIS:
+                named.append((None, None, ctr.js.axis_map[number], value / 32767.0))
+                numbered.append((typev, number, value / 32767.0, 0.0))
+            else:
+                named.append((ctr.js.button_map[number], value, None, None))
+                numbered.append((typev, number, value, 0.0))
+    def by_name():
+        for event in named:
+            dispatch_by_name(ctr, *event)
+
+    def by_table():
+        for event in numbered:
+            ctr.dispatch(*event)
+
+    def by_batch():
+        ctr.dispatch_events(numbered)
+
+    results = {'events': len(named)}
+    for name, func in (('names', by_name), ('table', by_table), ('batch', by_batch)):
+        elapsed = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            elapsed.append(time.perf_counter() - start)
+        results[name + '_us'] = min(elapsed) * 1e6 / len(named)
+    print('{:<24} {:>10} events  names {:.3f}  table {:.3f}  batch {:.3f} us/event'.format(
+        'js/dispatch', str(len(named)), results['names_us'], results['table_us'],
+        results['batch_us']))
+    return results
+
+
+def check_js_replay(cfg, loops, burst=8):
+    """
+    drain で読み出したイベントを記録しながら JC-U3912T の割り当て定義で動かした後、
+    記録ファイルを ReplayJoystick で再生し、読み出し単位ごとのステアリング/スロットル値が
+    記録時と一致することを確認する。再生は最大速度と2倍速で行い、所要時間も計測する。
+    戻り値：
+        results     dict    不一致数、記録時間、再生時間(秒)
+    """
+    from parts.controller import JOYSTICK_MAPPINGS, MappedJoystickController
+
+    path = os.path.join(tempfile.mkdtemp(prefix='js'), 'replay.jsr')
+    ctr, w = make_pipe_js_controller()
+    ctr.compile_tables()
+    ctr.js.open_selector()
+    ctr.js.start_recording(path)
+    expected = []
+    start = time.monotonic()
+    for data in make_js_bursts(loops, burst):
+        os.write(w, data)
+        ctr.dispatch_events(ctr.js.drain(0))
+        expected.append((ctr.angle, ctr.throttle))
+    span = time.monotonic() - start
+    ctr.js.close()
+    os.close(w)
+    results = {'batches': len(expected), 'recorded_sec': span, 'bytes': os.path.getsize(path)}
+    for speed in (0, 2.0):
+        ctr = MappedJoystickController(JOYSTICK_MAPPINGS['JCU3912T'],
+            auto_record_on_throttle=False)
+        ctr.set_replay(path, speed=speed)
+        actual = []
+        start = time.monotonic()
+        while not ctr.js.finished:
+            ctr.dispatch_events(ctr.js.drain(None))
+            if not ctr.js.finished:
+                actual.append((ctr.angle, ctr.throttle))
+        elapsed = time.monotonic() - start
+        mismatches = sum(1 for e, a in zip(expected, actual) if e != a) + \
+            abs(len(expected) - len(actual))
+        results['speed{}'.format(str(speed))] = {'mismatches': mismatches, 'replay_sec': elapsed}
+        print('{:<24} {:>10} batches  {:>8} bytes  recorded {:.3f}s  replay x{} {:.3f}s  mismatches {}'.format(
+            'js/replay', str(len(actual)), str(results['bytes']), span,
+            str(speed) if speed else 'max', elapsed, str(mismatches)))
+    return results
+
+
+def bench_js_latency(cfg, loops, delay=0.002):
+    """
+    ジョイスティックのイベントを書き込んだ直後に drain し（コントローラのスレッド相当）、
+    delay 秒後（Vehicle ループの待ち相当）に TankDriveTrain の PIGPIO_PWM が送信するまでの
+    遅延を LatencyHistogram で集計する。p50 はおおむね delay となる。
+    イベント時刻は書き込み時の time.monotonic() を任意の基準（jiffies 相当）にずらして模擬する。
+    戻り値：
+        results     dict    LatencyHistogram の集計値(ms)
+    """
+    import struct
+    from parts import CaterpillerMotorDriver, TankDriveTrain, PIGPIO_OUT, PIGPIO_PWM, \
+        LatencyHistogram
+    from parts.controller import JS_EVENT_FORMAT, JS_EVENT_AXIS, JS_TIME_MASK
+    from parts.fake_pi import FakePi
+
+    pi = FakePi(record=False)
+    latency = LatencyHistogram(bin_ms=cfg.INPUT_LATENCY_BIN_MS, max_ms=cfg.INPUT_LATENCY_MAX_MS)
+    drive = TankDriveTrain(CaterpillerMotorDriver(
+        left_balance=cfg.LEFT_PWM_BALANCE, right_balance=cfg.RIGHT_PWM_BALANCE),
+        left_pwm=PIGPIO_PWM(pin=cfg.LEFT_MOTOR_PWM_GPIO, pgio=pi, latency=latency, elision=True),
+        right_pwm=PIGPIO_PWM(pin=cfg.RIGHT_MOTOR_PWM_GPIO, pgio=pi, latency=latency, elision=True),
+        in_pins=[PIGPIO_OUT(pin=pin, pgio=pi, elision=True) for pin in (
+            cfg.LEFT_MOTOR_IN1_GPIO, cfg.LEFT_MOTOR_IN2_GPIO,
+            cfg.RIGHT_MOTOR_IN1_GPIO, cfg.RIGHT_MOTOR_IN2_GPIO)])
+    ctr, w = make_pipe_js_controller()
+    ctr.compile_tables()
+    ctr.js.open_selector()
+    base = 0x7fff0000
+    for i in range(loops):
+        tval = (int(time.monotonic() * 1000) + base) & JS_TIME_MASK
+        value = int(32767 * math.sin(i / 20.0))
+        os.write(w, struct.pack(JS_EVENT_FORMAT, tval, value, JS_EVENT_AXIS, 1))
+        ctr.dispatch_events(ctr.js.drain(0))
+        time.sleep(delay)
+        angle, throttle, _, _, input_time = ctr.run_threaded(mode='user')
+        drive.run(throttle, angle, input_time)
+    last_ms, p50_ms, p99_ms, max_ms, count = latency.run()
+    print('{:<24} {:>10} samples  p50 {:>9.1f}ms  p99 {:>9.1f}ms  max {:>9.1f}ms  (delay {:.1f}ms)'.format(
+        'js/latency', str(count), p50_ms, p99_ms, max_ms, delay * 1000))
+    os.close(w)
+    ctr.js.close()
+    return {'count': count, 'p50_ms': p50_ms, 'p99_ms': p99_ms, 'max_ms': max_ms,
+        'delay_ms': delay * 1000}
+
+
+
+class StopProbe:
+    """
+    piインスタンスを包み、PWMサイクル値が0へ変化した時刻をピンごとに記録するクラス。
+    その他のメソッドは包んだpiインスタンスへそのまま委譲する。
+    """
+    def __init__(self, pgio, pins):
+        self.pgio = pgio
+        self.duty = {pin: 0 for pin in pins}
+        self.zero_time = {pin: 0.0 for pin in pins}
+
+    def __getattr__(self, name):
+        return getattr(self.pgio, name)
+
+    def set_PWM_dutycycle(self, user_gpio, dutycycle):
+        result = self.pgio.set_PWM_dutycycle(user_gpio, dutycycle)
+        self.update(user_gpio, dutycycle)
+        return result
+
+    def hardware_PWM(self, gpio, PWMfreq, PWMduty):
+        result = self.pgio.hardware_PWM(gpio, PWMfreq, PWMduty)
+        self.update(gpio, PWMduty)
+        return result
+
+    def update(self, pin, duty):
+        if pin in self.duty:
+            if duty == 0 and self.duty[pin] != 0:
+                self.zero_time[pin] = time.monotonic()
+            self.duty[pin] = duty
+
+    def running(self):
+        """
+        全ピンのPWMサイクル値が0以外かどうかを返却する。
+        """
+        return all(self.duty.values())
+
+    def stopped_since(self, start):
+        """
+        start 以降に全ピンのPWMサイクル値が0となった場合はその時刻、そうでない場合Noneを返却する。
+        """
+        if any(self.duty.values()) or min(self.zero_time.values()) < start:
+            return None
+        return max(self.zero_time.values())
+
+
+def wait_until(cond, timeout, interval=0.0002):
+    """
+    cond() が真となるまで最大 timeout 秒待ち、cond() の戻り値を返却する。
+    """
+    deadline = time.monotonic() + timeout
+    result = cond()
+    while not result and time.monotonic() < deadline:
+        time.sleep(interval)
+        result = cond()
+    return result
+
+
+def bench_stop(cfg, loops):
+    """
+    JC-U3912T の割り当て定義のコントローラを入力処理スレッドで、TankDriveTrain を
+    DRIVE_LOOP_HZ 周期の Vehicle ループ相当のスレッドで動かし、走行中に normal_stop/emergency_stop の
+    ボタンを押してから左右のPWMサイクル値が0になるまでの時間を、停止フックなし（ループ経由）と
+    停止フックあり（入力処理スレッドから直接停止）で比較する。
+    GPIO は --backend/--stub で指定したpiインスタンスへ送信するため、フックありの停止時間は
+    STBY とPWM2本分の往復時間となる。
+    戻り値：
+        results     dict    'stop/<経路>/<ボタン>' → 停止時間の p50/p99/max(ms)、回数
+    """
+    import logging
+    import threading
+    from parts import CaterpillerMotorDriver, TankDriveTrain, PIGPIO_OUT_BANK, PIGPIO_PWM
+    from parts.controller import JS_EVENT_FORMAT, JS_EVENT_AXIS, JS_EVENT_BUTTON
+    from parts.pigpio_connection import acquire, release
+    import struct
+
+    # E-Stop ごとの警告ログを抑止する
+    logging.getLogger('donkeycar.parts.controller').setLevel(logging.ERROR)
+    period = 1.0 / cfg.DRIVE_LOOP_HZ
+    presses = max(5, loops // 200)
+    pin_opts = dict(elision=cfg.PIGPIO_WRITE_ELISION,
+        refresh_interval=cfg.PIGPIO_REFRESH_INTERVAL)
+    pgio = acquire()
+    results = {}
+    for path in ('loop', 'hook'):
+        probe = StopProbe(pgio, (cfg.LEFT_MOTOR_PWM_GPIO, cfg.RIGHT_MOTOR_PWM_GPIO))
+        drivetrain = TankDriveTrain(CaterpillerMotorDriver(
+            left_balance=cfg.LEFT_PWM_BALANCE, right_balance=cfg.RIGHT_PWM_BALANCE),
+            left_pwm=PIGPIO_PWM(pin=cfg.LEFT_MOTOR_PWM_GPIO, pgio=probe, freq=cfg.PWM_FREQ,
+                range=cfg.PWM_RANGE, hardware=cfg.PWM_HARDWARE, **pin_opts),
+            right_pwm=PIGPIO_PWM(pin=cfg.RIGHT_MOTOR_PWM_GPIO, pgio=probe, freq=cfg.PWM_FREQ,
+                range=cfg.PWM_RANGE, hardware=cfg.PWM_HARDWARE, **pin_opts),
+            bank=PIGPIO_OUT_BANK(
+                left_in1=cfg.LEFT_MOTOR_IN1_GPIO, left_in2=cfg.LEFT_MOTOR_IN2_GPIO,
+                right_in1=cfg.RIGHT_MOTOR_IN1_GPIO, right_in2=cfg.RIGHT_MOTOR_IN2_GPIO,
+                stby=cfg.TB6612_STBY_GPIO, pgio=probe, **pin_opts))
+        ctr, w = make_pipe_js_controller(cfg)
+        ctr.js.open_selector()
+        if path == 'hook':
+            ctr.add_stop_hook(drivetrain.stop, drivetrain.resume)
+        throttle_axis = ctr.js.axis_map.index('analog_left_vertical')
+        buttons = {'normal_stop': ctr.js.button_map.index('1'),
+            'emergency_stop': ctr.js.button_map.index('3')}
+
+        def vehicle_loop():
+            next_time = time.monotonic()
+            while ctr.running:
+                angle, throttle, _, _, _ = ctr.run_threaded(mode='user')
+                drivetrain.run(throttle, angle)
+                next_time += period
+                delay = next_time - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_time = time.monotonic()
+
+        threads = [threading.Thread(target=ctr.update, daemon=True),
+            threading.Thread(target=vehicle_loop, daemon=True)]
+        for thread in threads:
+            thread.start()
+        for action, number in buttons.items():
+            times = []
+            for i in range(presses):
+                # 走行させ、両モータのPWMが出力されるまで待つ
+                os.write(w, struct.pack(JS_EVENT_FORMAT, 0, -26000 + i, JS_EVENT_AXIS, throttle_axis))
+                if not wait_until(probe.running, 1.0):
+                    continue
+                # ループ周期内の任意の時点で押す
+                time.sleep(period * (i % 7) / 7.0)
+                start = time.monotonic()
+                os.write(w, struct.pack(JS_EVENT_FORMAT, 0, 1, JS_EVENT_BUTTON, number) +
+                    struct.pack(JS_EVENT_FORMAT, 0, 0, JS_EVENT_BUTTON, number))
+                stopped = wait_until(lambda: probe.stopped_since(start), 5.0)
+                if stopped:
+                    times.append((stopped - start) * 1000.0)
+                # E-Stop の一連の出力と停止フックの再開を待つ
+                wait_until(lambda: ctr.estop_state == ctr.ES_IDLE and not drivetrain.halted, 5.0)
+                time.sleep(period * 2)
+            times.sort()
+            label = 'stop/{}/{}'.format(path, action)
+            stats = {'count': len(times), 'missed': presses - len(times)}
+            if times:
+                stats.update({'p50_ms': times[len(times) // 2],
+                    'p99_ms': times[min(len(times) - 1, int(len(times) * 0.99))],
+                    'max_ms': times[-1]})
+                print('{:<32} {:>4} stops  p50 {:>8.2f}ms  p99 {:>8.2f}ms  max {:>8.2f}ms  (loop {:.0f}Hz)'.format(
+                    label, str(len(times)), stats['p50_ms'], stats['p99_ms'], stats['max_ms'],
+                    cfg.DRIVE_LOOP_HZ))
+            else:
+                print('{:<32} no stop observed'.format(label))
+            results[label] = stats
+        ctr.running = False
+        for thread in threads:
+            thread.join()
+        os.close(w)
+        ctr.js.close()
+        drivetrain.shutdown()
+    release(pgio)
+    return results
+
+
+if __name__ == '__main__':
+    args = docopt(__doc__)
+    cfg = dk.load_config(myconfig=args['--myconfig'])
+    loops = int(args['--loops'])
+    os.environ['GPIO_BACKEND'] = args['--backend'] or cfg.GPIO_BACKEND
+    stub = start_stub(float(args['--latency'])) if args['--stub'] else None
+    # 検証系のケースが失敗した場合の終了メッセージ（終了ステータス1で終了する）
+    failure = None
+
+    if args['script']:
+        results = bench_script(cfg, loops)
+    elif args['gpio']:
+        results = bench_gpio(cfg, loops)
+    elif args['transport']:
+        results = bench_transport(cfg, loops)
+    elif args['rc']:
+        results = bench_rc(cfg, loops)
+    elif args['driver']:
+        results = bench_driver(cfg, loops)
+        if results['mismatches'] != 0:
+            failure = 'run_batch equivalence: {} mismatches'.format(str(results['mismatches']))
+    elif args['alloc']:
+        results = check_alloc(loops)
+        failed = [name for name, result in results.items() if not result['ok']]
+        if failed:
+            failure = 'allocation check failed: {}'.format(', '.join(failed))
+    elif args['js']:
+        results = bench_js(cfg, loops)
+    elif args['stop']:
+        results = bench_stop(cfg, loops)
+
+    if args['--json']:
+        save_json(args['--json'], cfg, args, results)
+    if stub is not None:
+        stub.stop()
+    if failure is not None:
+        sys.exit(failure)
@@ -253,7 +253,7 @@ def drive(cfg, model_path=None, use_joystick=False, model_type=None,
         def show_record_count_status():
             rec_tracker_part.last_num_rec_print = 0
             rec_tracker_part.force_alert = 1
-        if (cfg.CONTROLLER_TYPE != "pigpio_rc") and (cfg.CONTROLLER_TYPE != "MM1"):  # these controllers don't use the joystick class
+        if cfg.CONTROLLER_TYPE not in ("pigpio_rc", "pigpio_rc_notify", "MM1"):  # these controllers don't use the joystick class
             if isinstance(ctr, JoystickController):
                 ctr.set_button_down_trigger('circle', show_record_count_status) #then we are not using the circle button. hijack that to force a record count indication
         else:
@@ -268,6 +268,12 @@ def drive(cfg, model_path=None, use_joystick=False, model_type=None,
     #IMU
     add_imu(V, cfg)
 
+    #SPI ADC sampler
+    add_adc_sampler(V, cfg)
+
+    #Track encoders
+    add_track_encoder(V, cfg)
+
 
     # Use the FPV preview, which will show the cropped image output, or the full frame.
     if cfg.USE_FPV:
@@ -453,7 +459,7 @@ def drive(cfg, model_path=None, use_joystick=False, model_type=None,
           outputs=['steering', 'throttle'])
 
 
-    if (cfg.CONTROLLER_TYPE != "pigpio_rc") and (cfg.CONTROLLER_TYPE != "MM1"):
+    if cfg.CONTROLLER_TYPE not in ("pigpio_rc", "pigpio_rc_notify", "MM1"):
         if isinstance(ctr, JoystickController):
             ctr.set_button_down_trigger(cfg.AI_LAUNCH_ENABLE_BUTTON, aiLauncher.enable_ai_launch)
 
@@ -465,7 +471,10 @@ def drive(cfg, model_path=None, use_joystick=False, model_type=None,
     #
     # Setup drivetrain
     #
-    add_drivetrain(V, cfg)
+    add_drivetrain(V, cfg, ctr)
+
+    # pigpiod 呼び出し回数・所要時間のループごとの集計
+    add_pigpio_stats(V, cfg)
 
 
     #
@@ -506,6 +515,23 @@ def drive(cfg, model_path=None, use_joystick=False, model_type=None,
         types +=['float', 'float', 'float',
            'float', 'float', 'float']
 
+    if cfg.HAVE_PIGPIO_ENCODER:
+        inputs += ['enc/left_ticks', 'enc/left_speed',
+            'enc/right_ticks', 'enc/right_speed']
+        types += ['int', 'float', 'int', 'float']
+
+    if cfg.HAVE_SPI_ADC_SAMPLER:
+        inputs += ['adc/min', 'adc/mean', 'adc/max']
+        types += ['nparray', 'nparray', 'nparray']
+
+    if cfg.HAVE_PIGPIO_STATS:
+        inputs += ['pigpio/calls', 'pigpio/total_us', 'pigpio/max_us']
+        types += ['int', 'float', 'float']
+
+    if cfg.HAVE_INPUT_LATENCY and cfg.RECORD_INPUT_LATENCY:
+        inputs += ['latency/last_ms', 'latency/p50_ms', 'latency/p99_ms', 'latency/max_ms']
+        types += ['float', 'float', 'float', 'float']
+
     # rbx
     if cfg.DONKEY_GYM:
         if cfg.SIM_RECORD_LOCATION:
@@ -716,6 +742,27 @@ def add_user_controller(V, cfg, use_joystick, input_image='ui/image_array'):
                 outputs=['user/steering', 'user/throttle',
                          'user/mode', 'recording'],
                 threaded=False)
+        elif cfg.CONTROLLER_TYPE == "pigpio_rc_notify":
+            # RCレシーバの全チャネルを pigpiod の通知ストリーム1本で読み取る
+            from parts import PIGPIO_RC_RECEIVER
+            from parts.pigpio_connection import acquire_config, release
+
+            pgio = acquire_config(cfg)
+            ctr = PIGPIO_RC_RECEIVER(
+                [cfg.STEERING_RC_GPIO, cfg.THROTTLE_RC_GPIO, cfg.DATA_WIPER_RC_GPIO],
+                pgio=pgio,
+                mids=[cfg.PIGPIO_STEERING_MID, cfg.PIGPIO_STOPPED_PWM, 1500],
+                mins=[1000, cfg.PIGPIO_MAX_REVERSE, 1000],
+                maxs=[2000, cfg.PIGPIO_MAX_FORWARD, 2000],
+                invert=cfg.PIGPIO_INVERT, jitter=cfg.PIGPIO_JITTER,
+                auto_record=cfg.AUTO_RECORD_ON_THROTTLE, timeout=cfg.RC_NOTIFY_TIMEOUT)
+            release(pgio)
+            V.add(
+                ctr,
+                inputs=['user/mode', 'recording'],
+                outputs=['user/steering', 'user/throttle',
+                         'user/mode', 'recording'],
+                threaded=False)
         else:
             #
             # custom game controller mapping created with
@@ -740,18 +787,30 @@ def add_user_controller(V, cfg, use_joystick, input_image='ui/image_array'):
                 #
                 # game controller
                 #
-                from donkeycar.parts.controller import get_js_controller
+                # ELECOM/PS3/PS4 など parts.controller 定義のコントローラも対象とする
+                from parts import get_js_controller
                 ctr = get_js_controller(cfg)
                 if cfg.USE_NETWORKED_JS:
                     from donkeycar.parts.controller import JoyStickSub
                     netwkJs = JoyStickSub(cfg.NETWORK_JS_SERVER_IP)
                     V.add(netwkJs, threaded=True)
                     ctr.js = netwkJs
+            if hasattr(ctr, 'set_replay'):
+                if cfg.JOYSTICK_REPLAY_PATH:
+                    # ジョイスティックの代わりに記録ファイルの入力イベントを再生する
+                    ctr.set_replay(cfg.JOYSTICK_REPLAY_PATH, speed=cfg.JOYSTICK_REPLAY_SPEED)
+                elif cfg.JOYSTICK_RECORD_PATH:
+                    # ジョイスティックの入力イベントをファイルへ記録する
+                    import os
+                    ctr.set_record_path(os.path.join(cfg.DATA_PATH, cfg.JOYSTICK_RECORD_PATH))
+            outputs = ['user/steering', 'user/throttle', 'user/mode', 'recording']
+            if hasattr(ctr, 'input_time'):
+                # 入力イベントの時刻（入力から出力までの遅延計測用）
+                outputs.append('user/input_time')
             V.add(
                 ctr,
                 inputs=[input_image, 'user/mode', 'recording'],
-                outputs=['user/steering', 'user/throttle',
-                         'user/mode', 'recording'],
+                outputs=outputs,
                 threaded=True)
     return ctr
 
@@ -921,10 +980,57 @@ def add_imu(V, cfg):
     return imu
 
 
+def add_adc_sampler(V, cfg):
+    sampler = None
+    if cfg.HAVE_SPI_ADC_SAMPLER:
+        from parts import PIGPIO_SPI_ADC_SAMPLER
+        from parts.pigpio_connection import acquire_config, release
+
+        pgio = acquire_config(cfg)
+        sampler = PIGPIO_SPI_ADC_SAMPLER(
+            channels=cfg.SPI_ADC_CHANNELS, rate_hz=cfg.SPI_ADC_SAMPLE_RATE,
+            capacity=cfg.SPI_ADC_BUFFER_SIZE, pgio=pgio, vref_volts=cfg.SPI_ADC_VREF,
+            spi_channel=cfg.SPI_ADC_SPI_CHANNEL, spi_baud=cfg.SPI_ADC_SPI_BAUD)
+        release(pgio)
+        V.add(sampler, outputs=['adc/min', 'adc/mean', 'adc/max', 'adc/samples'],
+              threaded=True)
+    return sampler
+
+
+def add_track_encoder(V, cfg):
+    encoder = None
+    if cfg.HAVE_PIGPIO_ENCODER:
+        from parts import PIGPIO_TRACK_ENCODER
+        from parts.gpio_backend import PUD_UP
+        from parts.pigpio_connection import acquire_config, release
+
+        pgio = acquire_config(cfg)
+        encoder = PIGPIO_TRACK_ENCODER(
+            left_pin=cfg.LEFT_ENCODER_GPIO, right_pin=cfg.RIGHT_ENCODER_GPIO,
+            pgio=pgio, distance_per_tick=cfg.ENCODER_DISTANCE_PER_TICK,
+            glitch_us=cfg.ENCODER_GLITCH_US, pull_up_down=PUD_UP)
+        release(pgio)
+        V.add(encoder, outputs=['enc/left_ticks', 'enc/left_speed',
+                                'enc/right_ticks', 'enc/right_speed'])
+    return encoder
+
+
+def add_pigpio_stats(V, cfg):
+    stats = None
+    if cfg.HAVE_PIGPIO_STATS:
+        from parts import PIGPIO_STATS
+
+        # 生成済みの全 PIGPIO パーツを集計対象とするため、各パーツの後に追加する
+        stats = PIGPIO_STATS()
+        V.add(stats, outputs=['pigpio/calls', 'pigpio/total_us', 'pigpio/max_us',
+                              'pigpio/stats'])
+    return stats
+
+
 #
 # Drive train setup
 #
-def add_drivetrain(V, cfg):
+def add_drivetrain(V, cfg, ctr=None):
 
     if (not cfg.DONKEY_GYM) and cfg.DRIVE_TRAIN_TYPE != "MOCK":
         from donkeycar.parts import actuator, pins
@@ -1132,44 +1238,139 @@ def add_drivetrain(V, cfg):
             V.add(vesc, inputs=['steering', 'throttle'])
 
         elif cfg.DRIVE_TRAIN_TYPE == "DC_TWO_WHEEL_PIGPIO":
-            try:
-                import pigpio
-            except:
-                raise
-            # pigpio 制御開始
-            pgio = pigpio.pi()
-
-            from parts import PIGPIO_OUT, PIGPIO_PWM, CaterpillerMotorDriver
+            from parts import PIGPIO_OUT, PIGPIO_OUT_BANK, PIGPIO_PWM, PIGPIO_DISPATCHER, PIGPIO_MOTOR_SCRIPT, \
+                PIGPIO_TRACE, CaterpillerMotorDriver, TankDriveTrain, LatencyHistogram
+            from parts.pigpio_connection import acquire_config, release
+
+            # pigpio 制御開始（共有piインスタンスを各パーツで参照カウント管理）
+            pgio = acquire_config(cfg)
+
+            # 各ピンパーツ共通の引数
+            pin_opts = dict(pgio=pgio,
+                elision=cfg.PIGPIO_WRITE_ELISION,
+                refresh_interval=cfg.PIGPIO_REFRESH_INTERVAL)
+
+            if cfg.PIGPIO_USE_DISPATCHER:
+                # 出力系コマンドを専用スレッドから送信する
+                dispatcher = PIGPIO_DISPATCHER()
+                V.add(dispatcher, outputs=['pigpio/queue_age', 'pigpio/latency'], threaded=True)
+                pin_opts['dispatcher'] = dispatcher
+
+            if cfg.PIGPIO_TRACE_SIZE > 0:
+                # 送信したGPIOコマンドをリングバッファへ記録する
+                import os
+                trace = PIGPIO_TRACE(size=cfg.PIGPIO_TRACE_SIZE,
+                    path=os.path.join(cfg.DATA_PATH, cfg.PIGPIO_TRACE_PATH))
+                V.add(trace, outputs=['pigpio/trace_count'])
+                pin_opts['trace'] = trace
+                if cfg.PIGPIO_TRACE_DUMP_BUTTON is not None:
+                    # ジョイスティックのボタン押下で走行中にトレースを書き出す
+                    if hasattr(ctr, 'set_button_down_trigger'):
+                        ctr.set_button_down_trigger(cfg.PIGPIO_TRACE_DUMP_BUTTON, trace.request_dump)
+                    else:
+                        print('PIGPIO_TRACE_DUMP_BUTTON requires a joystick controller, ignored')
+
+            # ジョイスティック入力から PWM 出力までの遅延（PIGPIO_PWM のみ記録する）
+            latency = None
+            pwm_inputs = []
+            if cfg.HAVE_INPUT_LATENCY:
+                latency = LatencyHistogram(bin_ms=cfg.INPUT_LATENCY_BIN_MS,
+                    max_ms=cfg.INPUT_LATENCY_MAX_MS)
+                pwm_inputs = ['user/input_time']
+
+            # 停止操作時にジョイスティックのスレッドから直接モータを止める（TankDriveTrain のみ）
+            use_stop_hook = cfg.JOYSTICK_STOP_HOOK and hasattr(ctr, 'add_stop_hook')
+            if use_stop_hook and not cfg.PIGPIO_USE_FUSED_DRIVETRAIN:
+                print('JOYSTICK_STOP_HOOK requires PIGPIO_USE_FUSED_DRIVETRAIN = True, ignored')
+                use_stop_hook = False
 
             # TB6612 STBY ピン初期化
-            stby = PIGPIO_OUT(pin=cfg.TB6612_STBY_GPIO, pgio=pgio) #, debug=use_debug)
-            stby.run(1)
+            stby = None
+            if not (cfg.PIGPIO_USE_BANK_WRITE or cfg.PIGPIO_USE_MOTOR_SCRIPT):
+                stby = PIGPIO_OUT(pin=cfg.TB6612_STBY_GPIO, **pin_opts) #, debug=use_debug)
+                stby.run(1)
+                if not use_stop_hook:
+                    # 初期化のみのためパーツ登録せず参照を解放する（出力値は維持される）
+                    stby.shutdown()
+                    stby = None
 
             # ジョイスティック出力値をDCモータ入力値に変換
             driver = CaterpillerMotorDriver(
                 left_balance=cfg.LEFT_PWM_BALANCE, 
                 right_balance=cfg.RIGHT_PWM_BALANCE) #,
                 #debug=use_debug)
-            V.add(driver, 
-                inputs=['throttle', 'angle'],
-                outputs=['left_motor_vref', 'left_motor_in1', 'left_motor_in2',
-                'right_motor_vref', 'right_motor_in1', 'right_motor_in2'])
-
-            # 左モータ制御
-            left_in1 = PIGPIO_OUT(pin=cfg.LEFT_MOTOR_IN1_GPIO, pgio=pgio) #, debug=use_debug)
-            left_in2 = PIGPIO_OUT(pin=cfg.LEFT_MOTOR_IN2_GPIO, pgio=pgio) #, debug=use_debug)
-            left_vref = PIGPIO_PWM(pin=cfg.LEFT_MOTOR_PWM_GPIO, pgio=pgio, freq=cfg.PWM_FREQ, range=cfg.PWM_RANGE) #, debug=use_debug)
-            V.add(left_in1, inputs=['left_motor_in1'])
-            V.add(left_in2, inputs=['left_motor_in2'])
-            V.add(left_vref, inputs=['left_motor_vref'])  
-
-            # 右モータ制御
-            right_in1 = PIGPIO_OUT(pin=cfg.RIGHT_MOTOR_IN1_GPIO, pgio=pgio) #, debug=use_debug)
-            right_in2 = PIGPIO_OUT(pin=cfg.RIGHT_MOTOR_IN2_GPIO, pgio=pgio) #, debug=use_debug)
-            right_vref = PIGPIO_PWM(pin=cfg.RIGHT_MOTOR_PWM_GPIO, pgio=pgio, freq=cfg.PWM_FREQ, range=cfg.PWM_RANGE) #, debug=use_debug)
-            V.add(right_in1, inputs=['right_motor_in1'])
-            V.add(right_in2, inputs=['right_motor_in2'])
-            V.add(right_vref, inputs=['right_motor_vref'])
+            # 個別に登録するパーツ (パーツ, 入力キー) のリスト
+            parts = []
+            drive_opts = {}
+
+            if cfg.PIGPIO_USE_MOTOR_SCRIPT:
+                # 左右モータの全ピンを pigpiod 上のスクリプトで一括更新
+                motor = PIGPIO_MOTOR_SCRIPT(
+                    left_pwm=cfg.LEFT_MOTOR_PWM_GPIO,
+                    left_in1=cfg.LEFT_MOTOR_IN1_GPIO, left_in2=cfg.LEFT_MOTOR_IN2_GPIO,
+                    right_pwm=cfg.RIGHT_MOTOR_PWM_GPIO,
+                    right_in1=cfg.RIGHT_MOTOR_IN1_GPIO, right_in2=cfg.RIGHT_MOTOR_IN2_GPIO,
+                    stby=cfg.TB6612_STBY_GPIO, freq=cfg.PWM_FREQ, range=cfg.PWM_RANGE,
+                    hardware=cfg.PWM_HARDWARE, **pin_opts) #, debug=use_debug)
+                parts.append((motor, ['left_motor_vref', 'left_motor_in1', 'left_motor_in2',
+                    'right_motor_vref', 'right_motor_in1', 'right_motor_in2']))
+                drive_opts['motor'] = motor
+            else:
+                if cfg.PIGPIO_USE_BANK_WRITE:
+                    # 左右モータ IN1/IN2 および STBY をバンク単位で一括出力
+                    bank = PIGPIO_OUT_BANK(
+                        left_in1=cfg.LEFT_MOTOR_IN1_GPIO, left_in2=cfg.LEFT_MOTOR_IN2_GPIO,
+                        right_in1=cfg.RIGHT_MOTOR_IN1_GPIO, right_in2=cfg.RIGHT_MOTOR_IN2_GPIO,
+                        stby=cfg.TB6612_STBY_GPIO, **pin_opts) #, debug=use_debug)
+                    parts.append((bank, ['left_motor_in1', 'left_motor_in2',
+                        'right_motor_in1', 'right_motor_in2']))
+                    drive_opts['bank'] = bank
+                else:
+                    left_in1 = PIGPIO_OUT(pin=cfg.LEFT_MOTOR_IN1_GPIO, **pin_opts) #, debug=use_debug)
+                    left_in2 = PIGPIO_OUT(pin=cfg.LEFT_MOTOR_IN2_GPIO, **pin_opts) #, debug=use_debug)
+                    parts.append((left_in1, ['left_motor_in1']))
+                    parts.append((left_in2, ['left_motor_in2']))
+                    right_in1 = PIGPIO_OUT(pin=cfg.RIGHT_MOTOR_IN1_GPIO, **pin_opts) #, debug=use_debug)
+                    right_in2 = PIGPIO_OUT(pin=cfg.RIGHT_MOTOR_IN2_GPIO, **pin_opts) #, debug=use_debug)
+                    parts.append((right_in1, ['right_motor_in1']))
+                    parts.append((right_in2, ['right_motor_in2']))
+                    drive_opts['in_pins'] = [left_in1, left_in2, right_in1, right_in2]
+                    # 停止フック使用時は STBY ピンも TankDriveTrain が操作する
+                    drive_opts['stby'] = stby
+
+                # 左モータ制御
+                left_vref = PIGPIO_PWM(pin=cfg.LEFT_MOTOR_PWM_GPIO, freq=cfg.PWM_FREQ, range=cfg.PWM_RANGE,
+                    hardware=cfg.PWM_HARDWARE, latency=latency, **pin_opts) #, debug=use_debug)
+                parts.append((left_vref, ['left_motor_vref'] + pwm_inputs))
+                drive_opts['left_pwm'] = left_vref
+
+                # 右モータ制御
+                right_vref = PIGPIO_PWM(pin=cfg.RIGHT_MOTOR_PWM_GPIO, freq=cfg.PWM_FREQ, range=cfg.PWM_RANGE,
+                    hardware=cfg.PWM_HARDWARE, latency=latency, **pin_opts) #, debug=use_debug)
+                parts.append((right_vref, ['right_motor_vref'] + pwm_inputs))
+                drive_opts['right_pwm'] = right_vref
+
+            if cfg.PIGPIO_USE_FUSED_DRIVETRAIN:
+                # 変換から全ピンへの出力までを1パーツで実行する
+                drivetrain = TankDriveTrain(driver, **drive_opts)
+                V.add(drivetrain, inputs=['throttle', 'angle'] + pwm_inputs)
+                if use_stop_hook:
+                    ctr.add_stop_hook(drivetrain.stop, drivetrain.resume)
+            else:
+                V.add(driver, 
+                    inputs=['throttle', 'angle'],
+                    outputs=['left_motor_vref', 'left_motor_in1', 'left_motor_in2',
+                    'right_motor_vref', 'right_motor_in1', 'right_motor_in2'])
+                for part, inputs in parts:
+                    V.add(part, inputs=inputs)
+
+            if latency is not None:
+                # 出力パーツが記録した遅延をループごとに出力する
+                V.add(latency, outputs=['latency/last_ms', 'latency/p50_ms', 'latency/p99_ms',
+                    'latency/max_ms', 'latency/count'])
+
+            # 以降は各パーツが参照を保持するため、ここで取得した参照は解放する
+            release(pgio)
 
 
 if __name__ == '__main__':
@@ -766,6 +766,8 @@ RIGHT_PWM_BALANCE = 1.0
 # pigpio
 PWM_RANGE=255
 PWM_FREQ=50
+# PWMピンがGPIO12/13/18/19の場合ハードウェアPWM(duty範囲 0-1,000,000)を使用する
+PWM_HARDWARE = False
 # LEFT MOTOR
 ## Org
 #LEFT_MOTOR_PWM_GPIO = 13
@@ -785,4 +787,89 @@ RIGHT_MOTOR_IN1_GPIO = 21
 RIGHT_MOTOR_IN2_GPIO = 20
 # TB6612 STBY
 TB6612_STBY_GPIO = 4
-# 
\ No newline at end of file
+# 
+# GPIO バックエンド
+#   'pigpio': pigpiod 経由（PIGPIO_TRANSPORT で通信方法を指定）
+#   'gpiod' : libgpiod でキャラクタデバイス(GPIOD_CHIP)を直接操作（pigpiod 不要、PWM はソフトウェアPWM）
+#   'fake'  : メモリ上でGPIOを模擬（実機のない環境での動作確認用）
+GPIO_BACKEND = 'pigpio'
+GPIOD_CHIP = '/dev/gpiochip0'
+# pigpiod との通信方法
+#   'socket': TCP ソケット（PIGPIO_ADDR/PIGPIO_PORT 環境変数で接続先を指定）
+#   'pipe'  : /dev/pigpio と /dev/pigout パイプ（同一ホスト上の pigpiod のみ、1プロセス限定）
+PIGPIO_TRANSPORT = 'socket'
+# IN1/IN2/STBY をバンク単位(set_bank_1/clear_bank_1)で一括出力する
+PIGPIO_USE_BANK_WRITE = False
+# 前回と同じ値の write/set_PWM_dutycycle 送信を省略する
+PIGPIO_WRITE_ELISION = False
+# 送信省略中でも同じ値を再送する間隔(秒)
+PIGPIO_REFRESH_INTERVAL = 1.0
+# 出力系コマンドを専用スレッドから送信する(latest-wins)
+PIGPIO_USE_DISPATCHER = False
+# 左右モータの全ピンを pigpiod 上のスクリプト(run_script 1回)で更新する
+PIGPIO_USE_MOTOR_SCRIPT = False
+# CaterpillerMotorDriver と各ピンパーツを1パーツ(TankDriveTrain)にまとめて実行する
+PIGPIO_USE_FUSED_DRIVETRAIN = False
+# ジョイスティックの停止操作(emergency_stop/normal_stop)時、Vehicle ループを待たずに
+# ジョイスティックのスレッドから STBY ピンを0、左右のPWMを0にする（PIGPIO_USE_FUSED_DRIVETRAIN = True の場合のみ）
+JOYSTICK_STOP_HOOK = False
+# 送信したGPIOコマンドを記録するリングバッファの件数、0の場合は記録しない
+PIGPIO_TRACE_SIZE = 0
+# トレースの書き出し先ファイル名（DATA_PATH 配下、time.strftime の書式を使用可）
+# 終了時と PIGPIO_TRACE_DUMP_BUTTON の押下時に書き出す
+PIGPIO_TRACE_PATH = 'pigpio_trace_%Y%m%d_%H%M%S.npz'
+# 走行中にトレースを書き出すジョイスティックのボタン名（例：JCU4113S の GUIDE ボタンは '13'）、
+# Noneの場合は終了時のみ書き出す
+# 既存の機能が割り当てられたボタンを指定した場合は書き出しに置き換わる
+PIGPIO_TRACE_DUMP_BUTTON = None
+# pigpiod 呼び出しの回数・合計/最大所要時間をループごとに集計し、Tubへ記録する
+HAVE_PIGPIO_STATS = False
+# 
+# CONTROLLER_TYPE = 'pigpio_rc_notify' の場合、STEERING_RC_GPIO/THROTTLE_RC_GPIO/DATA_WIPER_RC_GPIO の
+# パルスを pigpiod の通知ストリーム1本でまとめて読み取る（中立値などは PIGPIO_* の RC 設定を使用）
+# パルスが途絶えたとみなす時間(秒)、以降はステアリング/スロットルを0とする
+RC_NOTIFY_TIMEOUT = 0.1
+# 
+# ジョイスティック入力(イベントのカーネル時刻)から PIGPIO_PWM のコマンド送信までの遅延を
+# 計測し、直近値/p50/p99/最大値(ms)をループごとに latency/* へ出力する（手動運転時のみ）
+HAVE_INPUT_LATENCY = False
+# 遅延ヒストグラムの階級幅(ms)と上限(ms)、上限を超えた値は最上位の階級へ集計する
+INPUT_LATENCY_BIN_MS = 0.5
+INPUT_LATENCY_MAX_MS = 500
+# 遅延の直近値/p50/p99/最大値を Tub へ記録する
+RECORD_INPUT_LATENCY = False
+# 
+# ジョイスティック（parts.controller の ELECOM/PS3/PS4 コントローラ）の入力イベントを記録するファイル名
+# （DATA_PATH 配下、time.strftime の書式を展開）、Noneの場合は記録しない
+JOYSTICK_RECORD_PATH = None
+# ジョイスティックの代わりに入力イベントを再生する記録ファイルのパス、Noneの場合は実機を使用する
+JOYSTICK_REPLAY_PATH = None
+# 再生速度の倍率（1.0:記録時と同じ間隔、0:待たずに再生）
+JOYSTICK_REPLAY_SPEED = 1.0
+# ゲームパッドの割り当て定義（CONTROLLER_TYPE → 定義）、parts.controller.JOYSTICK_MAPPINGS へ追加/上書きする
+# 定義の形式は JOYSTICK_MAPPINGS と同じ（buttons/axes：コード → 名前、
+# button_down/button_up/axis：名前 → MappedJoystickController のメソッド名）
+JOYSTICK_MAPPINGS = {}
+# 
+# SPI ADC(MCP3208) を別スレッドで高速サンプリングし、ループごとに最小/平均/最大値を記録する
+HAVE_SPI_ADC_SAMPLER = False
+# サンプリングするADCチャネル(0～7)のリスト
+SPI_ADC_CHANNELS = [0, 1]
+# サンプリング周期(Hz)
+SPI_ADC_SAMPLE_RATE = 1000
+# リングバッファに保持するサンプル数
+SPI_ADC_BUFFER_SIZE = 4096
+# ADC の Vref に接続した電圧(V)
+SPI_ADC_VREF = 3.3
+# SPIチャネル/通信速度(bits/sec)
+SPI_ADC_SPI_CHANNEL = 0
+SPI_ADC_SPI_BAUD = 1000000
+# 
+# 左右キャタピラのエンコーダをエッジコールバックで数える
+HAVE_PIGPIO_ENCODER = False
+LEFT_ENCODER_GPIO = 5
+RIGHT_ENCODER_GPIO = 6
+# グリッチフィルタ(マイクロ秒)、0の場合は設定しない
+ENCODER_GLITCH_US = 100
+# 1ティックあたりの移動距離(m)、1.0の場合速度は ticks/sec
+ENCODER_DISTANCE_PER_TICK = 1.0
@@ -1,4 +1,8 @@
 # -*- coding: utf-8 -*-
-from .actuator import CaterpillerMotorDriver
-from .controller import ELECOM_JCU3912TController, get_js_controller
-from .pigpio_wrapper import PIGPIO_OUT, PIGPIO_PWM
\ No newline at end of file
+from .actuator import CaterpillerMotorDriver, TankDriveTrain
+from .controller import MappedJoystickController, get_js_controller
+from .pigpio_wrapper import PIGPIO_OUT, PIGPIO_OUT_BANK, PIGPIO_PWM, PIGPIO_DISPATCHER, \
+    PIGPIO_MOTOR_SCRIPT, PIGPIO_SPI_ADC_SAMPLER, PIGPIO_ENCODER, \
+    PIGPIO_TRACK_ENCODER, PIGPIO_TRACE, PIGPIO_STATS
+from .pigpio_rc import PIGPIO_RC_RECEIVER
+from .latency import LatencyHistogram
\ No newline at end of file
@@ -2,9 +2,13 @@
 """
 コントローラ/AI入力値をGPIOピン値に変換するパーツクラス。
 """
+import threading
+
 from donkeycar.parts.actuator import TwoWheelSteeringThrottle
 
 class CaterpillerMotorDriver(object):
+    __slots__ = ('twowheel', 'debug', 'left_balance', 'right_balance')
+
     def __init__(self, left_balance=1.0, right_balance=1.0, debug=False):
         """
         donkeycarパッケージのTwoWheelSteeringThrottleインスタンスを生成する。
@@ -54,17 +58,31 @@ class CaterpillerMotorDriver(object):
         if self.debug:
             print('[CaterpillerMD] conv throttle:{}, steering:{}'.format(str(throttle), str(steering)))
 
-        left_motor_speed, right_motor_speed = self.twowheel.run(throttle, steering)
-        left_motor_speed, right_motor_speed = self.to_range_value(left_motor_speed), self.to_range_value(right_motor_speed)
+        # TwoWheelSteeringThrottle.run と同じ演算（入力は丸め済みのため範囲外にはならない）
+        left_motor_speed = right_motor_speed = throttle
+        if steering < 0:
+            left_motor_speed = throttle * (1.0 - (-steering))
+        elif steering > 0:
+            right_motor_speed = throttle * (1.0 - steering)
 
         if self.debug:
             print('[CaterpillerMD] left motor speed:{}, right motor speed:{}'.format(str(left_motor_speed), str(right_motor_speed)))
 
-        left_pwm, left_in1, left_in2 = self.convert_pin_values(left_motor_speed)
-        right_pwm, right_in1, right_in2 = self.convert_pin_values(right_motor_speed)
-
-        left_pwm = self.to_range_value(left_pwm * self.left_balance)
-        right_pwm = self.to_range_value(right_pwm * self.right_balance)
+        # convert_pin_values と同じ変換（モータ速度・バランスとも -1.0～1.0 のため丸め不要）
+        if left_motor_speed > 0:
+            left_in1, left_in2 = 1, 0
+        elif left_motor_speed < 0:
+            left_in1, left_in2 = 0, 1
+        else:
+            left_in1, left_in2 = 0, 0
+        if right_motor_speed > 0:
+            right_in1, right_in2 = 1, 0
+        elif right_motor_speed < 0:
+            right_in1, right_in2 = 0, 1
+        else:
+            right_in1, right_in2 = 0, 0
+        left_pwm = abs(left_motor_speed) * self.left_balance
+        right_pwm = abs(right_motor_speed) * self.right_balance
 
         if self.debug:
             print('[CaterpillerMD]  left   pwm:{}, in1:{}, in2:{}'.format(str(left_pwm), str(left_in1), str(left_in2)))
@@ -72,6 +90,77 @@ class CaterpillerMotorDriver(object):
 
         return left_pwm, left_in1, left_in2, right_pwm, right_in1, right_in2
     
+    def run_batch(self, throttle, steering):
+        """
+        スロットル/ステアリング値の配列をまとめてGPIOピン出力値の配列に変換する。
+        Tubの変換やトレースの再生など、オフライン処理向け。
+        各要素の結果は run と同じ値になる（None は 0.0、範囲外は -1.0～1.0 に丸める）。
+
+        引数：
+            throttle        array   スロットル値（-1.0～1.0）の配列
+            steering        array   ステアリング値（-1.0～1.0）の配列
+        戻り値：
+            left_verf       ndarray 左モータVref値（float64、0.0～1.0）
+            left_in1        ndarray 左モータIN1値（int8、0もしくは1）
+            left_in2        ndarray 左モータIN2値（int8、0もしくは1）
+            right_verf      ndarray 右モータVref値（float64、0.0～1.0）
+            right_in1       ndarray 右モータIN1値（int8、0もしくは1）
+            right_in2       ndarray 右モータIN2値（int8、0もしくは1）
+        """
+        import numpy as np
+        throttle, steering = self.to_range_array(throttle), self.to_range_array(steering)
+        throttle, steering = np.broadcast_arrays(throttle, steering)
+
+        # TwoWheelSteeringThrottle.run と同じ演算順序
+        left_motor_speed = np.where(steering < 0, throttle * (1.0 - (-steering)), throttle)
+        right_motor_speed = np.where(steering > 0, throttle * (1.0 - steering), throttle)
+        left_motor_speed = np.clip(left_motor_speed, -1.0, 1.0)
+        right_motor_speed = np.clip(right_motor_speed, -1.0, 1.0)
+
+        left_pwm, left_in1, left_in2 = self.convert_pin_arrays(left_motor_speed)
+        right_pwm, right_in1, right_in2 = self.convert_pin_arrays(right_motor_speed)
+
+        left_pwm = np.clip(left_pwm * self.left_balance, -1.0, 1.0)
+        right_pwm = np.clip(right_pwm * self.right_balance, -1.0, 1.0)
+
+        if self.debug:
+            print('[CaterpillerMD] batch size:{}'.format(str(left_pwm.size)))
+
+        return left_pwm, left_in1, left_in2, right_pwm, right_in1, right_in2
+
+    def convert_pin_arrays(self, motor_speed):
+        """
+        convert_pin_values の配列版。
+
+        引数：
+            motor_speed         モータ速度(-1.0～1.0)の配列
+        戻り値：
+            pwm     ndarray     PWM値(PWM:0.0～1.0)
+            in1     ndarray     IN1値(0か1)
+            in2     ndarray     IN2値(0か1)
+        """
+        import numpy as np
+        pwm = np.maximum(np.minimum(np.abs(motor_speed), 1.0), 0.0)
+        in1 = (motor_speed > 0).astype(np.int8)
+        in2 = (motor_speed < 0).astype(np.int8)
+        return pwm, in1, in2
+
+    def to_range_array(self, values):
+        """
+        to_range_value の配列版。None は 0.0 とする。
+
+        引数：
+            values              数値（None可）の配列
+        戻り値：
+            values  ndarray     -1.0～1.0 に丸めた float64 配列
+        """
+        import numpy as np
+        values = np.asarray(values)
+        if values.dtype == object:
+            values = np.array([0.0 if v is None else float(v) for v in values.ravel()],
+                dtype=np.float64).reshape(values.shape)
+        return np.clip(values.astype(np.float64), -1.0, 1.0)
+
     def convert_pin_values(self, motor_speed):
         """
         モータ速度(-1.0～1.0)をPWM, IN1, IN2 のピン出力値に変換する。
@@ -116,3 +205,157 @@ class CaterpillerMotorDriver(object):
         """
         self.twowheel.shutdown()
 
+
+class TankDriveTrain(object):
+    """
+    CaterpillerMotorDriver と左右モータのピンパーツをまとめて1パーツとして
+    実行するドライブトレインクラス。
+    スロットル/ステアリング値の変換から各ピンへの出力までを run 1回で行うため、
+    パーツごとの呼び出しと Vehicle メモリへの中間値の読み書きが不要になる。
+    出力値・出力順は各パーツを個別に Vehicle へ登録した場合と同じ。
+    stop はジョイスティックのスレッドなどから呼び出し、Vehicle ループを待たずに
+    STBY ピンを０、左右のPWMサイクル値を0にする。以降の run は出力せず、
+    停止後の入力値を受け取ったことを resume で通知されてから出力を再開する。
+    """
+    __slots__ = ('driver', 'left_pwm', 'right_pwm', 'in_pins', 'bank', 'motor', 'stby',
+        'lock', 'halted', 'stop_count', 'debug')
+
+    def __init__(self, driver, left_pwm=None, right_pwm=None,
+    in_pins=None, bank=None, motor=None, stby=None, debug=False):
+        """
+        変換パーツと出力パーツを保持する。出力パーツは motor、
+        もしくは left_pwm/right_pwm と bank/in_pins のいずれかを指定する。
+
+        引数：
+            driver      CaterpillerMotorDriver  スロットル/ステアリング値の変換パーツ
+            left_pwm    PIGPIO_PWM              左モータVrefピン
+            right_pwm   PIGPIO_PWM              右モータVrefピン
+            in_pins     list                    左IN1, 左IN2, 右IN1, 右IN2 の PIGPIO_OUT
+            bank        PIGPIO_OUT_BANK         左右 IN1/IN2 をバンク単位で出力するパーツ
+            motor       PIGPIO_MOTOR_SCRIPT     全ピンをスクリプトで更新するパーツ
+            stby        PIGPIO_OUT              TB6612 STBY ピン（in_pins 使用時のみ、
+                                                bank/motor は STBY ピンを含む）、Noneの場合は操作しない
+            debug       boolean                 デバッグ表示有無（デフォルト:False）
+        戻り値：
+            なし
+        """
+        if motor is None and (left_pwm is None or right_pwm is None or
+            (bank is None and in_pins is None)):
+            raise ValueError('[TankDriveTrain] motor or left_pwm/right_pwm with bank/in_pins required')
+        self.driver = driver
+        self.left_pwm = left_pwm
+        self.right_pwm = right_pwm
+        self.in_pins = in_pins
+        self.bank = bank
+        self.motor = motor
+        self.stby = stby
+        # run と stop の排他（stop は run の完了を待ってから出力する）
+        self.lock = threading.Lock()
+        self.halted = False
+        self.stop_count = 0
+        self.debug = debug
+
+    def run(self, throttle, steering, input_time=None):
+        """
+        コントローラの入力値をGPIOピン出力値に変換し、各ピンへ出力する。
+        stop 後、resume されるまでは出力しない。
+
+        引数：
+            throttle        float   スロットル値（-1.0～1.0）
+            steering        float   ステアリング値（-1.0～1.0）
+            input_time      float   入力イベントの時刻、PIGPIO_PWM の遅延記録に使用（None可）
+        戻り値：
+            なし
+        """
+        # with 文はロックのメソッドオブジェクトを毎回生成するため、acquire/release を直接呼び出す
+        self.lock.acquire()
+        try:
+            if self.halted:
+                return
+            left_vref, left_in1, left_in2, right_vref, right_in1, right_in2 = \
+                self.driver.run(throttle, steering)
+            if self.motor is not None:
+                self.motor.run(left_vref, left_in1, left_in2, right_vref, right_in1, right_in2)
+                return
+            if self.bank is not None:
+                self.bank.run(left_in1, left_in2, right_in1, right_in2)
+            else:
+                if self.stby is not None:
+                    self.stby.run(1)
+                left1, left2, right1, right2 = self.in_pins
+                left1.run(left_in1)
+                left2.run(left_in2)
+                right1.run(right_in1)
+                right2.run(right_in2)
+            self.left_pwm.run(left_vref, input_time)
+            self.right_pwm.run(right_vref, input_time)
+        finally:
+            self.lock.release()
+
+    def stop(self):
+        """
+        呼び出したスレッドからその場で STBY ピンを０、左右のPWMサイクル値を0にし、
+        resume されるまで run の出力を止める。
+        実行中の run があれば完了を待ち、ディスパッチャの未送信コマンドは破棄する。
+        各ピンの前回送信値も破棄するため、再開後の最初の run はすべて送信される。
+        引数：
+            なし
+        戻り値：
+            stop_count  int     stop の呼び出し回数（resume に渡す）
+        """
+        with self.lock:
+            self.halted = True
+            self.stop_count += 1
+            if self.motor is not None:
+                self.motor.stop()
+            else:
+                # STBY を先に落とし、左右モータを同時に止める
+                if self.bank is not None:
+                    self.bank.stop()
+                elif self.stby is not None:
+                    self.stby.stop()
+                self.left_pwm.stop()
+                self.right_pwm.stop()
+            if self.debug:
+                print('[TankDriveTrain] stop:{}'.format(str(self.stop_count)))
+            return self.stop_count
+
+    def resume(self, stop_count):
+        """
+        Vehicle ループが stop_count 回目の stop 以降の入力値を受け取ったことを通知し、
+        run の出力を再開する。以降に stop されていた場合は再開しない。
+        引数：
+            stop_count  int     入力値を読み出す前の stop の呼び出し回数
+        戻り値：
+            resumed     boolean 再開した場合True
+        """
+        with self.lock:
+            if not self.halted or stop_count != self.stop_count:
+                return False
+            self.halted = False
+        if self.debug:
+            print('[TankDriveTrain] resume:{}'.format(str(stop_count)))
+        return True
+
+    def shutdown(self):
+        """
+        個別登録時の Vehicle と同じ順序で各パーツのシャットダウン処理を呼び出す。
+
+        引数：
+            なし
+        戻り値：
+            なし
+        """
+        self.driver.shutdown()
+        if self.motor is not None:
+            self.motor.shutdown()
+            return
+        if self.bank is not None:
+            self.bank.shutdown()
+        else:
+            for pin in self.in_pins:
+                pin.shutdown()
+            if self.stby is not None:
+                self.stby.shutdown()
+        self.left_pwm.shutdown()
+        self.right_pwm.shutdown()
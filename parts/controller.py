@@ -1,435 +1,744 @@
 # -*- coding: utf-8 -*-
 """
-ELECOM製JC-U3912T/JC-U4113S ワイヤレスゲームパッドコントローラパーツクラス、
-PS3/PS4 コントローラパーツクラスを提供する。
+ELECOM製JC-U3912T/JC-U4113S ワイヤレスゲームパッド、PS3/PS4 コントローラの
+割り当て定義と、割り当て定義に従って動作するコントローラパーツクラスを提供する。
 また本モジュールが提供するパーツクラスオブジェクトを取得できる
 ファクトリのラップ関数も合わせて提供する。
 
 `donkey createjs` でベースクラスを作成し、追記した。
+各ゲームパッドは /dev/input/js* に溜まったイベントをまとめて読み出し、
+アナログ入力を軸ごとに最新値へ間引いてから処理する。
+イベントのカーネル時刻(ms)は time.monotonic() 基準に換算し、
+user/input_time として出力する（入力から出力までの遅延計測用）。
+割り当て定義はジョイスティックの初期化時にイベント番号で引く配列へ変換し、
+イベントごとの名前の辞書検索を行わない。
 """
-from donkeycar.parts.controller import Joystick, JoystickController
+import os
+import selectors
+import struct
+import time
 
-''' ELECOM JC-U3912T '''
+from donkeycar.parts.controller import Joystick, JoystickController
 
-class ELECOM_JCU3912T(Joystick):
+# /dev/input/js* のイベント形式（時刻(ms)、値、種別、番号）
+JS_EVENT_FORMAT = 'IhBB'
+JS_EVENT_SIZE = struct.calcsize(JS_EVENT_FORMAT)
+JS_EVENT_BUTTON = 0x01
+JS_EVENT_AXIS = 0x02
+JS_EVENT_INIT = 0x80
+# 1回の read で読み出す最大イベント数
+JS_READ_EVENTS = 64
+# イベント時刻(32ビットのミリ秒)のマスク
+JS_TIME_MASK = 0xffffffff
+
+class DrainingJoystick(Joystick):
     """
-    JC-T3912Tにおける/dev/input/js0 でのボタン/パッド/ジョイスティック
-    各々のコードをマップ化したクラス。
+    /dev/input/js* をノンブロッキングで開き、読み取り可能になった時点で
+    溜まっているイベントをすべて読み出す Joystick クラス。
+    アナログ入力は1回の読み出しの中で軸ごとに最新値のみを残す。
+    ボタン入力は間引かず、直前までのアナログ入力を確定させてから順に返却する。
     """
-    #An interface to a physical joystick available at /dev/input/js0
     def __init__(self, *args, **kwargs):
         """
-        親クラスのコンストラクタを呼び出し、ボタン・ジョイスティック
-        の入力キーを割り当てる。
+        親クラスのコンストラクタを呼び出し、読み出し状態を初期化する。
         引数：
-            可変（親クラスJoystic依存）
+            可変（親クラスJoystick依存）
         戻り値：
             なし
         """
         super().__init__(*args, **kwargs)
-
-        # ボタン定義
-        self.button_names = {
-            # 右ボタン群
-            0x130 : '1',    # X square
-            0x131 : '2',    # Y triangle
-            0x132 : '3',    # A cross
-            0x133 : '4',    # B circle
-            # 上部ボタン群
-            0x134 : '5',    # LT L2
-            0x135 : '6',    # RT R2
-            0x136 : '7',    # LB L1
-            0x137 : '8',    # RB R2
-            # アナログスティック押下
-            0x138 : '9',    # 左アナログスティック押下
-            0x139 : '10',   # 右アナログスティック押下
-            # 中央部ボタン群
-            0x13a : '11',   # back select
-            0x13b : '12',   # start
-        }
-
-        # アナログスティック定義
-        self.axis_names = {
-            # 左アナログスティック
-            0x0 : 'analog_left_horizontal',     # 左アナログ左右
-            0x1 : 'analog_left_vertical',       # 左アナログ上下
-            # 右アナログスティック
-            0x2 : 'analog_right_vertical',      # 右アナログ上下
-            0x5 : 'analog_right_horizontal',    # 右アナログ左右
-            # 十字キー
-            0x10 : 'dpad_horizontal',           # 十字キー左右
-            0x11 : 'dpad_vertical',             # 十字キー上下
-        }
-
-class ELECOM_JCU3912TController(JoystickController):
-    """
-    JC-U3912T ゲームパッドパーツクラス
-    """
-    #A Controller object that maps inputs to actions
-    def __init__(self, *args, **kwargs):
+        self.selector = None
+        self.pending = b''
+        # 読み出し時刻(time.monotonic)、カーネル時刻との差(ms)
+        self.read_time = 0.0
+        self.clock_offset = None
+        # 読み出したイベントの記録先（JoystickRecorder）
+        self.recorder = None
+        # 読み出したイベント数、間引いたアナログ入力イベント数
+        self.read_count = 0
+        self.coalesced_count = 0
+
+    def init(self):
         """
-        親クラスのコンストラクタを呼び出す。
+        親クラスの初期化処理でデバイスを開いた後、ノンブロッキングに切り替えて
+        セレクタへ登録する。
         引数：
-            可変(親クラスJoystickControllerに依存)
-        戻り値：
             なし
+        戻り値：
+            result  boolean 初期化できた場合True
         """
-        super().__init__(*args, **kwargs)
+        if not super().init():
+            return False
+        self.open_selector()
+        return True
 
-
-    def init_js(self):
+    def open_selector(self):
         """
-        親クラスのコンストラクタから呼び出され、
-        ジョイスティック初期化処理を実行する。
+        jsdev をノンブロッキングに切り替え、読み取り待ち用のセレクタへ登録する。
         引数：
             なし
         戻り値：
             なし
         """
-        try:
-            # ボタン定義群が格納されているクラスを生成し、
-            # 初期化処理を実行する。
-            self.js = ELECOM_JCU3912T(self.dev_fn)
-            self.js.init()
-        except FileNotFoundError:
-            print(self.dev_fn, "not found.")
-            self.js = None
-        return self.js is not None
-
+        os.set_blocking(self.jsdev.fileno(), False)
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.jsdev.fileno(), selectors.EVENT_READ)
 
-    def init_trigger_maps(self):
+    def read_events(self, timeout=None):
         """
-        ボタンやアナログスティックへ機能を割り当てる。
+        溜まっているイベントをすべて読み出す。溜まっていない場合のみ、
+        読み取り可能になるまで最大 timeout 秒待つ。
+        イベントの途中までしか読めなかったバイト列は次回へ持ち越す。
         引数：
-            なし
+            timeout float   最大待ち時間(秒)、Noneの場合は読み取り可能になるまで待つ
         戻り値：
-            なし
+            data    bytes   イベント単位のバイト列
         """
-        # ボタン押下時呼び出す関数のマッピング定義 
-        self.button_down_trigger_map = {
-            # 右ボタン群：上
-            '1': self.normal_stop,
-            '2': self.erase_last_N_records,
-
-            # 右ボタン群：下
-            '3': self.emergency_stop,
-            '4': self.toggle_manual_recording,
-
-            # トリガ
-            '5': self.decrease_max_throttle,
-            '6': self.increase_max_throttle,
-
-            # トリガ小
-            '7': self.normal_stop,
-            '8': self.normal_stop,
-
-            # アナログスティック押込   
-            '9': self.normal_stop,
-            '10': self.normal_stop,
-
-            # SELECT 相当
-            '11': self.toggle_mode,
-
-            # START相当
-            '12': self.toggle_constant_throttle,
-        }
-
-        # トリガ型ボタン離脱時呼び出す関数のマッピング定義
-        self.button_up_trigger_map = {} # なし
-
-        # アナログ入力時呼び出す関数のマッピング定義
-        self.axis_trigger_map = {
-            'analog_left_vertical': self.set_throttle,
-            'analog_left_horizontal': self.set_steering,
-            'analog_right_vertical': self.set_throttle,
-            'analog_right_horizontal': self.set_steering,
-            'dpad_horizontal': self.move_left_or_right,
-            'dpad_vertical': self.move_front_or_rear,
-        }
-
-    ''' 親クラスにない機能：マッピング対象の関数 '''
+        if self.selector is None:
+            if timeout:
+                time.sleep(timeout)
+            return b''
+        fd = self.jsdev.fileno()
+        # 入力が続いている間は select を呼び出さずに読み出す
+        data = self.read_chunk(fd)
+        if data is None:
+            if not self.selector.select(timeout):
+                return b''
+            data = self.read_chunk(fd)
+            if data is None:
+                return b''
+        self.read_time = time.monotonic()
+        if len(data) == JS_EVENT_SIZE * JS_READ_EVENTS:
+            chunks = [data]
+            while len(data) == JS_EVENT_SIZE * JS_READ_EVENTS:
+                data = self.read_chunk(fd)
+                if not data:
+                    break
+                chunks.append(data)
+            data = b''.join(chunks)
+        if self.pending:
+            data = self.pending + data
+        size = len(data) - len(data) % JS_EVENT_SIZE
+        if size != len(data):
+            self.pending = data[size:]
+            data = data[:size]
+        else:
+            self.pending = b''
+        if self.recorder is not None and data:
+            self.recorder.write(data, self.read_time)
+        return data
 
-    def normal_stop(self):
+    def read_chunk(self, fd):
         """
-        通常停止する。
+        ノンブロッキングで1回 read する。
+        書き込み側が閉じられた場合（デバイスの切断など）はデバイスを閉じる。
         引数：
+            fd      int     jsdev のファイル記述子
+        戻り値：
+            data    bytes   読み出したバイト列、読み出せるデータがない場合None
+        """
+        try:
+            data = os.read(fd, JS_EVENT_SIZE * JS_READ_EVENTS)
+        except BlockingIOError:
+            return None
+        if not data:
+            self.close()
+        return data
+
+    def drain(self, timeout=None):
+        """
+        溜まっているイベントをすべて読み出し、(種別, 番号, 値, 時刻) のリストとして返却する。
+        番号は axis_map/button_map の添字で、名前への変換はコントローラ側の配列で行う。
+        アナログ入力は軸ごとに最新値のみを残し、ボタン入力の直前もしくは末尾で確定させる。
+        引数：
+            timeout float   最大待ち時間(秒)、Noneの場合は読み取り可能になるまで待つ
+        戻り値：
+            events  list    (typev, number, value, event_time) のリスト
+                            typev は JS_EVENT_BUTTON(value は 1:押下、0:離脱) もしくは
+                            JS_EVENT_AXIS(value は -1.0～1.0)、
+                            event_time は time.monotonic() 基準の秒
+        """
+        data = self.read_events(timeout)
+        if not data:
+            return []
+        # 最後のイベントが最も読み出しまでの遅れが小さいため、時刻差の推定に使用する
+        read_time = self.read_time
+        now_ms = int(read_time * 1000)
+        newest = struct.unpack_from(JS_EVENT_FORMAT, data, len(data) - JS_EVENT_SIZE)[0]
+        self.update_clock_offset(newest, now_ms)
+        # 各イベント時刻(ms)は読み出しまでの遅れ ((base - tval) & JS_TIME_MASK) を
+        # 読み出し時刻から引いて time.monotonic() 基準の秒へ換算する
+        base = now_ms - self.clock_offset
+        self.read_count += len(data) // JS_EVENT_SIZE
+        events = []
+        axes = {}
+        for tval, value, typev, number in struct.iter_unpack(JS_EVENT_FORMAT, data):
+            if typev & JS_EVENT_INIT:
+                continue
+            if typev & JS_EVENT_BUTTON:
+                if axes:
+                    self.flush_axes(axes, events, base)
+                self.button_states[self.button_map[number]] = value
+                events.append((JS_EVENT_BUTTON, number, value,
+                    read_time - ((base - tval) & JS_TIME_MASK) / 1000.0))
+            elif typev & JS_EVENT_AXIS:
+                if number in axes:
+                    self.coalesced_count += 1
+                axes[number] = (value, tval)
+        if axes:
+            self.flush_axes(axes, events, base)
+        return events
+
+    def flush_axes(self, axes, events, base):
+        """
+        間引き中のアナログ入力値を確定させ、events へ追加する。
+        引数：
+            axes    dict    軸番号 → (最新の生値(-32767～32767), イベント時刻(ms))、処理後は空になる
+            events  list    (typev, number, value, event_time) のリスト
+            base    int     読み出し時刻(ms)からカーネル時刻との差を引いた値
+        戻り値：
             なし
+        """
+        read_time = self.read_time
+        axis_states = self.axis_states
+        axis_map = self.axis_map
+        for number, (value, tval) in axes.items():
+            fvalue = value / 32767.0
+            axis_states[axis_map[number]] = fvalue
+            events.append((JS_EVENT_AXIS, number, fvalue,
+                read_time - ((base - tval) & JS_TIME_MASK) / 1000.0))
+        axes.clear()
+
+    def update_clock_offset(self, tval, now_ms):
+        """
+        カーネルのイベント時刻(jiffies 基準のミリ秒)と time.monotonic() の差を更新する。
+        読み出しまでの遅れが最も小さかった時の差を採用するため、差は減る方向にのみ更新する。
+        引数：
+            tval    int     イベント時刻(ms)
+            now_ms  int     読み出し時刻(ms)
         戻り値：
             なし
         """
-        self.set_throttle(0)
-        self.set_steering(0)
+        offset = (now_ms - tval) & JS_TIME_MASK
+        if self.clock_offset is None or \
+            (offset - self.clock_offset) & JS_TIME_MASK > JS_TIME_MASK >> 1:
+            self.clock_offset = offset
 
-    def move_left_or_right(self, axis_val):
+    def start_recording(self, path):
         """
-        左右へ最大速度で移動する。
+        以降に読み出したイベントをファイルへ記録する（parts.js_record 参照）。
+        init の後に呼び出すこと。
         引数：
-            axis_val    ゼロ：停止
+            path    str     記録ファイルのパス
         戻り値：
             なし
         """
-        if axis_val > 0:
-            self.set_throttle(-1)
-            self.set_steering(1)
-        elif axis_val < 0:
-            self.set_throttle(-1)
-            self.set_steering(-1)
-        else:
-            self.set_throttle(0)
-            self.set_steering(0)
+        from .js_record import JoystickRecorder
+        self.stop_recording()
+        self.recorder = JoystickRecorder(path, self)
 
-    def move_front_or_rear(self, axis_val):
+    def stop_recording(self):
         """
-        前後へ最大速度で移動する。
+        イベントの記録を停止し、ファイルを閉じる。
         引数：
-            axis_val    ゼロ：停止
+            なし
         戻り値：
             なし
         """
-        self.set_steering(0)
-        if axis_val > 0:
-            self.set_throttle(1)
-        elif axis_val < 0:
-            self.set_throttle(-1)
-        else:
-            self.set_throttle(0)
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
 
-    def set_steering_analog(self, axis_val):
+    def close(self):
         """
-        アナログスティックでステアリング操作を行う。
-        十字キーとアナログキーの左右値がことなるため、
-        別途実装している。
+        記録を停止し、セレクタとデバイスを閉じる。
         引数：
-            axis_val    ゼロ：停止
+            なし
         戻り値：
             なし
         """
-        return self.set_steering(axis_val * (-1))
-
-''' ELECOM JC-U4113S '''
-
-class ELECOM_JCU4113SJoystick(Joystick):
+        self.stop_recording()
+        if self.selector is not None:
+            self.selector.close()
+            self.selector = None
+        if self.jsdev is not None:
+            self.jsdev.close()
+            self.jsdev = None
+
+class DrainingJoystickController(JoystickController):
     """
-    JC-U4113Sにおける/dev/input/js0 でのボタン/パッド/ジョイスティック
-    各々のコードをマップ化したクラス。
-    注意：X-Box互換モードで使用すること。
+    DrainingJoystick から溜まった入力イベントをまとめて受け取り、
+    axis_trigger_map/button_down_trigger_map/button_up_trigger_map の関数を
+    呼び出すコントローラの基底クラス。
+    ジョイスティックの初期化後、各 trigger map をイベント番号で引く配列へ変換し、
+    1件のイベントは配列の添字1回で呼び出し先を決める。
+    割り当てられた関数を呼び出したイベントの時刻を input_time として保持し、
+    手動運転時は run_threaded の5番目の戻り値（user/input_time）として返却する。
+    add_stop_hook で登録した関数は、停止操作の直後にジョイスティックのスレッドから呼び出し、
+    Vehicle ループが停止後の値を読み出した時点で再開用の関数を呼び出す。
     """
+    # 停止要求を確認する間隔(秒)
+    DRAIN_TIMEOUT = 0.1
+
     def __init__(self, *args, **kwargs):
         """
-        親クラスのコンストラクタを呼び出し、ボタン・ジョイスティック
-        の入力キーを割り当てる。
+        入力時刻を初期化し、親クラスのコンストラクタを呼び出す。
         引数：
-            可変（親クラスJoystic依存）
+            可変（親クラスJoystickController依存）
         戻り値：
             なし
         """
+        self.input_time = None
+        self.record_path = None
+        # イベント番号 → 呼び出す関数（未割り当ての場合None）の配列
+        self.axis_table = None
+        self.button_tables = None
+        # 停止フック [停止関数, 再開関数, 停止関数の戻り値] のリスト
+        self.stop_hooks = []
+        # 停止フックを呼び出した回数、再開関数を呼び出し済みの回数
+        self.stop_count = 0
+        self.resumed_count = 0
         super().__init__(*args, **kwargs)
 
-        # ボタン入力定義
-        self.button_names = {
-            # 右ボタン群
-            0x133 : '1',    # X
-            0x134 : '2',    # Y
-            0x130 : '3',    # A
-            0x131 : '4',    # B
-            # 上部ボタン群
-            0x136 : '5',    # LB
-            0x137 : '6',    # RB
-            # 中央部ボタン群
-            0x13a : '11',   # BACK
-            0x13b : '12',   # START
-            0x13c : '13',   # GUIDE
-            # アナログスティック押下
-            0x13d : '9',    # 左アナログスティック押下
-            0x13e : '10',   # 右アナログスティック押下
-        }
-
-        # アナログ入力定義
-        self.axis_names = {
-            # 左アナログスティック
-            0x0 : 'left_horz',  # 左アナログ上下
-            0x1 : 'left_vert',  # 左アナログ左右
-            # 右アナログスティック
-            0x3 : 'right_horz', # 右アナログ上下
-            0x4 : 'right_vert', # 右アナログ左右
-            # 十字キー
-            0x10 : 'dpad_horz', # 十字キー左右
-            0x11 : 'dpad_vert', # 十字キー上下
-            # 上部ボタン群
-            0x2 : '7',          # LT
-            0x5 : '8',          # RT
-        }
-
-class ELECOM_JCU4113SJoystickController(JoystickController):
-    """
-    ELECOM社製JC-U4113S XBox互換 ワイヤレスゲームパッド
-    パーツクラス
-    """
-    def __init__(self, *args, **kwargs):
+    def compile_tables(self):
         """
-        親クラスのコンストラクタを呼び出す。
+        js の axis_map/button_map（番号 → 名前）と各 trigger map（名前 → 関数）から、
+        イベント番号で引く呼び出し先の配列を作成する。番号は1バイトのため256要素とする。
         引数：
-            可変
+            なし
         戻り値：
             なし
         """
-        super().__init__(*args, **kwargs)
+        axis_table = [None] * 256
+        up_table = [None] * 256
+        down_table = [None] * 256
+        for number, name in enumerate(self.js.axis_map):
+            axis_table[number] = self.axis_trigger_map.get(name)
+        for number, name in enumerate(self.js.button_map):
+            up_table[number] = self.button_up_trigger_map.get(name)
+            down_table[number] = self.button_down_trigger_map.get(name)
+        self.axis_table = axis_table
+        # 添字は押下状態（0:離脱、1:押下）
+        self.button_tables = (up_table, down_table)
+        # 接続したゲームパッドにない入力へ割り当てた機能は呼び出されないため警告する
+        missing = sorted(
+            set(self.axis_trigger_map).difference(self.js.axis_map) |
+            set(self.button_up_trigger_map).union(
+                self.button_down_trigger_map).difference(self.js.button_map))
+        if missing:
+            print('[DrainingJoystickController] not found on {}: {}'.format(
+                str(self.js.dev_fn), ', '.join(missing)))
+
+    def set_button_down_trigger(self, button, func):
+        """
+        ボタン押下時に呼び出す関数を割り当て、変換済みの配列へも反映する。
+        """
+        super().set_button_down_trigger(button, func)
+        if self.axis_table is not None:
+            self.compile_tables()
 
+    def set_button_up_trigger(self, button, func):
+        """
+        ボタン離脱時に呼び出す関数を割り当て、変換済みの配列へも反映する。
+        """
+        super().set_button_up_trigger(button, func)
+        if self.axis_table is not None:
+            self.compile_tables()
 
-    def init_js(self):
+    def set_axis_trigger(self, axis, func):
         """
-        親クラスのコンストラクタから呼び出され、
-        ジョイスティック初期化処理を実行する。
+        アナログ入力時に呼び出す関数を割り当て、変換済みの配列へも反映する。
+        """
+        super().set_axis_trigger(axis, func)
+        if self.axis_table is not None:
+            self.compile_tables()
+
+    def add_stop_hook(self, stop, resume=None):
+        """
+        停止操作（emergency_stop/normal_stop）時に呼び出す関数を登録する。
+        stop はジョイスティックのスレッドから、throttle/angle を0にした直後に呼び出す。
+        resume は Vehicle ループのスレッドから、run_threaded が停止後の値を返却する時点で
+        （emergency_stop の場合は E-Stop の一連の出力が終わった時点で）、
+        値を読み出す前に確認した stop の戻り値を引数として呼び出す。
         引数：
-            なし
+            stop        function    引数なしの停止関数（TankDriveTrain.stop など）
+            resume      function    停止関数の戻り値を引数とする再開関数、None可
         戻り値：
             なし
         """
-        try:
-            # ボタンやアナログ入力定義を行う
-            self.js = ELECOM_JCU4113SJoystick(self.dev_fn)
-            self.js.init()
-        except FileNotFoundError:
-            print(self.dev_fn, "not found.")
-            self.js = None
-        return self.js is not None
+        self.stop_hooks.append([stop, resume, None])
 
-    def init_trigger_maps(self):
+    def fire_stop_hooks(self):
         """
-        ボタンやアナログスティックへ機能を割り当てる。
+        登録済みの停止関数を順に呼び出す。
         引数：
             なし
         戻り値：
             なし
         """
-        # ボタン押下時呼び出す関数のマッピング定義 
-        self.button_down_trigger_map = {
-            # 右ボタン群：上
-            '1':    self.normal_stop,
-            '2':    self.erase_last_N_records,
-            # 右ボタン群：下
-            '3':    self.emergency_stop,
-            '4':    self.toggle_manual_recording,
-            # トリガ
-            '5':    self.decrease_max_throttle,
-            '6':    self.increase_max_throttle,
-            # トリガ小
-            #'7':   self.normal_stop,
-            #'8':   self.normal_stop,
-            # アナログスティック押込   
-            '9':    self.normal_stop,
-            '10':   self.normal_stop,
-            # SELECT 相当
-            '11':   self.toggle_mode,
-            # START相当
-            '12':   self.toggle_constant_throttle,
-            # GUIDE
-            '13':   self.emergency_stop,
-        }
-
-        # トリガ型ボタン離脱時呼び出す関数のマッピング定義
-        self.button_up_trigger_map = {} # なし
-
-        # アナログ入力時呼び出す関数のマッピング定義
-        self.axis_trigger_map = {
-            # 左アナログスティック
-            'left_vert': self.set_throttle,
-            'left_horz': self.set_steering,
-            # 右アナログスティック
-            'right_vert': self.set_throttle,
-            'right_horz': self.set_steering,
-            # 十字キー
-            'dpad_horz': self.move_left_or_right,
-            'dpad_vert':    self.move_front_or_rear,
-            # 上部ボタン群下のトリガボタン
-            '7':            self.normal_stop_axis,
-            '8':            self.normal_stop_axis,
-        }
-
-    ''' 親クラスにない機能：マッピング対象の関数 '''
-
-    def normal_stop(self):
+        for hook in self.stop_hooks:
+            try:
+                hook[2] = hook[0]()
+            except Exception as e:
+                print('[DrainingJoystickController] stop hook failed: {}'.format(str(e)))
+        self.stop_count += 1
+
+    def emergency_stop(self):
         """
-        通常停止する。
+        親クラスの E-Stop 処理の後、停止フックを呼び出す。
         引数：
             なし
         戻り値：
             なし
         """
-        self.set_throttle(0)
-        self.set_steering(0)
-    
-    def normal_stop_axis(self, axis_val):
+        super().emergency_stop()
+        self.fire_stop_hooks()
+
+    def set_record_path(self, path):
         """
-        押下時に通常停止する。
+        ジョイスティックの初期化後、読み出したイベントを記録するファイルを指定する。
         引数：
-            axis_val    非ゼロ：通常停止
+            path    str     記録ファイルのパス（time.strftime の書式を展開する）、Noneの場合は記録しない
         戻り値：
             なし
         """
-        if axis_val != 0:
-            self.normal_stop()
+        self.record_path = path
 
-    def move_left_or_right(self, axis_val):
+    def set_replay(self, path, speed=1.0):
         """
-        左右へ最大速度で移動する。
+        ジョイスティックの代わりに記録ファイルのイベントを再生する。
         引数：
-            axis_val    ゼロ：停止
+            path    str     記録ファイルのパス
+            speed   float   再生速度の倍率、0の場合は最大速度
         戻り値：
             なし
         """
-        if axis_val > 0:
-            self.set_throttle(-1)
-            self.set_steering(1)
-        elif axis_val < 0:
-            self.set_throttle(-1)
-            self.set_steering(-1)
-        else:
-            self.set_throttle(0)
-            self.set_steering(0)
+        from .js_record import ReplayJoystick
+        self.js = ReplayJoystick(path, speed=speed)
+        self.js.init()
+        self.compile_tables()
 
-    def move_front_or_rear(self, axis_val):
+    def update(self):
         """
-        前後へ最大速度で移動する。
+        ジョイスティックの初期化を待ち、入力イベントを処理し続ける。
+        drain を持たない js（ネットワーク経由など）の場合は親クラスの処理を使用する。
         引数：
-            axis_val    ゼロ：停止
+            なし
         戻り値：
             なし
         """
-        self.set_steering(0)
-        if axis_val > 0:
-            self.set_throttle(1)
-        elif axis_val < 0:
-            self.set_throttle(-1)
-        else:
-            self.set_throttle(0)
-
-    def set_steering_analog(self, axis_val):
+        while self.running and self.js is None and not self.init_js():
+            time.sleep(3)
+        if not hasattr(self.js, 'drain'):
+            return super().update()
+        if self.record_path is not None:
+            self.js.start_recording(time.strftime(self.record_path))
+        self.compile_tables()
+        while self.running:
+            self.dispatch_events(self.js.drain(self.DRAIN_TIMEOUT))
+            if self.poll_delay > 0:
+                time.sleep(self.poll_delay)
+
+    def dispatch(self, typev, number, value, event_time=None):
         """
-        アナログスティックでステアリング操作を行う。
-        十字キーとアナログキーの左右値がことなるため、
-        別途実装している。
+        1件の入力イベントに割り当てられた関数を呼び出す。
+        compile_tables の後に呼び出すこと。
         引数：
-            axis_val    ゼロ：停止
+            typev       int     JS_EVENT_BUTTON もしくは JS_EVENT_AXIS
+            number      int     ボタン/アナログ入力の番号(0～255)
+            value       int/float   ボタンの場合 1:押下、0:離脱、アナログ入力の場合 -1.0～1.0
+            event_time  float   イベント時刻(time.monotonic() 基準の秒)、None可
         戻り値：
             なし
         """
-        return self.set_steering(axis_val * (-1))
+        self.dispatch_events(((typev, number, value, event_time),))
 
-''' SONY PS3 コントローラ '''
-
-class PS3Joystick(Joystick):
-    """
-    PS3コントローラのボタン・アナログ入力定義をおこなうクラス。
-    """
-    def __init__(self, *args, **kwargs):
+    def dispatch_events(self, events):
+        """
+        drain で読み出した入力イベントに割り当てられた関数を順に呼び出す。
+        入力時刻は関数を割り当てたイベントのうち最後に処理したものの時刻とする。
+        compile_tables の後に呼び出すこと。
+        引数：
+            events  list    (typev, number, value, event_time) のリスト
+        戻り値：
+            なし
         """
-        親クラスの初期処理実行後、PS3コントローラの
-        ボタン・アナログ入力定義を行う。
+        if not events:
+            return
+        axis_table = self.axis_table
+        button_tables = self.button_tables
+        event_time = None
+        for event in events:
+            if event[0] == JS_EVENT_AXIS:
+                func = axis_table[event[1]]
+                if func is not None:
+                    func(event[2])
+                    event_time = event[3]
+            else:
+                func = button_tables[event[2] != 0][event[1]]
+                if func is not None:
+                    func()
+                    event_time = event[3]
+        if event_time is not None:
+            self.input_time = event_time
+
+    def run_threaded(self, img_arr=None, mode=None, recording=None):
         """
-        super().__init__(*args, **kwargs)
-        # ボタン入力
-        self.button_names = {
+        親クラスの戻り値に、手動運転時のみ直近の入力イベント時刻を加えて返却する。
+        停止フックの停止関数を呼び出した後、停止後の値を返却する時点で再開関数を呼び出す。
+        引数：
+            img_arr     カメラ画像
+            mode        str     運転モード
+            recording   boolean 記録中かどうか
+        戻り値：
+            angle       float   ステアリング値
+            throttle    float   スロットル値
+            mode        str     運転モード
+            recording   boolean 記録中かどうか
+            input_time  float   直近の入力イベント時刻(time.monotonic() 基準の秒)、
+                                手動運転以外もしくは入力がない場合None
+        """
+        # 値を読み出す前に停止回数を確認し、停止後の値を返却する場合のみ再開させる
+        stop_count = self.stop_count
+        if stop_count != self.resumed_count:
+            tokens = [hook[2] for hook in self.stop_hooks]
+        angle, throttle, mode, recording = super().run_threaded(img_arr, mode, recording)
+        if stop_count != self.resumed_count and self.estop_state == self.ES_IDLE:
+            self.resumed_count = stop_count
+            for (_, resume, _), token in zip(self.stop_hooks, tokens):
+                if resume is not None:
+                    resume(token)
+        return angle, throttle, mode, recording, \
+            self.input_time if mode == 'user' else None
+
+    def shutdown(self):
+        """
+        親クラスの処理で入力処理スレッドの終了を待った後、イベントの記録を停止する。
+        引数：
+            なし
+        戻り値：
+            なし
+        """
+        super().shutdown()
+        if self.js is not None and hasattr(self.js, 'stop_recording'):
+            self.js.stop_recording()
+
+
+''' ゲームパッドの割り当て定義 '''
+
+# CONTROLLER_TYPE → ゲームパッドの割り当て定義
+#   'buttons'       ボタンのコード(JSIOCGBTNMAP) → ボタン名
+#   'axes'          アナログ入力のコード(JSIOCGAXMAP) → アナログ入力名
+#   'button_down'   ボタン名 → 押下時の機能
+#   'button_up'     ボタン名 → 離脱時の機能
+#   'axis'          アナログ入力名 → 入力時の機能（入力値を引数とする）
+#   'steering_dir'  ステアリング値の向き（省略時:1.0）
+# 機能は MappedJoystickController のメソッド名、
+# もしくは (メソッド名, 引数, ...) のタプル（ボタンのみ）で指定する。
+JOYSTICK_MAPPINGS = {
+    # ELECOM JC-U3912T
+    'JCU3912T': {
+        'buttons': {
+            # 右ボタン群
+            0x130 : '1',    # X square
+            0x131 : '2',    # Y triangle
+            0x132 : '3',    # A cross
+            0x133 : '4',    # B circle
+            # 上部ボタン群
+            0x134 : '5',    # LT L2
+            0x135 : '6',    # RT R2
+            0x136 : '7',    # LB L1
+            0x137 : '8',    # RB R2
+            # アナログスティック押下
+            0x138 : '9',    # 左アナログスティック押下
+            0x139 : '10',   # 右アナログスティック押下
+            # 中央部ボタン群
+            0x13a : '11',   # back select
+            0x13b : '12',   # start
+        },
+        'axes': {
+            # 左アナログスティック
+            0x0 : 'analog_left_horizontal',     # 左アナログ左右
+            0x1 : 'analog_left_vertical',       # 左アナログ上下
+            # 右アナログスティック
+            0x2 : 'analog_right_vertical',      # 右アナログ上下
+            0x5 : 'analog_right_horizontal',    # 右アナログ左右
+            # 十字キー
+            0x10 : 'dpad_horizontal',           # 十字キー左右
+            0x11 : 'dpad_vertical',             # 十字キー上下
+        },
+        'button_down': {
+            # 右ボタン群：上
+            '1':    'normal_stop',
+            '2':    'erase_last_N_records',
+            # 右ボタン群：下
+            '3':    'emergency_stop',
+            '4':    'toggle_manual_recording',
+            # トリガ
+            '5':    'decrease_max_throttle',
+            '6':    'increase_max_throttle',
+            # トリガ小
+            '7':    'normal_stop',
+            '8':    'normal_stop',
+            # アナログスティック押込
+            '9':    'normal_stop',
+            '10':   'normal_stop',
+            # SELECT 相当
+            '11':   'toggle_mode',
+            # START相当
+            '12':   'toggle_constant_throttle',
+        },
+        'button_up': {},
+        'axis': {
+            'analog_left_vertical':     'set_throttle',
+            'analog_left_horizontal':   'set_steering',
+            'analog_right_vertical':    'set_throttle',
+            'analog_right_horizontal':  'set_steering',
+            'dpad_horizontal':          'move_left_or_right',
+            'dpad_vertical':            'move_front_or_rear',
+        },
+    },
+    # ELECOM JC-U4113S（X-Box互換モードで使用すること）
+    'JCU4113S': {
+        'buttons': {
+            # 右ボタン群
+            0x133 : '1',    # X
+            0x134 : '2',    # Y
+            0x130 : '3',    # A
+            0x131 : '4',    # B
+            # 上部ボタン群
+            0x136 : '5',    # LB
+            0x137 : '6',    # RB
+            # 中央部ボタン群
+            0x13a : '11',   # BACK
+            0x13b : '12',   # START
+            0x13c : '13',   # GUIDE
+            # アナログスティック押下
+            0x13d : '9',    # 左アナログスティック押下
+            0x13e : '10',   # 右アナログスティック押下
+        },
+        'axes': {
+            # 左アナログスティック
+            0x0 : 'left_horz',  # 左アナログ上下
+            0x1 : 'left_vert',  # 左アナログ左右
+            # 右アナログスティック
+            0x3 : 'right_horz', # 右アナログ上下
+            0x4 : 'right_vert', # 右アナログ左右
+            # 十字キー
+            0x10 : 'dpad_horz', # 十字キー左右
+            0x11 : 'dpad_vert', # 十字キー上下
+            # 上部ボタン群
+            0x2 : '7',          # LT
+            0x5 : '8',          # RT
+        },
+        'button_down': {
+            # 右ボタン群：上
+            '1':    'normal_stop',
+            '2':    'erase_last_N_records',
+            # 右ボタン群：下
+            '3':    'emergency_stop',
+            '4':    'toggle_manual_recording',
+            # トリガ
+            '5':    'decrease_max_throttle',
+            '6':    'increase_max_throttle',
+            # アナログスティック押込
+            '9':    'normal_stop',
+            '10':   'normal_stop',
+            # SELECT 相当
+            '11':   'toggle_mode',
+            # START相当
+            '12':   'toggle_constant_throttle',
+            # GUIDE
+            '13':   'emergency_stop',
+        },
+        'button_up': {},
+        'axis': {
+            # 左アナログスティック
+            'left_vert':    'set_throttle',
+            'left_horz':    'set_steering',
+            # 右アナログスティック
+            'right_vert':   'set_throttle',
+            'right_horz':   'set_steering',
+            # 十字キー
+            'dpad_horz':    'move_left_or_right',
+            'dpad_vert':    'move_front_or_rear',
+            # 上部ボタン群下のトリガボタン
+            '7':            'normal_stop_axis',
+            '8':            'normal_stop_axis',
+        },
+    },
+    # SONY PS3 コントローラ
+    'PS3': {
+        'buttons': {
+            0x220 : 'dpad_up',
+            0x221 : 'dpad_down',
+            0x222 : 'dpad_left',
+            0x223 : 'dpad_right',
+            0x130 : 'cross',
+            0x131 : 'circle',
+            0x133 : 'triangle',
+            0x134 : 'square',
+            0x136 : 'l1',
+            0x137 : 'r1',
+            0x138 : 'l2',
+            0x139 : 'r2',
+            0x13a : 'select',
+            0x13b : 'start',
+            0x13c : 'logo',
+            0x13d : 'left_analog',
+            0x13e : 'right_analog',
+        },
+        'axes': {
+            0x0 : 'left_horz',
+            0x1 : 'left_vert',
+            0x2 : 'l2_axis',
+            0x3 : 'right_horz',
+            0x4 : 'right_vert',
+            0x5 : 'r2_axis',
+        },
+        'button_down': {
+            # 右ボタン群：上
+            'square':       'normal_stop',
+            'triangle':     'erase_last_N_records',
+            # 右ボタン群：下
+            'cross':        'emergency_stop',
+            'circle':       'toggle_manual_recording',
+            # トリガ
+            'l2':           'decrease_max_throttle',
+            'r2':           'increase_max_throttle',
+            # トリガ小
+            'l1':           'normal_stop',
+            'r1':           'normal_stop',
+            # アナログスティック押込
+            'left_analog':  'normal_stop',
+            'right_analog': 'normal_stop',
+            # SELECT 相当
+            'select':       'toggle_mode',
+            # START相当
+            'start':        'toggle_constant_throttle',
+            # 十字キー（左右とも右旋回、従来の動作のまま）
+            'dpad_left':    ('drive', -1, 1),
+            'dpad_right':   ('drive', -1, 1),
+            'dpad_up':      ('set_throttle', 1),
+            'dpad_down':    ('set_throttle', -1),
+        },
+        'button_up': {
+            # 十字キー
+            'dpad_left':    ('set_steering', 0),
+            'dpad_right':   ('set_steering', 0),
+            'dpad_up':      ('set_throttle', 0),
+            'dpad_down':    ('set_throttle', 0),
+        },
+        'axis': {
+            'left_vert':    'set_throttle',
+            'left_horz':    'set_steering',
+            'right_vert':   'set_throttle',
+            'right_horz':   'set_steering',
+        },
+    },
+    # SONY PS3 コントローラ（二輪車両向け）
+    'PS3TwoWheels': {
+        'buttons': {
             0x220 : 'dpad_up',
             0x221 : 'dpad_down',
             0x222 : 'dpad_left',
@@ -447,42 +756,187 @@ class PS3Joystick(Joystick):
             0x13c : 'logo',
             0x13d : 'left_analog',
             0x13e : 'right_analog',
-        }
-        # アナログ入力
-        self.axis_names = {
+        },
+        'axes': {
             0x0 : 'left_horz',
             0x1 : 'left_vert',
             0x2 : 'l2_axis',
             0x3 : 'right_horz',
             0x4 : 'right_vert',
             0x5 : 'r2_axis',
-        }
-
-class PS3JoystickController(JoystickController):
+        },
+        'button_down': {
+            # 右ボタン群：上
+            'square':       'on_recording',
+            'triangle':     'off_recording',
+            # 右ボタン群：下
+            'cross':        'set_user_init',
+            'circle':       'set_local_init',
+            # トリガ
+            'l2':           'normal_stop',
+            'r2':           'emergency_stop',
+            # トリガ小
+            'l1':           'decrease_max_throttle',
+            'r1':           'increase_max_throttle',
+            # アナログスティック押込
+            'left_analog':  'normal_stop',
+            'right_analog': 'erase_last_N_records',
+            # START相当
+            'start':        'toggle_mode',
+            # SELECT 相当
+            'select':       'toggle_manual_recording',
+            # 十字キー
+            'dpad_up':      ('set_throttle', 1),
+            'dpad_down':    ('set_throttle', -1),
+            'dpad_left':    ('drive', -1, -1),
+            'dpad_right':   ('drive', -1, 1),
+        },
+        'button_up': {
+            # 十字キー
+            'dpad_up':      'normal_stop',
+            'dpad_down':    'normal_stop',
+            'dpad_left':    'normal_stop',
+            'dpad_right':   'normal_stop',
+        },
+        'axis': {
+            'right_horz':   'set_steering',
+            'left_vert':    'set_throttle',
+        },
+    },
+    # SONY PS4 コントローラ（二輪車両向け）
+    'PS4TwoWheels': {
+        'buttons': {
+            0x134 : 'square',
+            0x133 : 'triangle',
+            0x131 : 'circle',
+            0x130 : 'cross',
+            0x13d : 'L3',
+            0x13e : 'R3',
+            0x13c : 'PS',
+            0x13a : 'share',
+            0x13b : 'options',
+            0x136 : 'L1',
+            0x138 : 'L2',
+            0x137 : 'R1',
+            0x139 : 'R2',
+        },
+        'axes': {
+            0x0 : 'left_stick_horz',
+            0x1 : 'left_stick_vert',
+            0x4 : 'right_stick_vert',
+            0x3 : 'right_stick_horz',
+            0x10 : 'dpad_leftright',
+            0x11 : 'dpad_updown',
+        },
+        'button_down': {
+            # 右ボタン群：上
+            'square':       'on_recording',
+            'triangle':     'off_recording',
+            # 右ボタン群：下
+            'cross':        'set_user_init',
+            'circle':       'set_local_init',
+            # トリガ
+            'L2':           'normal_stop',
+            'R2':           'emergency_stop',
+            # トリガ小
+            'L1':           'decrease_max_throttle',
+            'R1':           'increase_max_throttle',
+            # アナログスティック押込
+            'L3':           'normal_stop',
+            'R3':           'erase_last_N_records',
+            # START相当
+            'share':        'toggle_mode',
+            # SELECT 相当
+            'options':      'toggle_manual_recording',
+        },
+        'button_up': {},
+        'axis': {
+            'right_stick_horz': 'set_steering',
+            'right_stick_vert': 'set_throttle',
+            'left_stick_horz':  'set_steering',
+            'left_stick_vert':  'set_throttle',
+            'dpad_leftright':   'move_leftright',
+            'dpad_updown':      'move_front_or_rear',
+        },
+        'steering_dir': -1.0,
+    },
+}
+# PS3 コントローラ（有線接続）は JC-U4113S と同じ割り当てで動作する
+JOYSTICK_MAPPINGS['ps3_on_wire'] = JOYSTICK_MAPPINGS['JCU4113S']
+
+def check_mapping(mapping):
+    """
+    割り当て定義の button_down/button_up/axis の名前が、
+    buttons/axes に定義されているかを確認する。
+    引数：
+        mapping     dict    割り当て定義（JOYSTICK_MAPPINGS の値と同じ形式）
+    戻り値：
+        なし（定義されていない名前がある場合は ValueError）
     """
-    SONY PS3コントローラパーツクラス
+    button_names = set(mapping.get('buttons', {}).values())
+    axis_names = set(mapping.get('axes', {}).values())
+    missing = []
+    for key, names in (('button_down', button_names),
+            ('button_up', button_names), ('axis', axis_names)):
+        missing.extend('{}:{}'.format(key, name)
+            for name in mapping.get(key, {}) if name not in names)
+    if missing:
+        raise ValueError('unknown names in joystick mapping: {}'.format(
+            ', '.join(missing)))
+
+class MappedJoystick(DrainingJoystick):
     """
-    def __init__(self, *args, **kwargs):
+    割り当て定義のボタン/アナログ入力のコード → 名前の辞書を使用する Joystick クラス。
+    """
+    def __init__(self, dev_fn='/dev/input/js0', button_names=None, axis_names=None):
         """
-        親クラスの初期化処理を実行する。
+        親クラスのコンストラクタを呼び出し、ボタン・ジョイスティック
+        の入力キーを割り当てる。
         引数：
+            dev_fn          str     デバイスファイルのパス
+            button_names    dict    ボタンのコード → ボタン名
+            axis_names      dict    アナログ入力のコード → アナログ入力名
+        戻り値：
             なし
+        """
+        super().__init__(dev_fn=dev_fn)
+        self.button_names = dict(button_names or {})
+        self.axis_names = dict(axis_names or {})
+
+class MappedJoystickController(DrainingJoystickController):
+    """
+    JOYSTICK_MAPPINGS 形式の割り当て定義に従って動作するゲームパッドパーツクラス。
+    ゲームパッドごとのクラスは作成せず、割り当て定義のみを追加して使用する。
+    """
+    def __init__(self, mapping, *args, **kwargs):
+        """
+        割り当て定義を確認して保持し、親クラスのコンストラクタを呼び出す。
+        引数：
+            mapping     dict    割り当て定義（JOYSTICK_MAPPINGS の値と同じ形式）
+            可変(親クラスJoystickControllerに依存)
         戻り値：
             なし
         """
+        check_mapping(mapping)
+        self.mapping = mapping
+        self.steering_dir = float(mapping.get('steering_dir', 1.0))
         super().__init__(*args, **kwargs)
 
     def init_js(self):
         """
-        SONY PS3固有の定義をおこなう。
+        親クラスのコンストラクタから呼び出され、
+        ジョイスティック初期化処理を実行する。
         引数：
             なし
         戻り値：
-            なし
+            result  boolean 初期化できた場合True
         """
         try:
-            self.js = PS3Joystick(self.dev_fn)
-            self.js.init()
+            self.js = MappedJoystick(self.dev_fn,
+                button_names=self.mapping.get('buttons'),
+                axis_names=self.mapping.get('axes'))
+            if not self.js.init():
+                self.js = None
         except FileNotFoundError:
             print(self.dev_fn, "not found.")
             self.js = None
@@ -490,70 +944,67 @@ class PS3JoystickController(JoystickController):
 
     def init_trigger_maps(self):
         """
-        ボタンやアナログスティックへ機能を割り当てる。
+        割り当て定義の機能名をメソッドへ変換し、ボタンやアナログスティックへ割り当てる。
         引数：
             なし
         戻り値：
             なし
         """
-        # ボタン押下時呼び出す関数のマッピング定義 
         self.button_down_trigger_map = {
-            # 右ボタン群：上
-            'square':   self.normal_stop,
-            'triangle': self.erase_last_N_records,
-
-            # 右ボタン群：下
-            'cross':    self.emergency_stop,
-            'circle':   self.toggle_manual_recording,
-
-            # トリガ
-            'l2': self.decrease_max_throttle,
-            'r2': self.increase_max_throttle,
-
-            # トリガ小
-            'l1': self.normal_stop,
-            'r1': self.normal_stop,
-
-            # アナログスティック押込   
-            'left_analog':  self.normal_stop,
-            'right_analog': self.normal_stop,
-
-            # SELECT 相当
-            'select': self.toggle_mode,
-
-            # START相当
-            'start': self.toggle_constant_throttle,
-
-            # 十字キー
-            'dpad_left':    self.move_left,
-            'dpad_right':   self.move_right,
-            'dpad_up':      self.move_front,
-            'dpad_down':    self.move_rear,
-        }
-
-        # トリガ型ボタン離脱時呼び出す関数のマッピング定義
+            name: self.resolve_action(action)
+            for name, action in self.mapping.get('button_down', {}).items()}
         self.button_up_trigger_map = {
-            # 十字キー
-            'dpad_left':    self.move_stop_steer,
-            'dpad_right':   self.move_stop_steer,
-            'dpad_up':      self.move_stop,
-            'dpad_down':    self.move_stop,
-        } # なし
-
-        # アナログ入力時呼び出す関数のマッピング定義
+            name: self.resolve_action(action)
+            for name, action in self.mapping.get('button_up', {}).items()}
         self.axis_trigger_map = {
-            'left_vert': self.set_throttle,
-            'left_horz': self.set_steering,
-            'right_vert': self.set_throttle,
-            'right_horz': self.set_steering,
+            name: getattr(self, action)
+            for name, action in self.mapping.get('axis', {}).items()}
 
-        }
+    def resolve_action(self, action):
+        """
+        ボタンの機能指定を引数なしで呼び出せる関数へ変換する。
+        引数：
+            action  str/tuple   メソッド名、もしくは (メソッド名, 引数, ...)
+        戻り値：
+            func    function    呼び出す関数
+        """
+        if isinstance(action, str):
+            return getattr(self, action)
+        method = getattr(self, action[0])
+        args = tuple(action[1:])
+        def func():
+            return method(*args)
+        # print_controls で表示する名前
+        func.__name__ = '{}{}'.format(action[0], str(args))
+        return func
 
     ''' 親クラスにない機能：マッピング対象の関数 '''
 
+    def set_steering(self, axis_val):
+        """
+        割り当て定義のステアリング値の向きを反映してステアリング値を設定する。
+        引数：
+            axis_val    アナログ入力値(-1.0～1.0)
+        戻り値：
+            なし
+        """
+        self.angle = self.steering_dir * self.steering_scale * axis_val
+
+    def drive(self, throttle, steering):
+        """
+        スロットル値とステアリング値を同時に設定する。
+        引数：
+            throttle    スロットル入力値(-1.0～1.0)
+            steering    ステアリング入力値(-1.0～1.0)
+        戻り値：
+            なし
+        """
+        self.set_throttle(throttle)
+        self.set_steering(steering)
+
     def normal_stop(self):
         """
-        通常停止する。
+        通常停止し、停止フックを呼び出す。
         引数：
             なし
         戻り値：
@@ -561,6 +1012,18 @@ class PS3JoystickController(JoystickController):
         """
         self.set_throttle(0)
         self.set_steering(0)
+        self.fire_stop_hooks()
+
+    def normal_stop_axis(self, axis_val):
+        """
+        押下時に通常停止する。
+        引数：
+            axis_val    非ゼロ：通常停止
+        戻り値：
+            なし
+        """
+        if axis_val != 0:
+            self.normal_stop()
 
     def move_left_or_right(self, axis_val):
         """
@@ -571,31 +1034,11 @@ class PS3JoystickController(JoystickController):
             なし
         """
         if axis_val > 0:
-            self.move_left()
+            self.drive(-1, 1)
         elif axis_val < 0:
-            self.move_right()
+            self.drive(-1, -1)
         else:
-            self.normal_stop()
-
-    def move_left(self):
-        self.set_throttle(-1)
-        self.set_steering(1)
-
-    def move_right(self):
-        self.set_throttle(-1)
-        self.set_steering(1)
-
-    def move_front(self):
-        self.set_throttle(1)
-
-    def move_rear(self):
-        self.set_throttle(-1)
-    
-    def move_stop(self):
-        self.set_throttle(0)
-    
-    def move_stop_steer(self):
-        self.set_steering(0)
+            self.drive(0, 0)
 
     def move_front_or_rear(self, axis_val):
         """
@@ -607,281 +1050,64 @@ class PS3JoystickController(JoystickController):
         """
         self.set_steering(0)
         if axis_val > 0:
-            self.move_front()
+            self.set_throttle(1)
         elif axis_val < 0:
-            self.move_rear()
+            self.set_throttle(-1)
         else:
-            self.move_stop()
+            self.set_throttle(0)
 
-    def set_steering_analog(self, axis_val):
+    def move_leftright(self, axis_val):
         """
-        アナログスティックでステアリング操作を行う。
-        十字キーとアナログキーの左右値がことなるため、
-        別途実装している。
+        入力値をステアリング値として左右へ最大速度で移動する。
         引数：
             axis_val    ゼロ：停止
         戻り値：
             なし
         """
-        return self.set_steering(axis_val * (-1))
-
-class TwoWheelsPS3JoystickController(PS3JoystickController):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-
-    def init_trigger_maps(self):
-        '''
-        init set of mapping from buttons to function calls
-        '''
-
-        self.button_down_trigger_map = {
-            # 右ボタン群：上
-            'square': self.on_recording,
-            'triangle': self.off_recording,
-
-            # 右ボタン群：下
-            'cross': self.set_user_init,
-            'circle': self.set_local_init,
-
-            # トリガ
-            'L2': self.normal_stop,
-            'R2': self.emergency_stop,
-
-            # トリガ小
-            'L1': self.decrease_max_throttle,
-            'R1': self.increase_max_throttle,
-
-            # アナログスティック押込   
-            'L3': self.normal_stop,
-            'R3': self.erase_last_N_records,
-
-            # START相当
-            'start': self.toggle_mode,
-            # SELECT 相当
-            'select': self.toggle_manual_recording,
-
-            # dpad
-            'dpad_up': self.move_forward,
-            'dpad_down': self.move_backward,
-            'dpad_left': self.move_left,
-            'dpad_right': self.move_right,
-
-        }
-
-        self.button_up_trigger_map = {
-            # dpad up
-            'dpad_up': self.normal_stop,
-            'dpad_down': self.normal_stop,
-            'dpad_left': self.normal_stop,
-            'dpad_right': self.normal_stop,
-        }
-
-        self.axis_trigger_map = {
-            'right_stick_horz' : self.set_steering,
-            'left_stick_vert' : self.set_throttle,
-
-            #'dpad_horizontal': self.move_left_or_right,
-            #'dpad_vertical': self.move_front_or_rear,
-        }
+        if axis_val != 0:
+            self.drive(-1, axis_val)
+        else:
+            self.drive(0, 0)
 
     def set_user_init(self):
-        self.mode = 'user'
-        print('force mode:', self.mode)
-    
-    def set_local_init(self):
-        self.mode = 'local'
-        print('force mode:', self.mode)
-    
-    def on_recording(self):
-        if self.auto_record_on_throttle:
-            print('auto record on throttle is enabled.')
-        self.recording = True
-        print('recording:', self.recording)
-
-    def off_recording(self):
-        if self.auto_record_on_throttle:
-            print('auto record on throttle is enabled.')
-        self.recording = False
-        print('recording:', self.recording)
-
-    def move_forward(self):
-        self.set_throttle(1)
-    
-    def move_backward(self):
-        self.set_throttle(-1)
-    
-    def move_left(self):
-            self.set_throttle(-1)
-            self.set_steering(-1)
-
-    def move_right(self):
-            self.set_throttle(-1)
-            self.set_steering(1)
-
-    def normal_stop(self):
-        self.set_throttle(0)
-        self.set_steering(0)
-
-class PS4JoystickAdapter(Joystick):
-    """
-    
-    """
-    #An interface to a physical joystick available at /dev/input/js0
-    def __init__(self, *args, **kwargs):
         """
-        マッピングインスタンス変数button_names. axis_namesを定義する。
+        運転モードを手動運転にする。
         """
-        super().__init__(*args, **kwargs)
-
-
-        self.button_names = {
-            0x134 : 'square',
-            0x133 : 'triangle',
-            0x131 : 'circle',
-            0x130 : 'cross',
-
-            0x13d : 'L3',
-            0x13e : 'R3',
-
-            0x13c : 'PS',
-            0x13a : 'share',
-            0x13b : 'options',
-
-            0x136 : 'L1',
-            0x138 : 'L2',
-
-            0x137 : 'R1',
-            0x139 : 'R2',
-        }
-
-
-        self.axis_names = {
-            0x0 : 'left_stick_horz', # expected
-            0x1 : 'left_stick_vert',
-            0x4 : 'right_stick_vert',
-            0x3 : 'right_stick_horz',
-            0x10 : 'dpad_leftright',
-            0x11 : 'dpad_updowm', # not move!
-        }
-
-class TwoWheelsPS4JoystickController(JoystickController):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-
-    def init_js(self):
-        '''
-        attempt to init joystick
-        '''
-        try:
-            self.js = PS4JoystickAdapter(self.dev_fn)
-            if not self.js.init():
-                self.js = None
-        except FileNotFoundError:
-            print(self.dev_fn, "not found.")
-            self.js = None
-        return self.js is not None
-
-    def init_trigger_maps(self):
-        '''
-        init set of mapping from buttons to function calls
-        '''
-        self.button_down_trigger_map = {
-            # 右ボタン群：上
-            'square': self.on_recording,
-            'triangle': self.off_recording,
-
-            # 右ボタン群：下
-            'cross': self.set_user_init,
-            'circle': self.set_local_init,
-
-            # トリガ
-            'L2': self.normal_stop,
-            'R2': self.emergency_stop,
-
-            # トリガ小
-            'L1': self.decrease_max_throttle,
-            'R1': self.increase_max_throttle,
-
-            # アナログスティック押込   
-            'L3': self.normal_stop,
-            'R3': self.erase_last_N_records,
-
-            # START相当
-            'share': self.toggle_mode,
-            # SELECT 相当
-            'options': self.toggle_manual_recording,
-
-        }
-
-        self.button_up_trigger_map = {
-
-        }
-
-        self.axis_trigger_map = {
-            'right_stick_horz' : self.set_steering,
-            'right_stick_vert' : self.set_throttle,
-            'left_stick_horz' : self.set_steering,
-            'left_stick_vert' : self.set_throttle,
-
-            'dpad_leftright': self.move_leftright,
-            'dpad_updown': self.move_fwdbwd,
-        }
-
-    def set_user_init(self):
         self.mode = 'user'
         print('force mode:', self.mode)
-    
+
     def set_local_init(self):
+        """
+        運転モードを自動運転にする。
+        """
         self.mode = 'local'
         print('force mode:', self.mode)
-    
+
     def on_recording(self):
+        """
+        記録を開始する。
+        """
         if self.auto_record_on_throttle:
             print('auto record on throttle is enabled.')
         self.recording = True
         print('recording:', self.recording)
 
     def off_recording(self):
+        """
+        記録を停止する。
+        """
         if self.auto_record_on_throttle:
             print('auto record on throttle is enabled.')
         self.recording = False
         print('recording:', self.recording)
 
-    def move_fwdbwd(self, axis_val):
-        print('move_fwdbwd {}'.format(str(axis_val)))
-        self.set_steering(0)
-        if axis_val > 0:
-            self.set_throttle(1)
-        elif axis_val < 0:
-            self.set_throttle(-1)
-        else:
-            self.set_throttle(0)
-    
-    def move_leftright(self, axis_val):
-        if axis_val > 0:
-            self.set_throttle(-1)
-            self.set_steering(axis_val)
-        elif axis_val < 0:
-            self.set_throttle(-1)
-            self.set_steering(axis_val)
-        else:
-            self.set_throttle(0)
-            self.set_steering(0)
-
-    def set_steering(self, axis_val):
-        self.angle = self.steering_scale * axis_val * (-1.0)
-        #print("angle", self.angle)
-
-    def normal_stop(self):
-        self.set_throttle(0)
-        self.set_steering(0)
-
 
 def get_js_controller(cfg):
     """
     myconfig.py上にて指定されたCONTROLLER_TYPE値にあわせて
     ジョイスティックコントローラパーツを生成し、
     オブジェクトを返却するファクトリ関数。
+    割り当て定義は JOYSTICK_MAPPINGS に cfg.JOYSTICK_MAPPINGS を上書きしたものを使用する。
     引数：
         cfg config.py/myconfig.py にて指定された定義をインスタンス変数として
             参照できるオブジェクト
@@ -893,48 +1119,15 @@ def get_js_controller(cfg):
         from donkeycar.parts.controller import get_js_controller as get_controller
         return get_controller(cfg)
     except:
-        if cfg.CONTROLLER_TYPE == "JCU3912T":
-            cont_class = ELECOM_JCU3912TController
-            ctr = cont_class(throttle_dir=cfg.JOYSTICK_THROTTLE_DIR,
-                                throttle_scale=cfg.JOYSTICK_MAX_THROTTLE,
-                                steering_scale=cfg.JOYSTICK_STEERING_SCALE,
-                                auto_record_on_throttle=cfg.AUTO_RECORD_ON_THROTTLE)
-            ctr.set_deadzone(cfg.JOYSTICK_DEADZONE)
-            return ctr
-        elif cfg.CONTROLLER_TYPE == "JCU4113S":
-            cont_class = ELECOM_JCU4113SJoystickController
-            ctr = cont_class(throttle_dir=cfg.JOYSTICK_THROTTLE_DIR,
-                                throttle_scale=cfg.JOYSTICK_MAX_THROTTLE,
-                                steering_scale=cfg.JOYSTICK_STEERING_SCALE,
-                                auto_record_on_throttle=cfg.AUTO_RECORD_ON_THROTTLE)
-            ctr.set_deadzone(cfg.JOYSTICK_DEADZONE)
-            return ctr
-        elif cfg.CONTROLLER_TYPE == "ps3_on_wire":
-            cont_class = ELECOM_JCU4113SJoystickController
-            ctr = cont_class(throttle_dir=cfg.JOYSTICK_THROTTLE_DIR,
-                                throttle_scale=cfg.JOYSTICK_MAX_THROTTLE,
-                                steering_scale=cfg.JOYSTICK_STEERING_SCALE,
-                                auto_record_on_throttle=cfg.AUTO_RECORD_ON_THROTTLE)
-            ctr.set_deadzone(cfg.JOYSTICK_DEADZONE)
-            return ctr
-        elif cfg.CONTROLLER_TYPE == "PS3TwoWheels":
-            cont_class = TwoWheelsPS3JoystickController
-            ctr = cont_class(throttle_dir=cfg.JOYSTICK_THROTTLE_DIR,
-                                throttle_scale=cfg.JOYSTICK_MAX_THROTTLE,
-                                steering_scale=cfg.JOYSTICK_STEERING_SCALE,
-                                auto_record_on_throttle=cfg.AUTO_RECORD_ON_THROTTLE)
-            ctr.set_deadzone(cfg.JOYSTICK_DEADZONE)
-            return ctr
-        elif cfg.CONTROLLER_TYPE == "PS4TwoWheels":
-            cont_class = TwoWheelsPS4JoystickController
-            ctr = cont_class(throttle_dir=cfg.JOYSTICK_THROTTLE_DIR,
-                                throttle_scale=cfg.JOYSTICK_MAX_THROTTLE,
-                                steering_scale=cfg.JOYSTICK_STEERING_SCALE,
-                                auto_record_on_throttle=cfg.AUTO_RECORD_ON_THROTTLE)
-            ctr.set_deadzone(cfg.JOYSTICK_DEADZONE)
-            return ctr
-        else:
+        mappings = dict(JOYSTICK_MAPPINGS)
+        mappings.update(getattr(cfg, 'JOYSTICK_MAPPINGS', None) or {})
+        if cfg.CONTROLLER_TYPE not in mappings:
             raise
-    
-    
-    
\ No newline at end of file
+        ctr = MappedJoystickController(mappings[cfg.CONTROLLER_TYPE],
+                            throttle_dir=cfg.JOYSTICK_THROTTLE_DIR,
+                            throttle_scale=cfg.JOYSTICK_MAX_THROTTLE,
+                            steering_scale=cfg.JOYSTICK_STEERING_SCALE,
+                            auto_record_on_throttle=cfg.AUTO_RECORD_ON_THROTTLE,
+                            dev_fn=getattr(cfg, 'JOYSTICK_DEVICE_FILE', '/dev/input/js0'))
+        ctr.set_deadzone(cfg.JOYSTICK_DEADZONE)
+        return ctr
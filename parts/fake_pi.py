@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+メモリ上でGPIOを模擬する pigpio.pi 互換クラス。
+pigpiod もGPIOもない環境で、パーツの組み合わせやループ処理を
+動作確認・計測するために使用する。
+"""
+import threading
+import time
+
+from .gpio_backend import OUTPUT, RISING_EDGE, FALLING_EDGE, PI_NO_SCRIPT_ROOM
+
+class FakeCallback:
+    """
+    pigpio.pi.callback の戻り値と同じく cancel() を持つコールバッククラス。
+    """
+    def __init__(self, pi, gpio, edge, func):
+        self.pi = pi
+        self.gpio = gpio
+        self.edge = edge
+        self.func = func
+
+    def cancel(self):
+        """
+        コールバックを解除する。
+        """
+        with self.pi.lock:
+            if self in self.pi.callbacks:
+                self.pi.callbacks.remove(self)
+
+class FakePi:
+    """
+    GPIOのレベル、PWM、SPI ADC をメモリ上で保持する pigpio.pi 互換クラス。
+    出力系の呼び出しは calls に (monotonic_ns, メソッド名, 引数) として記録する。
+    各メソッドの引数・戻り値は pigpio.pi の同名メソッドと同じ。
+    """
+    def __init__(self, record=True):
+        """
+        状態を初期化する。
+        引数：
+            record  boolean 出力系の呼び出しを記録するかどうか
+        戻り値：
+            なし
+        """
+        self.lock = threading.RLock()
+        self.connected = True
+        self.recording = record
+        self.calls = []
+        self.modes = {}
+        self.pulls = {}
+        self.levels = 0
+        self.duty = {}
+        self.ranges = {}
+        self.freqs = {}
+        self.hardware_pwm = {}
+        self.glitch = {}
+        self.adc = {}
+        self.spi = {}
+        self.callbacks = []
+        self.next_handle = 0
+
+    def record(self, name, *args):
+        if self.recording:
+            self.calls.append((time.monotonic_ns(), name, args))
+
+    def set_level(self, gpio, level):
+        """
+        GPIOのレベルを変更し、該当するコールバックを呼び出す。
+        外部入力（エンコーダなど）の模擬にも使用する。
+        引数：
+            gpio    int     GPIOピン番号(0-31)
+            level   int     0もしくは1
+        戻り値：
+            なし
+        """
+        with self.lock:
+            if level:
+                self.set_levels(self.levels | (1 << gpio))
+            else:
+                self.set_levels(self.levels & ~(1 << gpio))
+
+    def set_levels(self, levels):
+        levels &= 0xffffffff
+        changed = levels ^ self.levels
+        self.levels = levels
+        if changed == 0:
+            return
+        tick = self.get_current_tick()
+        for cb in list(self.callbacks):
+            if changed & (1 << cb.gpio) == 0:
+                continue
+            level = (levels >> cb.gpio) & 1
+            if (cb.edge == RISING_EDGE and level == 0) or \
+                (cb.edge == FALLING_EDGE and level == 1):
+                continue
+            cb.func(cb.gpio, level, tick)
+
+    def set_adc(self, channel, raw):
+        """
+        SPI ADC の指定チャネルが返却する変換値(0-1023)を設定する。
+        """
+        self.adc[channel] = raw & 0x3ff
+
+    def set_mode(self, gpio, mode):
+        self.record('set_mode', gpio, mode)
+        self.modes[gpio] = mode
+        return 0
+
+    def get_mode(self, gpio):
+        return self.modes.get(gpio, 0)
+
+    def set_pull_up_down(self, gpio, pud):
+        self.record('set_pull_up_down', gpio, pud)
+        self.pulls[gpio] = pud
+        return 0
+
+    def read(self, gpio):
+        return (self.levels >> gpio) & 1
+
+    def write(self, gpio, level):
+        self.record('write', gpio, level)
+        with self.lock:
+            self.modes[gpio] = OUTPUT
+            self.duty.pop(gpio, None)
+            self.set_level(gpio, level)
+        return 0
+
+    def set_PWM_dutycycle(self, user_gpio, dutycycle):
+        self.record('set_PWM_dutycycle', user_gpio, dutycycle)
+        self.duty[user_gpio] = int(dutycycle)
+        return 0
+
+    def get_PWM_dutycycle(self, user_gpio):
+        return self.duty.get(user_gpio, 0)
+
+    def set_PWM_range(self, user_gpio, range_):
+        self.record('set_PWM_range', user_gpio, range_)
+        self.ranges[user_gpio] = range_
+        return range_
+
+    def set_PWM_frequency(self, user_gpio, frequency):
+        self.record('set_PWM_frequency', user_gpio, frequency)
+        self.freqs[user_gpio] = frequency
+        return frequency
+
+    def hardware_PWM(self, gpio, PWMfreq, PWMduty):
+        self.record('hardware_PWM', gpio, PWMfreq, PWMduty)
+        self.hardware_pwm[gpio] = (PWMfreq, PWMduty)
+        return 0
+
+    def read_bank_1(self):
+        return self.levels
+
+    def set_bank_1(self, bits):
+        self.record('set_bank_1', bits)
+        with self.lock:
+            self.set_levels(self.levels | bits)
+        return 0
+
+    def clear_bank_1(self, bits):
+        self.record('clear_bank_1', bits)
+        with self.lock:
+            self.set_levels(self.levels & ~bits)
+        return 0
+
+    def get_current_tick(self):
+        return (time.monotonic_ns() // 1000) & 0xffffffff
+
+    def set_glitch_filter(self, user_gpio, steady):
+        self.glitch[user_gpio] = steady
+        return 0
+
+    def callback(self, user_gpio, edge=RISING_EDGE, func=None):
+        cb = FakeCallback(self, user_gpio, edge, func)
+        with self.lock:
+            self.callbacks.append(cb)
+        return cb
+
+    def spi_open(self, spi_channel, baud, spi_flags=0):
+        handle = self.next_handle
+        self.next_handle += 1
+        self.spi[handle] = (spi_channel, baud, spi_flags)
+        return handle
+
+    def spi_close(self, handle):
+        self.spi.pop(handle, None)
+        return 0
+
+    def spi_xfer(self, handle, data):
+        """
+        MCP3x08 の単一チャネル変換要求であれば set_adc で設定した値を返却する。
+        """
+        data = bytes(data)
+        if len(data) == 3 and data[0] == 1:
+            raw = self.adc.get((data[1] >> 4) & 7, 512)
+            return 3, bytearray([0, (raw >> 8) & 3, raw & 0xff])
+        return len(data), bytearray(len(data))
+
+    def spi_xfer_frames(self, handle, frames):
+        """
+        フレームごとに spi_xfer を呼び出し、受信データを連結して返却する。
+        """
+        data = bytearray()
+        for frame in frames:
+            count, rx = self.spi_xfer(handle, frame)
+            if count < 0:
+                return count, bytearray()
+            data += rx
+        return len(data), data
+
+    def store_script(self, script):
+        """
+        スクリプトには対応しないため、pigpio と同じく負のエラーコードを返却する。
+        """
+        return PI_NO_SCRIPT_ROOM
+
+    def stop(self):
+        self.connected = False
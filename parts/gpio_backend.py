@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+GPIOパーツ(PIGPIO_*)が使用するバックエンドの定数と生成処理。
+
+バックエンドはいずれも pigpio.pi と同じメソッドを持つクラスで、
+パーツは pigpio モジュールを直接参照せずにこのモジュールの定数を使用する。
+pigpio.pi にないメソッドとして、複数の SPI フレームを1往復で転送する
+spi_xfer_frames を各バックエンドが実装している。
+    'pigpio'    pigpiod 経由（SocketPi（pigpio.pi の拡張） もしくは PipePi）
+    'gpiod'     libgpiod のキャラクタデバイス(/dev/gpiochipN)を直接操作（GpiodPi）
+    'fake'      メモリ上でGPIOを模擬（FakePi）、実機のない環境での動作確認用
+"""
+
+# ピンモード（値は pigpio と同じ）
+INPUT = 0
+OUTPUT = 1
+
+# プルアップ/プルダウン
+PUD_OFF = 0
+PUD_DOWN = 1
+PUD_UP = 2
+
+# コールバックのエッジ
+RISING_EDGE = 0
+FALLING_EDGE = 1
+EITHER_EDGE = 2
+
+# コールバックの level 値（ウォッチドッグタイムアウト）
+TIMEOUT = 2
+
+# スクリプトの実行状態
+PI_SCRIPT_INITING = 0
+PI_SCRIPT_HALTED = 1
+PI_SCRIPT_RUNNING = 2
+PI_SCRIPT_WAITING = 3
+PI_SCRIPT_FAILED = 4
+# store_script のエラーコード（スクリプトを登録できない、値は pigpio と同じ）
+PI_NO_SCRIPT_ROOM = -57
+
+BACKENDS = ('pigpio', 'gpiod', 'fake')
+
+def tick_diff(t1, t2):
+    """
+    32ビットのマイクロ秒ティック t1 から t2 までの経過時間を返却する
+    （pigpio.tickDiff と同じ）。
+    引数：
+        t1      int     開始ティック
+        t2      int     終了ティック
+    戻り値：
+        diff    int     経過時間(マイクロ秒)
+    """
+    return (t2 - t1) & 0xffffffff
+
+def open_pi(backend, host=None, port=None, transport=None):
+    """
+    バックエンドのpiインスタンスを生成する。
+    引数：
+        backend     str     'pigpio'、'gpiod'、'fake' のいずれか
+        host        str     pigpio: ホスト名（pipe の場合はパイプのディレクトリ）、
+                            gpiod: GPIOチップのデバイスパス
+        port        int     pigpio: ポート番号
+        transport   str     pigpio: 'socket' もしくは 'pipe'
+    戻り値：
+        pi                  pigpio.pi 互換のインスタンス
+    """
+    if backend == 'gpiod':
+        from .gpiod_pi import GpiodPi
+        return GpiodPi(host)
+    if backend == 'fake':
+        from .fake_pi import FakePi
+        return FakePi()
+    if backend != 'pigpio':
+        raise ValueError('unknown gpio backend: {}'.format(str(backend)))
+    if transport == 'pipe':
+        from .pigpio_pipe import PipePi
+        return PipePi(host)
+    from .pigpio_socket import SocketPi
+    return SocketPi(host, port)
@@ -0,0 +1,423 @@
+# -*- coding: utf-8 -*-
+"""
+libgpiod(v2) の Python バインディングでキャラクタデバイス(/dev/gpiochipN)を
+直接操作する pigpio.pi 互換クラス。
+
+pigpiod（root権限のデーモン）もソケット通信も不要で、使用するラインは
+ひとつのラインリクエストにまとめるため、set_bank_1/clear_bank_1 は
+1回の ioctl で複数ピンを更新する。
+PWM はソフトウェアPWMスレッド（set_PWM_dutycycle）もしくは
+sysfs の PWM チップ（hardware_PWM）、SPI は spidev を使用する。
+スクリプトには対応しない。
+"""
+import dataclasses
+import datetime
+import os
+import struct
+import threading
+import time
+
+from .gpio_backend import INPUT, OUTPUT, PUD_OFF, PUD_DOWN, PUD_UP, \
+    RISING_EDGE, FALLING_EDGE, PI_NO_SCRIPT_ROOM
+
+DEFAULT_CHIP = '/dev/gpiochip0'
+DEFAULT_PWM_RANGE = 255
+DEFAULT_PWM_FREQ = 800
+# GPIOピン番号 → /sys/class/pwm/pwmchip0 のチャネル番号
+HARDWARE_PWM_CHANNELS = {12: 0, 18: 0, 13: 1, 19: 1}
+HARDWARE_PWM_CHIP = '/sys/class/pwm/pwmchip0'
+# linux/spi/spidev.h の struct spi_ioc_transfer（32バイト）
+SPI_IOC_TRANSFER = 'QQIIHBBBBBB'
+# SPI_IOC_MESSAGE(N) = _IOW('k', 0, char[N * 32])、サイズ（ビット16～）は転送時に加える
+SPI_IOC_MESSAGE = (1 << 30) | (ord('k') << 8)
+
+class GpiodCallback:
+    """
+    pigpio.pi.callback の戻り値と同じく cancel() を持つコールバッククラス。
+    """
+    def __init__(self, pi, gpio, edge, func):
+        self.pi = pi
+        self.gpio = gpio
+        self.edge = edge
+        self.func = func
+
+    def cancel(self):
+        """
+        コールバックを解除する。
+        """
+        self.pi.remove_callback(self)
+
+class GpiodPi:
+    """
+    libgpiod でGPIOを操作する pigpio.pi 互換クラス。
+    各メソッドの引数・戻り値は pigpio.pi の同名メソッドと同じ。
+    """
+    def __init__(self, chip=None, consumer='donkeytank'):
+        """
+        GPIOチップを確認し、内部状態を初期化する。ラインは set_mode などで
+        使用するピンが判明した時点でまとめて要求する。
+
+        引数：
+            chip        str     GPIOチップのデバイスパス、Noneの場合は
+                                環境変数 GPIOD_CHIP もしくは /dev/gpiochip0
+            consumer    str     ラインの使用者名
+        戻り値：
+            なし
+        """
+        import gpiod
+        from gpiod.line import Direction, Value, Edge, Bias
+        self.gpiod = gpiod
+        self.Direction, self.Value, self.Edge, self.Bias = Direction, Value, Edge, Bias
+        self.chip = chip or os.getenv('GPIOD_CHIP', DEFAULT_CHIP)
+        if not gpiod.is_gpiochip_device(self.chip):
+            raise ConnectionError('{} is not a gpiochip device'.format(self.chip))
+        self.consumer = consumer
+        self.lock = threading.RLock()
+        self.settings = {}
+        self.request = None
+        self.callbacks = []
+        self.event_thread = None
+        self.pwm = {}
+        self.pwm_cond = threading.Condition(self.lock)
+        self.pwm_thread = None
+        self.hardware_pwm = {}
+        self.spi = {}
+        self.next_handle = 0
+        self.running = True
+        self.connected = True
+
+    def apply(self, offset, **changes):
+        """
+        指定ラインの設定を変更し、ラインリクエストへ反映する。
+        ラインの組み合わせが変わった場合はリクエストを取り直し、
+        それ以外は reconfigure_lines で設定だけを更新する。
+        """
+        with self.lock:
+            if self.request is not None:
+                # 出力中の値を引き継ぐ
+                for o, settings in self.settings.items():
+                    if settings.direction == self.Direction.OUTPUT:
+                        settings.output_value = self.request.get_value(o)
+            current = self.settings.get(offset)
+            self.settings[offset] = self.gpiod.LineSettings(**changes) \
+                if current is None else dataclasses.replace(current, **changes)
+            config = {(o,): settings for o, settings in self.settings.items()}
+            if self.request is not None and current is not None:
+                self.request.reconfigure_lines(config)
+                return
+            if self.request is not None:
+                self.request.release()
+            self.request = self.gpiod.request_lines(
+                self.chip, consumer=self.consumer, config=config)
+
+    def set_mode(self, gpio, mode):
+        if mode == OUTPUT:
+            self.apply(gpio, direction=self.Direction.OUTPUT)
+        elif mode == INPUT:
+            self.apply(gpio, direction=self.Direction.INPUT)
+        else:
+            raise ValueError('gpio:{} mode {} not supported by gpiod backend'.format(
+                str(gpio), str(mode)))
+        return 0
+
+    def get_mode(self, gpio):
+        settings = self.settings.get(gpio)
+        return OUTPUT if settings is not None and \
+            settings.direction == self.Direction.OUTPUT else INPUT
+
+    def set_pull_up_down(self, gpio, pud):
+        bias = {PUD_OFF: self.Bias.DISABLED, PUD_DOWN: self.Bias.PULL_DOWN,
+            PUD_UP: self.Bias.PULL_UP}[pud]
+        self.apply(gpio, bias=bias)
+        return 0
+
+    def set_glitch_filter(self, user_gpio, steady):
+        self.apply(user_gpio, debounce_period=datetime.timedelta(microseconds=steady))
+        return 0
+
+    def read(self, gpio):
+        with self.lock:
+            if gpio not in self.settings:
+                self.apply(gpio, direction=self.Direction.INPUT)
+            return 1 if self.request.get_value(gpio) == self.Value.ACTIVE else 0
+
+    def write(self, gpio, level):
+        with self.lock:
+            self.pwm.pop(gpio, None)
+            settings = self.settings.get(gpio)
+            if settings is None or settings.direction != self.Direction.OUTPUT:
+                self.apply(gpio, direction=self.Direction.OUTPUT)
+            self.request.set_value(gpio, self.Value.ACTIVE if level else self.Value.INACTIVE)
+        return 0
+
+    def read_bank_1(self):
+        with self.lock:
+            if self.request is None:
+                return 0
+            offsets = list(self.settings.keys())
+            values = self.request.get_values(offsets)
+        return sum(1 << o for o, v in zip(offsets, values) if v == self.Value.ACTIVE)
+
+    def set_bank(self, bits, value):
+        """
+        bits で指定した出力ラインを1回の set_values でまとめて更新する。
+        """
+        with self.lock:
+            offsets = [o for o in range(32) if bits & (1 << o)]
+            for o in offsets:
+                settings = self.settings.get(o)
+                if settings is None or settings.direction != self.Direction.OUTPUT:
+                    self.apply(o, direction=self.Direction.OUTPUT)
+            self.request.set_values({o: value for o in offsets})
+        return 0
+
+    def set_bank_1(self, bits):
+        return self.set_bank(bits, self.Value.ACTIVE)
+
+    def clear_bank_1(self, bits):
+        return self.set_bank(bits, self.Value.INACTIVE)
+
+    def get_current_tick(self):
+        # エッジイベントのタイムスタンプ(CLOCK_MONOTONIC)と同じ時計
+        return (time.monotonic_ns() // 1000) & 0xffffffff
+
+    def callback(self, user_gpio, edge=RISING_EDGE, func=None):
+        """
+        エッジ検出を有効にし、イベントスレッドからコールバックを呼び出す。
+        """
+        cb = GpiodCallback(self, user_gpio, edge, func)
+        with self.lock:
+            self.callbacks.append(cb)
+            self.update_edges(user_gpio)
+            if self.event_thread is None:
+                self.event_thread = threading.Thread(target=self.event_loop, daemon=True)
+                self.event_thread.start()
+        return cb
+
+    def remove_callback(self, cb):
+        with self.lock:
+            if cb in self.callbacks:
+                self.callbacks.remove(cb)
+                if self.request is not None:
+                    self.update_edges(cb.gpio)
+
+    def update_edges(self, gpio):
+        """
+        登録済みコールバックが必要とするエッジをラインへ設定する。
+        """
+        edges = set(cb.edge for cb in self.callbacks if cb.gpio == gpio)
+        if not edges:
+            edge = self.Edge.NONE
+        elif edges == {RISING_EDGE}:
+            edge = self.Edge.RISING
+        elif edges == {FALLING_EDGE}:
+            edge = self.Edge.FALLING
+        else:
+            edge = self.Edge.BOTH
+        self.apply(gpio, direction=self.Direction.INPUT, edge_detection=edge)
+
+    def event_loop(self):
+        """
+        エッジイベントを待ち受け、該当するコールバックを呼び出す。
+        """
+        rising = self.gpiod.EdgeEvent.Type.RISING_EDGE
+        while self.running:
+            request = self.request
+            try:
+                if request is None or not request.wait_edge_events(0.1):
+                    continue
+                with self.lock:
+                    if request is not self.request:
+                        continue
+                    events = request.read_edge_events()
+            except (OSError, ValueError, self.gpiod.RequestReleasedError):
+                time.sleep(0.01)
+                continue
+            for event in events:
+                level = 1 if event.event_type == rising else 0
+                tick = (event.timestamp_ns // 1000) & 0xffffffff
+                for cb in list(self.callbacks):
+                    if cb.gpio != event.line_offset:
+                        continue
+                    if (cb.edge == RISING_EDGE and level == 0) or \
+                        (cb.edge == FALLING_EDGE and level == 1):
+                        continue
+                    cb.func(cb.gpio, level, tick)
+
+    def set_PWM_range(self, user_gpio, range_):
+        with self.lock:
+            self.pwm_state(user_gpio)['range'] = range_
+        return range_
+
+    def set_PWM_frequency(self, user_gpio, frequency):
+        with self.lock:
+            self.pwm_state(user_gpio)['freq'] = frequency
+        return frequency
+
+    def get_PWM_dutycycle(self, user_gpio):
+        return self.pwm.get(user_gpio, {}).get('duty', 0)
+
+    def set_PWM_dutycycle(self, user_gpio, dutycycle):
+        """
+        ソフトウェアPWMのデューティ比を設定する。
+        パルスの生成は PWM スレッドで行い、同時に切り替わるピンは
+        1回の set_values でまとめて出力する。
+        """
+        with self.lock:
+            state = self.pwm_state(user_gpio)
+            state['duty'] = int(dutycycle)
+            settings = self.settings.get(user_gpio)
+            if settings is None or settings.direction != self.Direction.OUTPUT:
+                self.apply(user_gpio, direction=self.Direction.OUTPUT)
+            if self.pwm_thread is None:
+                self.pwm_thread = threading.Thread(target=self.pwm_loop, daemon=True)
+                self.pwm_thread.start()
+            self.pwm_cond.notify()
+        return 0
+
+    def pwm_state(self, gpio):
+        state = self.pwm.get(gpio)
+        if state is None:
+            state = {'duty': 0, 'range': DEFAULT_PWM_RANGE, 'freq': DEFAULT_PWM_FREQ,
+                'start': time.monotonic(), 'level': None}
+            self.pwm[gpio] = state
+        return state
+
+    def pwm_loop(self):
+        """
+        ソフトウェアPWMスレッド。各ピンの周期内の位相からレベルを求め、
+        次に切り替わる時刻まで待機する。
+        """
+        while self.running:
+            with self.pwm_cond:
+                changes = {}
+                now = time.monotonic()
+                wake = now + 0.1
+                for gpio, state in self.pwm.items():
+                    period = 1.0 / state['freq']
+                    on_time = period * min(state['duty'], state['range']) / state['range']
+                    phase = (now - state['start']) % period
+                    if state['duty'] <= 0:
+                        level, wait = 0, 0.1
+                    elif state['duty'] >= state['range']:
+                        level, wait = 1, 0.1
+                    elif phase < on_time:
+                        level, wait = 1, on_time - phase
+                    else:
+                        level, wait = 0, period - phase
+                    wake = min(wake, now + wait)
+                    if level != state['level']:
+                        state['level'] = level
+                        changes[gpio] = self.Value.ACTIVE if level else self.Value.INACTIVE
+                if changes and self.request is not None:
+                    self.request.set_values(changes)
+                delay = wake - time.monotonic()
+                if delay > 0:
+                    self.pwm_cond.wait(delay)
+
+    def hardware_PWM(self, gpio, PWMfreq, PWMduty):
+        """
+        sysfs の PWM チップでハードウェアPWMを出力する。
+        dtoverlay=pwm-2chan などで PWM チャネルが有効になっている必要がある。
+        """
+        channel = HARDWARE_PWM_CHANNELS.get(gpio)
+        if channel is None:
+            raise ValueError('gpio:{} has no hardware PWM channel'.format(str(gpio)))
+        path = os.path.join(HARDWARE_PWM_CHIP, 'pwm{}'.format(channel))
+        if not os.path.exists(path):
+            with open(os.path.join(HARDWARE_PWM_CHIP, 'export'), 'w') as f:
+                f.write(str(channel))
+        period = int(1e9 / PWMfreq) if PWMfreq > 0 else 0
+        duty = int(period * PWMduty / 1000000)
+        last = self.hardware_pwm.get(gpio)
+        if last is None or last[0] != period:
+            # 周期を変更する前にデューティを0にする（duty > period は書き込めない）
+            self.write_sysfs(path, 'duty_cycle', 0)
+            self.write_sysfs(path, 'period', period)
+        self.write_sysfs(path, 'duty_cycle', duty)
+        if last is None:
+            self.write_sysfs(path, 'enable', 1)
+        self.hardware_pwm[gpio] = (period, duty)
+        return 0
+
+    def write_sysfs(self, path, name, value):
+        with open(os.path.join(path, name), 'w') as f:
+            f.write(str(value))
+
+    def spi_open(self, spi_channel, baud, spi_flags=0):
+        import spidev
+        dev = spidev.SpiDev()
+        dev.open(0, spi_channel)
+        dev.max_speed_hz = baud
+        dev.mode = spi_flags & 3
+        with self.lock:
+            handle = self.next_handle
+            self.next_handle += 1
+            self.spi[handle] = dev
+        return handle
+
+    def spi_close(self, handle):
+        dev = self.spi.pop(handle, None)
+        if dev is not None:
+            dev.close()
+        return 0
+
+    def spi_xfer(self, handle, data):
+        rx = self.spi[handle].xfer2(list(data))
+        return len(rx), bytearray(rx)
+
+    def spi_xfer_frames(self, handle, frames):
+        """
+        複数のフレームを、フレームごとに CS を HIGH に戻して SPI 転送する。
+        フレームごとの spi_ioc_transfer（最後以外は cs_change=1）を並べ、
+        1回の SPI_IOC_MESSAGE ioctl で転送する。
+        戻り値は全フレームの合計バイト数と受信データを連結したもの。
+        """
+        import ctypes
+        import fcntl
+        frames = [bytes(frame) for frame in frames]
+        tx = bytearray(b''.join(frames))
+        if not tx:
+            return 0, bytearray()
+        rx = bytearray(len(tx))
+        # ioctl が終わるまで送受信バッファのアドレスを固定しておく
+        tx_buf = (ctypes.c_char * len(tx)).from_buffer(tx)
+        rx_buf = (ctypes.c_char * len(rx)).from_buffer(rx)
+        message = bytearray()
+        offset = 0
+        for i, frame in enumerate(frames):
+            # 速度・ワード長は 0（spi_open で設定したデバイスの値）
+            message += struct.pack(SPI_IOC_TRANSFER,
+                ctypes.addressof(tx_buf) + offset, ctypes.addressof(rx_buf) + offset,
+                len(frame), 0, 0, 0, 1 if i < len(frames) - 1 else 0, 0, 0, 0, 0)
+            offset += len(frame)
+        count = fcntl.ioctl(self.spi[handle].fileno(),
+            SPI_IOC_MESSAGE | (len(message) << 16), message)
+        del tx_buf, rx_buf
+        return count, rx
+
+    def store_script(self, script):
+        """
+        スクリプトには対応しないため、pigpio と同じく負のエラーコードを返却する。
+        """
+        return PI_NO_SCRIPT_ROOM
+
+    def stop(self):
+        """
+        スレッドを停止し、PWM出力を止めてラインとSPIを解放する。
+        """
+        self.running = False
+        self.connected = False
+        with self.pwm_cond:
+            self.pwm_cond.notify()
+        for gpio, (period, duty) in list(self.hardware_pwm.items()):
+            path = os.path.join(HARDWARE_PWM_CHIP,
+                'pwm{}'.format(HARDWARE_PWM_CHANNELS[gpio]))
+            self.write_sysfs(path, 'enable', 0)
+        self.hardware_pwm.clear()
+        for handle in list(self.spi.keys()):
+            self.spi_close(handle)
+        with self.lock:
+            if self.request is not None:
+                self.request.release()
+                self.request = None
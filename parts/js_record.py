@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+ジョイスティックの入力イベント列をファイルへ記録し、再生するクラスを提供する。
+
+ファイル形式（リトルエンディアン）：
+    ヘッダ      '<4sHHI'    マジック(b'DKJS')、バージョン、イベントサイズ(8)、JSON長
+    JSON                    js_name、axis_map、button_map、記録開始日時
+    読み出し単位 '<QI'      記録開始からの読み出し時刻(マイクロ秒)、バイト数
+                            続いて /dev/input/js* から読み出したイベント（'IhBB'）の列
+読み出し単位ごとに記録するため、最大速度で再生しても drain の区切りが記録時と一致し、
+アナログ入力の間引きやトリガ関数の呼び出しが再現される。
+"""
+import json
+import struct
+import time
+
+from .controller import DrainingJoystick, JS_EVENT_SIZE, JS_TIME_MASK
+
+JS_RECORD_MAGIC = b'DKJS'
+JS_RECORD_VERSION = 1
+JS_RECORD_HEADER = struct.Struct('<4sHHI')
+JS_RECORD_BATCH = struct.Struct('<QI')
+
+class JoystickRecorder:
+    """
+    DrainingJoystick が読み出したイベントを読み出し単位ごとにファイルへ書き込むクラス。
+    """
+    def __init__(self, path, js):
+        """
+        ファイルを開き、ジョイスティックのボタン/アナログ入力の割り当てをヘッダへ書き込む。
+        引数：
+            path    str                 記録ファイルのパス
+            js      DrainingJoystick    初期化済みのジョイスティック
+        戻り値：
+            なし
+        """
+        info = json.dumps({
+            'js_name': getattr(js, 'js_name', None),
+            'axis_map': list(js.axis_map),
+            'button_map': list(js.button_map),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }).encode('utf-8')
+        self.path = path
+        self.file = open(path, 'wb')
+        self.file.write(JS_RECORD_HEADER.pack(
+            JS_RECORD_MAGIC, JS_RECORD_VERSION, JS_EVENT_SIZE, len(info)))
+        self.file.write(info)
+        self.start = None
+        self.count = 0
+
+    def write(self, data, read_time):
+        """
+        1回の読み出し分のイベントを書き込む。
+        引数：
+            data        bytes   イベント単位のバイト列
+            read_time   float   読み出し時刻(time.monotonic)
+        戻り値：
+            なし
+        """
+        if self.start is None:
+            self.start = read_time
+        self.file.write(JS_RECORD_BATCH.pack(int((read_time - self.start) * 1e6), len(data)))
+        self.file.write(data)
+        self.count += len(data) // JS_EVENT_SIZE
+
+    def close(self):
+        """
+        ファイルを閉じる。
+        引数：
+            なし
+        戻り値：
+            なし
+        """
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+def load_recording(path):
+    """
+    記録ファイルを読み込む。
+    引数：
+        path        str     記録ファイルのパス
+    戻り値：
+        info        dict    ヘッダのJSON（js_name、axis_map、button_map、time）
+        batches     list    (読み出し時刻(秒), イベントのバイト列) のリスト
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version, event_size, length = JS_RECORD_HEADER.unpack_from(data, 0)
+    if magic != JS_RECORD_MAGIC or version != JS_RECORD_VERSION or event_size != JS_EVENT_SIZE:
+        raise ValueError('[load_recording] unsupported joystick recording: {}'.format(str(path)))
+    offset = JS_RECORD_HEADER.size
+    info = json.loads(data[offset:offset + length].decode('utf-8'))
+    offset += length
+    batches = []
+    while offset + JS_RECORD_BATCH.size <= len(data):
+        read_us, size = JS_RECORD_BATCH.unpack_from(data, offset)
+        offset += JS_RECORD_BATCH.size
+        batches.append((read_us / 1e6, data[offset:offset + size]))
+        offset += size
+    return info, batches
+
+class ReplayJoystick(DrainingJoystick):
+    """
+    記録ファイルのイベントを drain で返却する Joystick クラス。
+    デバイスを開かず、記録時の読み出し単位をそのまま1回の drain として返却する。
+    speed が 1.0 の場合は記録時と同じ間隔、2.0 の場合は2倍速、0 の場合は待たずに再生する。
+    イベント時刻は再生時の時刻に置き換えるため、遅延計測(user/input_time)もそのまま動作する。
+    """
+    def __init__(self, path, speed=1.0, restamp=True):
+        """
+        再生条件を保持する。ファイルは init で読み込む。
+        引数：
+            path    str     記録ファイルのパス
+            speed   float   再生速度の倍率、0の場合は最大速度
+            restamp boolean イベント時刻を再生時の時刻に置き換えるかどうか
+        戻り値：
+            なし
+        """
+        super().__init__(dev_fn=path)
+        self.path = path
+        self.speed = speed
+        self.restamp = restamp
+        self.batches = []
+        self.index = 0
+        self.start = None
+        self.finished = False
+
+    def init(self):
+        """
+        記録ファイルを読み込み、記録時のボタン/アナログ入力の割り当てを復元する。
+        引数：
+            なし
+        戻り値：
+            result  boolean 読み込めた場合True
+        """
+        info, self.batches = load_recording(self.path)
+        self.js_name = info.get('js_name')
+        self.axis_map = info['axis_map']
+        self.button_map = info['button_map']
+        self.num_axes = len(self.axis_map)
+        self.num_buttons = len(self.button_map)
+        self.axis_states = {name: 0.0 for name in self.axis_map}
+        self.button_states = {name: 0 for name in self.button_map}
+        self.index = 0
+        self.start = None
+        self.finished = False
+        return True
+
+    def read_events(self, timeout=None):
+        """
+        次の読み出し単位の再生時刻まで最大 timeout 秒待ち、到達した場合はそのイベントを返却する。
+        引数：
+            timeout float   最大待ち時間(秒)、Noneの場合は再生時刻まで待つ
+        戻り値：
+            data    bytes   イベント単位のバイト列
+        """
+        if self.index >= len(self.batches):
+            self.finished = True
+            if timeout:
+                time.sleep(timeout)
+            return b''
+        read_at, data = self.batches[self.index]
+        now = time.monotonic()
+        if self.start is None:
+            self.start = now - (read_at / self.speed if self.speed > 0 else 0.0)
+        if self.speed > 0:
+            wait = self.start + read_at / self.speed - now
+            if wait > 0:
+                if timeout is not None and wait > timeout:
+                    time.sleep(timeout)
+                    return b''
+                time.sleep(wait)
+        self.index += 1
+        self.read_time = time.monotonic()
+        if self.restamp and data:
+            data = self.restamp_events(data)
+        if self.recorder is not None:
+            self.recorder.write(data, self.read_time)
+        return data
+
+    def restamp_events(self, data):
+        """
+        読み出し単位内の間隔を保ったまま、最後のイベントが再生時刻となるよう時刻を置き換える。
+        引数：
+            data    bytes   イベント単位のバイト列
+        戻り値：
+            data    bytearray   時刻を置き換えたバイト列
+        """
+        data = bytearray(data)
+        words = memoryview(data).cast('I')
+        now_ms = int(self.read_time * 1000)
+        newest = words[len(words) - 2]
+        for i in range(0, len(words), 2):
+            words[i] = (now_ms - ((newest - words[i]) & JS_TIME_MASK)) & JS_TIME_MASK
+        words.release()
+        return data
+
+    def close(self):
+        """
+        記録を停止し、再生を終了する。
+        引数：
+            なし
+        戻り値：
+            なし
+        """
+        super().close()
+        self.index = len(self.batches)
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+ジョイスティック入力からモータ出力コマンド送信までの遅延を集計するパーツを提供する。
+
+入力時刻はコントローラが user/input_time として出力する time.monotonic() 基準の秒で、
+出力パーツ（PIGPIO_PWM など）がコマンドを送信した時点で LatencyHistogram.record を
+呼び出して遅延を記録する。
+"""
+import array
+import math
+import time
+
+class LatencyHistogram:
+    """
+    入力イベントの時刻から出力コマンド送信までの遅延(ms)を固定幅の階級で集計し、
+    直近値、p50/p99、最大値を Vehicle ループごとに出力するパーツクラス。
+    同じ入力時刻の2回目以降の記録（左右のPWMなど）は無視する。
+    出力パーツより後に Vehicle へ追加すること。
+    """
+    def __init__(self, bin_ms=0.5, max_ms=500.0, debug=False):
+        """
+        集計用の階級を確保する。
+        引数：
+            bin_ms      float   階級幅(ms)
+            max_ms      float   集計上限(ms)、超えた値は最上位の階級へ集計する（最大値は正確に保持）
+            debug       boolean デバッグ表示有無（デフォルト:False）
+        戻り値：
+            なし
+        """
+        if bin_ms <= 0 or max_ms <= 0:
+            raise ValueError('[LatencyHistogram] bin_ms and max_ms must be positive')
+        self.bin_ms = float(bin_ms)
+        self.max_bin_ms = float(max_ms)
+        # 最後の階級は上限超過分
+        self.bins = int(math.ceil(max_ms / bin_ms)) + 1
+        self.counts = array.array('Q', bytes(8 * self.bins))
+        self.count = 0
+        self.last_ms = 0.0
+        self.max_ms = 0.0
+        self.p50_ms = 0.0
+        self.p99_ms = 0.0
+        self.last_input = None
+        self.published = 0
+        self.debug = debug
+
+    def record(self, input_time, now=None):
+        """
+        入力時刻から現在までの遅延を記録する。
+        引数：
+            input_time  float   入力イベントの時刻(time.monotonic() 基準の秒)
+            now         float   出力時刻、Noneの場合は現在時刻
+        戻り値：
+            recorded    boolean 記録した場合True、記録済みの入力時刻の場合False
+        """
+        if input_time == self.last_input:
+            return False
+        self.last_input = input_time
+        if now is None:
+            now = time.monotonic()
+        # 入力時刻はカーネル時刻からの推定値のため、わずかに未来になることがある
+        ms = max(0.0, (now - input_time) * 1000.0)
+        index = int(ms / self.bin_ms)
+        if index >= self.bins:
+            index = self.bins - 1
+        self.counts[index] += 1
+        self.count += 1
+        self.last_ms = ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+        return True
+
+    def percentile(self, q):
+        """
+        集計済みの遅延の百分位値を階級の上端で返却する。
+        引数：
+            q       float   0.0～1.0
+        戻り値：
+            ms      float   百分位値(ms)、記録がない場合は0.0
+        """
+        if self.count == 0:
+            return 0.0
+        target = max(1, int(math.ceil(q * self.count)))
+        total = 0
+        for index, count in enumerate(self.counts):
+            total += count
+            if total >= target:
+                # 上限超過の階級と最大値を超える上端は最大値で置き換える
+                return min((index + 1) * self.bin_ms, self.max_ms)
+        return self.max_ms
+
+    def run(self):
+        """
+        記録が増えた場合のみ百分位値を更新し、集計値を返却する。
+        引数：
+            なし
+        戻り値：
+            last_ms     float   直近の遅延(ms)
+            p50_ms      float   遅延の中央値(ms)
+            p99_ms      float   遅延の99パーセンタイル値(ms)
+            max_ms      float   遅延の最大値(ms)
+            count       int     記録数
+        """
+        if self.count != self.published:
+            self.published = self.count
+            self.p50_ms = self.percentile(0.5)
+            self.p99_ms = self.percentile(0.99)
+        return self.last_ms, self.p50_ms, self.p99_ms, self.max_ms, self.count
+
+    def shutdown(self):
+        """
+        デバッグ時は集計結果を表示する。
+        引数：
+            なし
+        戻り値：
+            なし
+        """
+        if self.debug:
+            self.run()
+            print('[LatencyHistogram] count:{} p50:{:.1f}ms p99:{:.1f}ms max:{:.1f}ms'.format(
+                str(self.count), self.p50_ms, self.p99_ms, self.max_ms))
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+pigpiod への接続（piインスタンス）をホスト/ポート単位で共有し、
+参照カウントで管理するモジュール。
+
+複数のGPIOパーツが同一のpiインスタンスを共有するため、
+パーツを増やしてもソケット数・スレッド数は増えない。
+最後の参照が解放された時点で接続をクローズする。
+
+バックエンドは 'pigpio'、'gpiod'、'fake' から選択できる（gpio_backend 参照）。
+pigpio バックエンドのトランスポートは 'socket'（pigpio.pi、TCPソケット）と
+'pipe'（PipePi、/dev/pigpio と /dev/pigout）から選択できる。
+"""
+import os
+import struct
+import threading
+
+from .gpio_backend import open_pi
+
+_lock = threading.Lock()
+_connections = {}
+# acquire_config で取得した接続のキー（retain(None) が同じ接続を使用する）
+_config_key = None
+
+class SharedPi:
+    """
+    参照カウント付きで共有されるpigpio piインスタンスのプロキシクラス。
+    pigpio piインスタンスのメソッドはそのまま呼び出せる。
+    pigpiod の再起動などで通信に失敗した場合は、一度だけ再接続して
+    同じコマンドを再送する。
+    接続のたびに generation を加算する。再起動した pigpiod はピンのモードや
+    PWM設定、スクリプト、通知ハンドルを失っているため、各パーツは
+    generation の変化を検出して設定をやり直す（PIGPIO_INSTRUMENTED.check_connection）。
+    """
+    def __init__(self, host, port, transport='socket', backend='pigpio'):
+        """
+        pigpiod へ接続する。
+        引数：
+            host        str     pigpiod ホスト名（pipe の場合はパイプのあるディレクトリ、
+                                gpiod の場合はGPIOチップのデバイスパス）
+            port        int     pigpiod ポート番号（pipe/gpiod/fake の場合は None）
+            transport   str     'socket' もしくは 'pipe'（pigpio 以外の場合は None）
+            backend     str     'pigpio'、'gpiod'、'fake' のいずれか
+        戻り値：
+            なし
+        """
+        self.host = host
+        self.port = port
+        self.transport = transport
+        self.backend = backend
+        self.key = (backend, host, port, transport)
+        self.refs = 0
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.methods = {}
+        self.pi = None
+        self.connect()
+
+    def connect(self):
+        """
+        pigpiod へ接続し、piインスタンスを生成する。
+        引数：
+            なし
+        戻り値：
+            なし
+        """
+        self.pi = open_pi(self.backend, self.host, self.port, self.transport)
+        if not self.pi.connected:
+            raise ConnectionError('{} {}:{} not connected'.format(
+                self.backend, str(self.host), str(self.port)))
+        self.generation += 1
+
+    def reconnect(self, generation):
+        """
+        接続を張り直す。他スレッドがすでに再接続済みの場合は何もしない。
+        引数：
+            generation  int     失敗したコマンドを発行した時点の接続世代
+        戻り値：
+            なし
+        """
+        with self.lock:
+            if generation != self.generation:
+                return
+            try:
+                self.pi.stop()
+            except Exception:
+                pass
+            self.connect()
+
+    def __getattr__(self, name):
+        """
+        piインスタンスの属性を返却する。メソッドの場合は再接続付きの
+        ラッパ関数を返却する（ラッパはメソッド名ごとにキャッシュする）。
+        引数：
+            name    str     属性名
+        戻り値：
+            属性値もしくはラッパ関数
+        """
+        if name in ('pi', 'methods'):
+            raise AttributeError(name)
+        method = self.methods.get(name)
+        if method is not None:
+            return method
+        attr = getattr(self.pi, name)
+        if not callable(attr):
+            return attr
+        def method(*args, **kwargs):
+            generation = self.generation
+            try:
+                return getattr(self.pi, name)(*args, **kwargs)
+            except (OSError, struct.error):
+                self.reconnect(generation)
+                return getattr(self.pi, name)(*args, **kwargs)
+        self.methods[name] = method
+        return method
+
+    def close(self):
+        """
+        pigpiod との接続をクローズする。
+        引数：
+            なし
+        戻り値：
+            なし
+        """
+        with self.lock:
+            if self.pi is not None:
+                self.pi.stop()
+
+def _key(host=None, port=None, transport=None, backend=None):
+    """
+    pigpio と同じ規則（環境変数 PIGPIO_ADDR/PIGPIO_PORT）で
+    ホスト名/ポート番号の既定値を補う。バックエンドの既定値は環境変数
+    GPIO_BACKEND、トランスポートの既定値は環境変数 PIGPIO_TRANSPORT、
+    pipe の場合のディレクトリの既定値は環境変数 PIGPIO_PIPE_DIR、
+    gpiod の場合のGPIOチップの既定値は環境変数 GPIOD_CHIP から取得する。
+    """
+    backend = backend or os.getenv('GPIO_BACKEND', 'pigpio')
+    if backend == 'gpiod':
+        return backend, host or os.getenv('GPIOD_CHIP', '/dev/gpiochip0'), None, None
+    if backend == 'fake':
+        return backend, None, None, None
+    if backend != 'pigpio':
+        raise ValueError('unknown gpio backend: {}'.format(str(backend)))
+    transport = transport or os.getenv('PIGPIO_TRANSPORT', 'socket')
+    if transport == 'pipe':
+        return backend, host or os.getenv('PIGPIO_PIPE_DIR', '/dev'), None, transport
+    if transport != 'socket':
+        raise ValueError('unknown pigpio transport: {}'.format(str(transport)))
+    host = host or os.getenv('PIGPIO_ADDR', 'localhost')
+    port = int(port or os.getenv('PIGPIO_PORT', 8888))
+    return backend, host, port, transport
+
+def acquire(host=None, port=None, transport=None, backend=None):
+    """
+    指定ホスト/ポートの共有piインスタンスを取得し、参照カウントを加算する。
+    未接続の場合は接続する。
+    引数：
+        host        str     pigpiod ホスト名、Noneの場合は環境変数PIGPIO_ADDRもしくはlocalhost
+                            （pipe の場合はパイプのあるディレクトリ、Noneの場合は
+                            環境変数PIGPIO_PIPE_DIRもしくは/dev、gpiod の場合は
+                            GPIOチップのデバイスパス、Noneの場合は環境変数GPIOD_CHIPもしくは
+                            /dev/gpiochip0）
+        port        int     pigpiod ポート番号、Noneの場合は環境変数PIGPIO_PORTもしくは8888
+        transport   str     'socket' もしくは 'pipe'、Noneの場合は環境変数PIGPIO_TRANSPORTもしくは'socket'
+        backend     str     'pigpio'、'gpiod'、'fake'、Noneの場合は環境変数GPIO_BACKENDもしくは'pigpio'
+    戻り値：
+        pgio    SharedPi    共有piインスタンス
+    """
+    key = _key(host, port, transport, backend)
+    with _lock:
+        pgio = _connections.get(key)
+        if pgio is None:
+            backend, host, port, transport = key
+            pgio = SharedPi(host, port, transport=transport, backend=backend)
+            _connections[key] = pgio
+        pgio.refs += 1
+        return pgio
+
+def acquire_config(cfg):
+    """
+    myconfig.py の GPIO_BACKEND/PIGPIO_TRANSPORT/GPIOD_CHIP に従って
+    共有piインスタンスを取得する。バックエンドを切り替えても
+    呼び出し側の変更は不要。
+    以降 pgio を指定せずに生成したパーツ（retain(None)）も同じ接続を使用する。
+    引数：
+        cfg             設定オブジェクト
+    戻り値：
+        pgio    SharedPi    共有piインスタンス
+    """
+    global _config_key
+    backend = getattr(cfg, 'GPIO_BACKEND', None)
+    host = getattr(cfg, 'GPIOD_CHIP', None) if backend == 'gpiod' else None
+    key = _key(host=host, transport=getattr(cfg, 'PIGPIO_TRANSPORT', None),
+        backend=backend)
+    _config_key = key
+    backend, host, port, transport = key
+    return acquire(host=host, port=port, transport=transport, backend=backend)
+
+def retain(pgio=None):
+    """
+    パーツが使用するpiインスタンスを確定する。
+    Noneの場合は acquire_config と同じ設定の共有piインスタンスを取得する
+    （acquire_config を呼び出していない場合は環境変数による既定の設定）。
+    共有piインスタンスの場合は参照カウントを加算する。
+    それ以外（利用者が生成したpiインスタンス）はそのまま返却する。
+    引数：
+        pgio            piインスタンスもしくはNone
+    戻り値：
+        pgio            パーツが使用するpiインスタンス
+    """
+    if pgio is None:
+        if _config_key is None:
+            return acquire()
+        backend, host, port, transport = _config_key
+        return acquire(host=host, port=port, transport=transport, backend=backend)
+    if isinstance(pgio, SharedPi):
+        with _lock:
+            pgio.refs += 1
+    return pgio
+
+def release(pgio):
+    """
+    共有piインスタンスの参照カウントを減算し、ゼロになった場合は
+    接続をクローズする。共有piインスタンス以外の場合は何もしない。
+    引数：
+        pgio            piインスタンスもしくはNone
+    戻り値：
+        なし
+    """
+    if not isinstance(pgio, SharedPi):
+        return
+    with _lock:
+        pgio.refs -= 1
+        if pgio.refs > 0:
+            return
+        _connections.pop(pgio.key, None)
+    pgio.close()
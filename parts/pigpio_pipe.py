@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""
+pigpiod のパイプインターフェース(/dev/pigpio, /dev/pigout)経由で
+GPIOを操作するモジュール。
+
+同一ホスト上の pigpiod へ localhost の TCP ソケットを経由せずにコマンドを
+送信するため、1コマンドあたりの遅延を抑えられる。
+GPIOパーツが使用する pigpio.pi のメソッドのみを実装している。
+パイプは pigpiod 全体で1組しかないため、同時に使用するプロセスは1つに限ること。
+"""
+import os
+import struct
+import threading
+
+DEFAULT_PIPE_DIR = '/dev'
+
+# pigpio のモード値 → pigs のモード文字
+MODE_LETTERS = {0: 'r', 1: 'w', 4: '0', 5: '1', 6: '2', 7: '3', 3: '4', 2: '5'}
+# pigpio のプルアップ/ダウン値 → pigs の文字
+PUD_LETTERS = {0: 'o', 1: 'd', 2: 'u'}
+
+class PipeCallback:
+    """
+    pigpio.pi.callback の戻り値と同じく cancel() を持つコールバッククラス。
+    """
+    def __init__(self, notify, gpio, edge, func):
+        self.notify = notify
+        self.gpio = gpio
+        self.edge = edge
+        self.func = func
+        self.bit = 1 << gpio
+        notify.append(self)
+
+    def cancel(self):
+        """
+        コールバックを解除する。
+        """
+        self.notify.remove(self)
+
+class PipeNotify(threading.Thread):
+    """
+    通知パイプ(/dev/pigpioN)からレベル変化レポートを読み取り、
+    登録されたコールバックを呼び出すスレッドクラス。
+    """
+    def __init__(self, pi):
+        super().__init__(daemon=True)
+        self.pi = pi
+        self.callbacks = []
+        self.monitor = 0
+        self.last_level = pi.read_bank_1()
+        self.handle = pi.command('no')
+        self.fifo = open(os.path.join(pi.pipe_dir, 'pigpio{}'.format(self.handle)), 'rb', 0)
+        self.go = True
+        self.start()
+
+    def append(self, callback):
+        self.callbacks.append(callback)
+        self.monitor |= callback.bit
+        self.pi.command('nb {} {}'.format(self.handle, self.monitor))
+
+    def remove(self, callback):
+        if callback not in self.callbacks:
+            return
+        self.callbacks.remove(callback)
+        monitor = 0
+        for c in self.callbacks:
+            monitor |= c.bit
+        if monitor != self.monitor:
+            self.monitor = monitor
+            self.pi.command('nb {} {}'.format(self.handle, self.monitor))
+
+    def stop(self):
+        if self.go:
+            self.go = False
+            self.pi.command('nc {}'.format(self.handle))
+
+    def run(self):
+        last_level = self.last_level
+        buf = b''
+        while self.go:
+            chunk = self.fifo.read(4096)
+            if not chunk:
+                break
+            buf += chunk
+            offset = 0
+            while self.go and len(buf) - offset >= 12:
+                seq, flags, tick, level = struct.unpack('HHII', buf[offset:offset + 12])
+                offset += 12
+                if flags != 0:
+                    continue
+                changed = level ^ last_level
+                last_level = level
+                for cb in list(self.callbacks):
+                    if cb.bit & changed:
+                        new_level = 1 if cb.bit & level else 0
+                        if cb.edge ^ new_level:
+                            cb.func(cb.gpio, new_level, tick)
+            buf = buf[offset:]
+        self.fifo.close()
+
+class PipePi:
+    """
+    pigpiod のパイプインターフェースを使用する pigpio.pi 互換クラス。
+    コマンドは pigs と同じテキスト形式で /dev/pigpio へ書き込み、
+    結果を /dev/pigout から1行ずつ読み取る。
+    各メソッドの引数・戻り値は pigpio.pi の同名メソッドと同じ。
+    """
+    def __init__(self, pipe_dir=None):
+        """
+        コマンドパイプと結果パイプを開く。
+
+        引数：
+            pipe_dir    str     pigpio/pigout パイプのあるディレクトリ、
+                                Noneの場合は環境変数 PIGPIO_PIPE_DIR もしくは /dev
+        戻り値：
+            なし
+        """
+        self.pipe_dir = pipe_dir or os.getenv('PIGPIO_PIPE_DIR', DEFAULT_PIPE_DIR)
+        self.lock = threading.Lock()
+        self.connected = False
+        self.notify = None
+        self.cmd_fd = os.open(os.path.join(self.pipe_dir, 'pigpio'), os.O_WRONLY)
+        self.out = open(os.path.join(self.pipe_dir, 'pigout'), 'rb')
+        self.connected = True
+
+    def request(self, text):
+        """
+        コマンドを1行書き込み、結果の1行を整数のリストとして返却する。
+        引数：
+            text    str     pigs 形式のコマンド
+        戻り値：
+            values  list    結果行の整数値
+        """
+        with self.lock:
+            os.write(self.cmd_fd, (text + '\n').encode('ascii'))
+            line = self.out.readline()
+        if not line:
+            raise ConnectionError('pigpio pipe closed')
+        return [int(v, 0) for v in line.split()]
+
+    def command(self, text):
+        """
+        コマンドを送信し、結果値を返却する。負の値の場合は pigpio.error を送出する。
+        引数：
+            text    str     pigs 形式のコマンド
+        戻り値：
+            res     int     結果値
+        """
+        res = self.request(text)[0]
+        if res < 0:
+            import pigpio
+            raise pigpio.error(pigpio.error_text(res))
+        return res
+
+    def set_mode(self, gpio, mode):
+        return self.command('m {} {}'.format(gpio, MODE_LETTERS[mode]))
+
+    def set_pull_up_down(self, gpio, pud):
+        return self.command('pud {} {}'.format(gpio, PUD_LETTERS[pud]))
+
+    def read(self, gpio):
+        return self.command('r {}'.format(gpio))
+
+    def write(self, gpio, level):
+        return self.command('w {} {}'.format(gpio, level))
+
+    def set_PWM_dutycycle(self, user_gpio, dutycycle):
+        return self.command('pwm {} {}'.format(user_gpio, int(dutycycle)))
+
+    def get_PWM_dutycycle(self, user_gpio):
+        return self.command('gdc {}'.format(user_gpio))
+
+    def set_PWM_range(self, user_gpio, range_):
+        return self.command('prs {} {}'.format(user_gpio, range_))
+
+    def set_PWM_frequency(self, user_gpio, frequency):
+        return self.command('pfs {} {}'.format(user_gpio, frequency))
+
+    def hardware_PWM(self, gpio, PWMfreq, PWMduty):
+        return self.command('hp {} {} {}'.format(gpio, PWMfreq, PWMduty))
+
+    def read_bank_1(self):
+        return self.command('br1')
+
+    def set_bank_1(self, bits):
+        return self.command('bs1 {}'.format(bits))
+
+    def clear_bank_1(self, bits):
+        return self.command('bc1 {}'.format(bits))
+
+    def get_current_tick(self):
+        return self.request('tick')[0] & 0xffffffff
+
+    def set_glitch_filter(self, user_gpio, steady):
+        return self.command('fg {} {}'.format(user_gpio, steady))
+
+    def callback(self, user_gpio, edge=0, func=None):
+        """
+        pigpio.pi.callback と同様にレベル変化コールバックを登録する。
+        """
+        if self.notify is None:
+            self.notify = PipeNotify(self)
+        return PipeCallback(self.notify, user_gpio, edge, func)
+
+    def notify_open(self):
+        return self.command('no')
+
+    def notify_begin(self, handle, bits):
+        return self.command('nb {} {}'.format(handle, bits))
+
+    def notify_close(self, handle):
+        return self.command('nc {}'.format(handle))
+
+    def spi_open(self, spi_channel, baud, spi_flags=0):
+        return self.command('spio {} {} {}'.format(spi_channel, baud, spi_flags))
+
+    def spi_close(self, handle):
+        return self.command('spic {}'.format(handle))
+
+    def spi_xfer(self, handle, data):
+        """
+        pigpio.pi.spi_xfer と同様に (バイト数, 受信データ) を返却する。
+        """
+        values = self.request('spix {} {}'.format(handle, ' '.join(str(b) for b in data)))
+        count = values[0]
+        if count < 0:
+            return count, bytearray()
+        return count, bytearray(values[1:1 + count])
+
+    def spi_xfer_frames(self, handle, frames):
+        """
+        複数のフレームを、フレームごとに CS を HIGH に戻して SPI 転送する。
+        全フレームの spix コマンドを1回で書き込み、結果を到着順に読み取る。
+        戻り値は全フレームの合計バイト数（エラーの場合は負の値）と
+        受信データを連結したもの。
+        """
+        text = ''.join('spix {} {}\n'.format(handle, ' '.join(str(b) for b in frame))
+            for frame in frames)
+        with self.lock:
+            os.write(self.cmd_fd, text.encode('ascii'))
+            lines = [self.out.readline() for _ in frames]
+        data = bytearray()
+        error = 0
+        for line in lines:
+            if not line:
+                raise ConnectionError('pigpio pipe closed')
+            values = [int(v, 0) for v in line.split()]
+            if values[0] < 0:
+                error = error or values[0]
+                continue
+            data += bytearray(values[1:1 + values[0]])
+        if error < 0:
+            return error, bytearray()
+        return len(data), data
+
+    def store_script(self, script):
+        if isinstance(script, bytes):
+            script = script.decode('ascii')
+        return self.command('proc {}'.format(script))
+
+    def run_script(self, script_id, params=None):
+        params = ' '.join(str(p) for p in (params or []))
+        return self.command('procr {} {}'.format(script_id, params).rstrip())
+
+    def script_status(self, script_id):
+        values = self.request('procp {}'.format(script_id))
+        if values[0] < 0:
+            return values[0], ()
+        return values[0], tuple(values[1:])
+
+    def delete_script(self, script_id):
+        return self.command('procd {}'.format(script_id))
+
+    def stop(self):
+        """
+        通知スレッドを停止し、パイプを閉じる。
+        """
+        if not self.connected:
+            return
+        self.connected = False
+        if self.notify is not None:
+            self.notify.stop()
+            self.notify = None
+        os.close(self.cmd_fd)
+        self.out.close()
@@ -0,0 +1,357 @@
+# -*- coding: utf-8 -*-
+"""
+RCレシーバの PWM 出力を pigpiod の通知ストリームから読み取るパーツクラス。
+
+ピンごとのコールバック（1エッジにつき1回の Python 呼び出し）を使用せず、
+全チャネルのピンを1つの通知ハンドルで監視し、レベル変化レポート(12バイト)を
+まとめて読み取る。Vehicle ループごとに溜まったレポートを NumPy で一括デコードし、
+各チャネルの最新パルス幅からステアリング/スロットル値(-1.0～1.0)を求める。
+
+通知ストリームの取得方法はpiインスタンスの種類で切り替える。
+    pigpio(socket)  NOIB コマンドで通知専用ソケットを開く（リモートの pigpiod も可）
+    pigpio(pipe)    NO コマンドで通知パイプ(/dev/pigpioN)を開く
+    gpiod/fake      エッジコールバックから同じ形式のレポートを生成する
+"""
+import os
+import socket
+import struct
+import threading
+import time
+
+from .pigpio_connection import retain, release
+from .pigpio_wrapper import PIGPIO_INSTRUMENTED
+from .gpio_backend import INPUT, EITHER_EDGE
+
+# pigpiod のコマンド番号（通知ソケットを開く）
+CMD_NOIB = 99
+# 通知レポート1件のサイズ(seq:H, flags:H, tick:I, level:I)
+REPORT_SIZE = 12
+DEFAULT_PORT = 8888
+
+class NotifyReader(threading.Thread):
+    """
+    通知ソケットもしくは通知パイプからレポートをまとめて読み取り、
+    feed 関数へ渡すスレッドクラス。
+    """
+    def __init__(self, read, feed, close):
+        """
+        スレッドを開始する。
+        引数：
+            read    function    最大バイト数を引数にデータを返却する関数（終端で空データ）
+            feed    function    読み取ったデータを受け取る関数
+            close   function    読み取り元を閉じる関数
+        戻り値：
+            なし
+        """
+        super().__init__(daemon=True)
+        self.read = read
+        self.feed = feed
+        self.close = close
+        self.go = True
+        self.start()
+
+    def run(self):
+        try:
+            while self.go:
+                data = self.read(4096)
+                if not data:
+                    break
+                self.feed(data)
+        except (OSError, ValueError):
+            # stop による読み取り元のクローズ
+            pass
+
+    def stop(self):
+        self.go = False
+        self.close()
+
+class PIGPIO_RC_RECEIVER(PIGPIO_INSTRUMENTED):
+    """
+    RCレシーバの各チャネルのパルス幅を通知ストリームから一括デコードし、
+    RCReceiver と同じく steering, throttle, mode, recording を返却するパーツクラス。
+    チャネルは [ステアリング, スロットル, モード（省略可）] の順に指定する。
+    Vehicle へ threaded=False で登録すること（読み取りは内部スレッドで行う）。
+    """
+    def __init__(self, pins, pgio=None, mids=None, mins=None, maxs=None,
+    invert=False, jitter=0.025, auto_record=False, timeout=0.1,
+    min_pulse_us=500, max_pulse_us=2500, debug=False):
+        """
+        各ピンを入力モードに設定し、通知ストリームを開く。
+        引数：
+            pins            list    チャネルごとのGPIOピン番号(0-31)
+            pgio                    piインスタンス、Noneの場合共有piインスタンスを使用する
+            mids            list    チャネルごとの中立パルス幅(us)、Noneの場合1500
+            mins            list    チャネルごとの -1.0 に対応するパルス幅(us)、Noneの場合1000
+            maxs            list    チャネルごとの 1.0 に対応するパルス幅(us)、Noneの場合2000
+            invert          boolean 出力値の符号を反転するかどうか
+            jitter          float   モード切替/自動記録とみなさない出力値の閾値
+            auto_record     boolean スロットルが jitter を超えた場合に記録するかどうか
+            timeout         float   パルスが途絶えたとみなす時間(秒)、以降は0.0を出力する
+            min_pulse_us    int     有効なパルス幅の下限(us)
+            max_pulse_us    int     有効なパルス幅の上限(us)
+            debug           boolean デバッグフラグ、デフォルトはFalse
+        戻り値：
+            なし
+        """
+        import numpy as np
+        self.debug = debug
+        self.pgio = retain(pgio)
+        self.init_stats('rc')
+        self.track_connection()
+        count = len(pins)
+        self.pins = np.array(pins, dtype=np.uint32)
+        self.mids = np.array(mids or [1500] * count, dtype=np.float64)
+        self.mins = np.array(mins or [1000] * count, dtype=np.float64)
+        self.maxs = np.array(maxs or [2000] * count, dtype=np.float64)
+        self.invert = invert
+        self.jitter = jitter
+        self.auto_record = auto_record
+        self.timeout = timeout
+        self.min_pulse_us = min_pulse_us
+        self.max_pulse_us = max_pulse_us
+        self.report_dtype = np.dtype([('seq', '<u2'), ('flags', '<u2'),
+            ('tick', '<u4'), ('level', '<u4')])
+
+        # 直近のパルス幅(us)とその取得時刻、立ち上がり時刻(-1は不明)、最終レベル
+        self.widths = np.zeros(count, dtype=np.float64)
+        self.updated = np.full(count, -float('inf'))
+        self.high_ticks = np.full(count, -1, dtype=np.int64)
+        self.bits = 0
+        for pin in pins:
+            self.bits |= 1 << pin
+            self.call('set_mode', pin, INPUT)
+        self.last_bits = ((self.call('read_bank_1') >> self.pins) & 1).astype(np.int8)
+
+        self.lock = threading.Lock()
+        self.buffer = bytearray()
+        self.report_count = 0
+        self.handle = None
+        self.reader = None
+        self.callbacks = []
+        self.open_notify()
+        if self.debug:
+            print('[PIGPIO_RC_RECEIVER] gpio:{} notify opened'.format(str(list(pins))))
+
+    def open_notify(self):
+        """
+        piインスタンスの種類に応じて通知ストリームを開き、全チャネルの監視を開始する。
+        引数：
+            なし
+        戻り値：
+            なし
+        """
+        backend = getattr(self.pgio, 'backend', 'pigpio')
+        transport = getattr(self.pgio, 'transport', 'socket')
+        if backend != 'pigpio':
+            # 通知ストリームを持たないバックエンドはコールバックでレポートを生成する
+            self.levels = int(self.call('read_bank_1'))
+            for pin in self.pins:
+                self.callbacks.append(
+                    self.call('callback', int(pin), EITHER_EDGE, self.on_edge))
+            return
+        if transport == 'pipe':
+            self.handle = self.call('notify_open')
+            fifo = open(os.path.join(self.pgio.host, 'pigpio{}'.format(str(self.handle))),
+                'rb', 0)
+            self.reader = NotifyReader(fifo.read, self.feed, fifo.close)
+        else:
+            host = getattr(self.pgio, 'host', None) or os.getenv('PIGPIO_ADDR', 'localhost')
+            port = getattr(self.pgio, 'port', None) or int(os.getenv('PIGPIO_PORT', DEFAULT_PORT))
+            sock = socket.create_connection((host, port))
+            sock.sendall(struct.pack('IIII', CMD_NOIB, 0, 0, 0))
+            response = b''
+            while len(response) < 16:
+                chunk = sock.recv(16 - len(response))
+                if not chunk:
+                    raise ConnectionError('pigpiod closed notify socket')
+                response += chunk
+            _, _, _, self.handle = struct.unpack('IIIi', response)
+            if self.handle < 0:
+                sock.close()
+                raise ConnectionError('NOIB failed: {}'.format(str(self.handle)))
+            self.reader = NotifyReader(sock.recv, self.feed, sock.close)
+        self.call('notify_begin', self.handle, self.bits)
+
+    def restore(self):
+        """
+        再接続後の pigpiod へ各ピンの入力モードを設定し直し、通知ストリームを開き直す。
+        旧接続の通知ハンドル・コールバックは再起動した pigpiod には存在しないため、
+        閉じる際の失敗は無視する。途中までのレポートは破棄する。
+        引数：
+            なし
+        戻り値：
+            なし
+        """
+        for cb in self.callbacks:
+            try:
+                cb.cancel()
+            except Exception:
+                pass
+        self.callbacks = []
+        self.handle = None
+        if self.reader is not None:
+            self.reader.stop()
+            self.reader = None
+        with self.lock:
+            del self.buffer[:]
+        for pin in self.pins:
+            self.call('set_mode', int(pin), INPUT)
+        self.open_notify()
+
+    def on_edge(self, gpio, level, tick):
+        """
+        コールバックのレベル変化を通知レポートと同じ形式で格納する。
+        """
+        if level:
+            self.levels |= 1 << gpio
+        else:
+            self.levels &= ~(1 << gpio)
+        self.feed(struct.pack('HHII', 0, 0, tick, self.levels))
+
+    def feed(self, data):
+        """
+        通知レポートのバイト列をバッファへ追加する。
+        引数：
+            data    bytes   通知レポート（12バイト単位でなくてもよい）
+        戻り値：
+            なし
+        """
+        with self.lock:
+            self.buffer += data
+
+    def take_reports(self):
+        """
+        バッファ内の完全なレポートを取り出す。
+        引数：
+            なし
+        戻り値：
+            reports np.ndarray  レポートの構造化配列
+        """
+        import numpy as np
+        with self.lock:
+            size = len(self.buffer) - len(self.buffer) % REPORT_SIZE
+            data = bytes(self.buffer[:size])
+            del self.buffer[:size]
+        return np.frombuffer(data, dtype=self.report_dtype)
+
+    def decode(self, ticks, levels, now=None):
+        """
+        レベル変化レポートから全チャネルのパルス幅を一括で求め、
+        チャネルごとに最新の有効なパルス幅を保持する。
+        引数：
+            ticks   np.ndarray  レポートのティック(us、32ビット)
+            levels  np.ndarray  レポートのGPIO 0-31 のレベル
+            now     float       取得時刻(time.monotonic)、Noneの場合は現在時刻
+        戻り値：
+            なし
+        """
+        import numpy as np
+        if len(ticks) == 0:
+            return
+        now = time.monotonic() if now is None else now
+        ticks = ticks.astype(np.int64)
+        # (レポート数, チャネル数) のレベル行列と1つ前のレベル
+        bits = ((levels[:, None] >> self.pins[None, :]) & 1).astype(np.int8)
+        prev = np.vstack([self.last_bits[None, :], bits[:-1]])
+        rises = (bits == 1) & (prev == 0)
+        falls = (bits == 0) & (prev == 1)
+        index = np.arange(len(ticks))[:, None]
+        # 各レポート時点での直近の立ち上がり位置（-1 は前回以前の立ち上がり）
+        last_rise = np.maximum.accumulate(np.where(rises, index, -1), axis=0)
+        rise_ticks = np.where(last_rise >= 0, ticks[np.maximum(last_rise, 0)],
+            self.high_ticks[None, :])
+        widths = (ticks[:, None] - rise_ticks) & 0xffffffff
+        valid = falls & (rise_ticks >= 0) & \
+            (widths >= self.min_pulse_us) & (widths <= self.max_pulse_us)
+        last_valid = np.where(valid, index, -1).max(axis=0)
+        found = last_valid >= 0
+        channels = np.nonzero(found)[0]
+        self.widths[channels] = widths[last_valid[channels], channels]
+        self.updated[found] = now
+        # 次回へ引き継ぐ立ち上がり時刻（立ち下がり済みの場合は不明とする）
+        last_fall = np.where(falls, index, -1).max(axis=0)
+        final_rise = last_rise[-1]
+        self.high_ticks = np.where(final_rise > last_fall,
+            ticks[np.maximum(final_rise, 0)],
+            np.where(last_fall >= 0, -1, self.high_ticks))
+        self.last_bits = bits[-1]
+        self.report_count += len(ticks)
+
+    def get_signals(self, now=None):
+        """
+        各チャネルの最新パルス幅を -1.0～1.0 の値に変換する。
+        timeout 秒以上パルスを受信していないチャネルは 0.0 とする。
+        引数：
+            now     float   現在時刻(time.monotonic)、Noneの場合は現在時刻
+        戻り値：
+            signals np.ndarray  チャネルごとの出力値
+        """
+        import numpy as np
+        now = time.monotonic() if now is None else now
+        offsets = self.widths - self.mids
+        spans = np.where(offsets >= 0, self.maxs - self.mids, self.mids - self.mins)
+        signals = np.clip(offsets / spans, -1.0, 1.0)
+        if self.invert:
+            signals = -signals
+        signals[now - self.updated > self.timeout] = 0.0
+        return signals
+
+    def run(self, mode=None, recording=None):
+        """
+        前回呼び出し以降に受信したレポートをデコードし、操作値を返却する。
+        引数：
+            mode        str     現在の運転モード
+            recording   boolean 現在の記録状態
+        戻り値：
+            steering    float   ステアリング値(-1.0～1.0)
+            throttle    float   スロットル値(-1.0～1.0)
+            mode        str     モードチャネルが jitter を超えた場合 'local'、それ以外は入力値
+            recording   boolean 自動記録が有効でスロットルが jitter を超えた場合True、それ以外は入力値
+        """
+        self.check_connection()
+        reports = self.take_reports()
+        # フラグ付きのレポート（ウォッチドッグ/キープアライブ等）はレベル変化ではない
+        reports = reports[reports['flags'] == 0]
+        self.decode(reports['tick'], reports['level'])
+        signals = self.get_signals()
+        steering = float(signals[0])
+        throttle = float(signals[1]) if len(signals) > 1 else 0.0
+        if len(signals) > 2 and signals[2] - self.jitter > 0:
+            mode = 'local'
+        elif mode is None:
+            mode = 'user'
+        if self.auto_record and throttle - self.jitter > 0:
+            recording = True
+        elif recording is None:
+            recording = False
+        if self.debug:
+            print('[PIGPIO_RC_RECEIVER] reports:{} widths:{} signals:{}'.format(
+                str(len(reports)), str(self.widths.tolist()), str(signals.round(3).tolist())))
+        return steering, throttle, mode, recording
+
+    def shutdown(self):
+        """
+        通知ストリームを閉じ、piインスタンスを開放する。
+        引数：
+            なし
+        戻り値：
+            なし
+        """
+        if self.pgio is None:
+            return
+        for cb in self.callbacks:
+            cb.cancel()
+        self.callbacks = []
+        if self.handle is not None:
+            try:
+                self.call('notify_close', self.handle)
+            except Exception as e:
+                print('[PIGPIO_RC_RECEIVER] notify_close failed: {}'.format(str(e)))
+            self.handle = None
+        if self.reader is not None:
+            self.reader.stop()
+            self.reader = None
+        if self.debug:
+            print('[PIGPIO_RC_RECEIVER] shutdown (reports:{})'.format(str(self.report_count)))
+        release(self.pgio)
+        self.pgio = None
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+pigpiod の TCP ソケットを使用する pigpio.pi の拡張クラス。
+
+pigpio.pi はコマンドごとに送信と応答の受信を繰り返すため、N 個のコマンドは
+N 往復になる。pigpiod は1接続のコマンドを到着順に処理するため、
+複数のコマンドをまとめて送信してから応答をまとめて受信すれば1往復で済む。
+"""
+import struct
+
+import pigpio
+
+# pigpio のソケットコマンド番号
+PI_CMD_SPIX = 75
+
+class SocketPi(pigpio.pi):
+    """
+    pigpio.pi に、複数コマンドを1回の送信にまとめるメソッドを追加したクラス。
+    """
+    def spi_xfer_frames(self, handle, frames):
+        """
+        複数のフレームを、フレームごとに CS を HIGH に戻して SPI 転送する。
+        全フレームの SPIX コマンドを1回で送信し、応答を到着順に受信する。
+        引数：
+            handle      int     spi_open の戻り値
+            frames      list    フレーム（送信バイト列）のリスト
+        戻り値：
+            count       int     受信した全フレームの合計バイト数、エラーの場合は負の値
+            data        bytearray   全フレームの受信データを連結したもの
+        """
+        request = bytearray()
+        for frame in frames:
+            frame = bytes(frame)
+            request += struct.pack('IIII', PI_CMD_SPIX, handle, 0, len(frame))
+            request += frame
+        counts = []
+        data = bytearray()
+        with self.sl.l:
+            self.sl.s.sendall(request)
+            # 途中でエラーになっても、後続の応答を読み捨てないと次のコマンドの応答とずれる
+            for _ in frames:
+                _, count = struct.unpack('12si', self._rxbuf(16))
+                counts.append(count)
+                if count > 0:
+                    data += self._rxbuf(count)
+        # pigpio.pi.spi_xfer と同じく、エラーは例外ではなく負の値で返却する
+        for count in counts:
+            if count < 0:
+                return count, bytearray()
+        return len(data), data
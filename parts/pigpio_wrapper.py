@@ -2,60 +2,706 @@
 """
 pigpioパッケージを使用したGPIO操作を行うためのパーツクラス群。
 """
+import array
+import threading
+import time
+import weakref
 
+# 毎ループ呼び出す時刻関数（属性参照を省く）
+_monotonic = time.monotonic
+_perf_counter = time.perf_counter
+
+from .pigpio_connection import SharedPi, retain, release
+from .gpio_backend import INPUT, OUTPUT, RISING_EDGE, tick_diff, \
+    PI_SCRIPT_INITING, PI_SCRIPT_HALTED, PI_SCRIPT_RUNNING, PI_SCRIPT_WAITING
 
 DEFAULT_FREQ=75
 DEFAULT_RANGE=255
-class PIGPIO:
+DEFAULT_REFRESH_INTERVAL=1.0
+HARDWARE_PWM_PINS=(12, 13, 18, 19)
+HARDWARE_PWM_RANGE=1000000
+DEFAULT_TRACE_SIZE=65536
+# トレースに記録する操作名（インデックスが操作コード）
+TRACE_OPS=('write', 'set_PWM_dutycycle', 'hardware_PWM', 'set_bank_1', 'clear_bank_1',
+    'run_script')
+TRACE_OP_CODES={op: code for code, op in enumerate(TRACE_OPS)}
+TRACE_OP_UNKNOWN=255
+# トレースのフラグ（ディスパッチャ経由で送信）
+TRACE_DISPATCHED=1
+TRACE_ARGS=4
+
+class PIGPIO_TRACE:
     """
-    pigpioパッケージを使用するGPIOピンの基底クラス。
+    PIGPIO パーツが pigpiod へ送信した出力系コマンドを、タイムスタンプ
+    (time.monotonic_ns)、ピン番号、操作コード、値として固定長の
+    リングバッファへ記録するパーツクラス。
+    バッファは array による事前確保済みの列ごとの配列で、記録時に
+    メモリ確保や文字列整形を行わない。
+    Vehicle ループ、ディスパッチャ、ジョイスティックの各スレッドから記録されるため、
+    記録と読み出しはロックで排他する。
+    dump でファイル（NumPy の npz 形式）へ書き出す。run の入力が真の場合、
+    request_dump で書き出しを要求された場合、および shutdown 時にも書き出す。
     """
-    def __init__(self, pin, mode=None, pgio=None, debug=False):
+    def __init__(self, size=DEFAULT_TRACE_SIZE, path=None, debug=False):
         """
-        引数の各値をインスタンス変数へ格納する。piインスタンスがNoneの場合生成する。
-        モードを対象ピンへ設定する。
+        リングバッファを確保する。
         引数：
-            pin     int     GPIOピン番号(0-31の整数)
-            pgio            piインスタンス、Noneの場合生成する
+            size    int     保持するコマンド数
+            path    str     shutdown 時の書き出し先（time.strftime の書式を使用可）、
+                            Noneの場合は shutdown 時に書き出さない
+            debug   boolean デバッグフラグ
+        戻り値：
+            なし
+        """
+        self.size = int(size)
+        self.path = path
+        self.debug = debug
+        self.t_ns = array.array('q', bytes(8 * self.size))
+        self.pin = array.array('h', bytes(2 * self.size))
+        self.op = array.array('B', bytes(self.size))
+        self.flags = array.array('B', bytes(self.size))
+        self.args = [array.array('q', bytes(8 * self.size)) for _ in range(TRACE_ARGS)]
+        # 記録したコマンドの累計数（書き込み位置は count % size）
+        self.count = 0
+        self.lock = threading.Lock()
+        # 次回 run 時の書き出し要求
+        self.dump_requested = False
+
+    def record(self, pin, op, args, flags=0):
+        """
+        送信したコマンドを1件記録する。
+        引数：
+            pin     int     GPIOピン番号、ピンに依存しない操作の場合None
+            op      str     piインスタンスのメソッド名
+            args    tuple   メソッドへ渡した引数
+            flags   int     ディスパッチャへの送信要求の場合 TRACE_DISPATCHED
+        戻り値：
+            なし
+        """
+        if pin is not None:
+            # 先頭のピン番号は記録しない
+            args = args[1:]
+        if op == 'run_script':
+            # (スクリプトID, パラメータリスト) のパラメータを記録する
+            args = args[1]
+        code = TRACE_OP_CODES.get(op, TRACE_OP_UNKNOWN)
+        n = min(len(args), TRACE_ARGS)
+        with self.lock:
+            i = self.count % self.size
+            self.t_ns[i] = time.monotonic_ns()
+            self.pin[i] = -1 if pin is None else pin
+            self.op[i] = code
+            self.flags[i] = flags
+            for j in range(n):
+                self.args[j][i] = int(args[j])
+            for j in range(n, TRACE_ARGS):
+                self.args[j][i] = 0
+            self.count += 1
+
+    def snapshot(self):
+        """
+        記録済みのコマンドを古い順に並べた NumPy 配列として返却する。
+        引数：
+            なし
+        戻り値：
+            trace   dict    't_ns'、'pin'、'op'、'flags'、'args'(件数, 4) の各配列
+            count   int     読み出した時点の記録したコマンドの累計数
+        """
+        import numpy as np
+        # 記録中の行を読み出さないよう、コピーを取り終えるまで記録を待たせる
+        with self.lock:
+            count = self.count
+            n = min(count, self.size)
+            order = np.arange(count - n, count) % self.size
+            trace = {
+                't_ns': np.frombuffer(self.t_ns, dtype=np.int64)[order],
+                'pin': np.frombuffer(self.pin, dtype=np.int16)[order],
+                'op': np.frombuffer(self.op, dtype=np.uint8)[order],
+                'flags': np.frombuffer(self.flags, dtype=np.uint8)[order],
+                'args': np.stack([np.frombuffer(a, dtype=np.int64)[order] for a in self.args],
+                    axis=1),
+            }
+        return trace, count
+
+    def dump(self, path=None):
+        """
+        記録済みのコマンドをファイルへ書き出す。
+        引数：
+            path    str     書き出し先（time.strftime の書式を使用可）、Noneの場合は
+                            コンストラクタで指定した path
+        戻り値：
+            path    str     書き出したファイルパス、書き出さなかった場合None
+        """
+        import numpy as np
+        path = path or self.path
+        if path is None:
+            return None
+        path = time.strftime(path)
+        trace, count = self.snapshot()
+        np.savez(path, ops=np.array(TRACE_OPS), total=np.int64(count), **trace)
+        if self.debug:
+            print('[PIGPIO_TRACE] {} commands written to {}'.format(
+                str(len(trace['t_ns'])), path))
+        return path
+
+    @staticmethod
+    def load(path):
+        """
+        dump で書き出したファイルを読み込む。
+        引数：
+            path    str     ファイルパス
+        戻り値：
+            trace   dict    snapshot と同じ配列に 'ops'（操作名）と 'total'（累計数）を加えたもの
+        """
+        import numpy as np
+        with np.load(path) as data:
+            return {key: data[key] for key in data.files}
+
+    def request_dump(self):
+        """
+        次回の run でファイルへ書き出すよう要求する。
+        ジョイスティックのボタン押下時の機能として登録することを想定しており、
+        呼び出し元のスレッドではファイル書き出しを行わない。
+        引数：
+            なし
+        戻り値：
+            なし
+        """
+        self.dump_requested = True
+
+    def run(self, dump=False):
+        """
+        入力が真の場合、もしくは request_dump で要求されていた場合、
+        その場でファイルへ書き出す。
+        引数：
+            dump    boolean 書き出し要求
+        戻り値：
+            count   int     記録したコマンドの累計数
+        """
+        if dump or self.dump_requested:
+            self.dump_requested = False
+            self.dump()
+        return self.count
+
+    def shutdown(self):
+        """
+        path が指定されている場合、記録済みのコマンドを書き出す。
+        引数：
+            なし
+        戻り値：
+            なし
+        """
+        self.dump()
+
+# 呼び出し統計を持つパーツ（PIGPIO_STATS が集計対象とする）
+INSTRUMENTED_PARTS = weakref.WeakSet()
+
+class PIGPIO_INSTRUMENTED:
+    """
+    pigpiod への呼び出し回数と所要時間を操作ごとに集計する基底クラス。
+    piインスタンスのメソッドは call 経由で呼び出す。集計値は
+    PIGPIO_STATS が take_stats で Vehicle ループごとに回収する。
+    call はディスパッチャ・サンプラ・ジョイスティックのスレッドからも呼び出されるため、
+    集計値の更新と回収はパーツごとのロックで排他する。
+    共有piインスタンスが再接続した場合（pigpiod の再起動など）、pigpiod 側の設定は
+    失われているため、check_connection で接続世代の変化を検出し restore で設定し直す。
+    """
+    __slots__ = ('stats_label', 'stats', 'stats_lock', 'pi_methods', 'pgio_generation',
+        '__weakref__')
+
+    def init_stats(self, label):
+        """
+        集計値を初期化し、PIGPIO_STATS の集計対象へ登録する。
+        引数：
+            label   str     集計値のキーに使用するパーツ名（'gpio12' など）
+        戻り値：
+            なし
+        """
+        self.stats_label = label
+        # 操作名 → [呼び出し回数, 合計時間(秒), 最大時間(秒)]
+        self.stats = {}
+        self.stats_lock = threading.Lock()
+        # 操作名 → piインスタンスのメソッド（呼び出しごとの属性参照とメソッドオブジェクト生成を省く）
+        self.pi_methods = {}
+        INSTRUMENTED_PARTS.add(self)
+
+    def track_connection(self):
+        """
+        piインスタンスの現在の接続世代を記録する。
+        共有piインスタンス以外（利用者が生成したpiインスタンス）は再接続しないため記録しない。
+        引数：
+            なし
+        戻り値：
+            なし
+        """
+        self.pgio_generation = self.pgio.generation \
+            if isinstance(self.pgio, SharedPi) else None
+
+    def check_connection(self):
+        """
+        共有piインスタンスが記録時から再接続していた場合、restore を呼び出して
+        pigpiod 側の設定をやり直す。定常状態では属性の比較のみを行う。
+        引数：
+            なし
+        戻り値：
+            restored    boolean 設定をやり直した場合True
+        """
+        generation = self.pgio_generation
+        if generation is None or self.pgio.generation == generation:
+            return False
+        self.pgio_generation = self.pgio.generation
+        if self.debug:
+            print('[{}] reconnected (generation {}), restore'.format(
+                self.stats_label, str(self.pgio_generation)))
+        self.restore()
+        return True
+
+    def restore(self):
+        """
+        再接続後の pigpiod へ、パーツの初期化時に行った設定をやり直す（サブクラスで実装）。
+        引数：
+            なし
+        戻り値：
+            なし
+        """
+        pass
+
+    def call(self, op, *args):
+        """
+        piインスタンスの op メソッドを args を引数として呼び出し、
+        呼び出し回数と所要時間を集計する。
+        引数：
+            op      str     piインスタンスのメソッド名
+            args            op メソッドへ渡す引数
+        戻り値：
+            op メソッドの戻り値
+        """
+        return self.call_args(op, args)
+
+    def call_args(self, op, args):
+        """
+        引数をタプルのまま受け取る call（*args の詰め直しによる
+        タプル生成を避けるため、send などの周期処理から使用する）。
+        引数：
+            op      str     piインスタンスのメソッド名
+            args    tuple   op メソッドへ渡す引数
+        戻り値：
+            op メソッドの戻り値
+        """
+        method = self.pi_methods.get(op)
+        if method is None:
+            method = self.pi_methods[op] = getattr(self.pgio, op)
+        # perf_counter_ns の整数は毎回メモリ確保されるため、浮動小数点の秒で計測する
+        start = _perf_counter()
+        try:
+            return method(*args)
+        finally:
+            elapsed = _perf_counter() - start
+            # with 文はロックの __enter__/__exit__ のメソッドオブジェクトを毎回生成するため、
+            # acquire/release を直接呼び出す
+            self.stats_lock.acquire()
+            try:
+                entry = self.stats.get(op)
+                if entry is None:
+                    self.stats[op] = [1.0, elapsed, elapsed]
+                else:
+                    # 257以上の int は加算のたびにメモリ確保されるため、回数も float で数える
+                    entry[0] += 1.0
+                    entry[1] += elapsed
+                    if elapsed > entry[2]:
+                        entry[2] = elapsed
+            finally:
+                self.stats_lock.release()
+
+    def take_stats(self):
+        """
+        前回回収以降の集計値を返却し、集計値をリセットする。
+        引数：
+            なし
+        戻り値：
+            stats   dict    操作名 → [呼び出し回数, 合計時間(秒), 最大時間(秒)]
+        """
+        with self.stats_lock:
+            stats, self.stats = self.stats, {}
+        for entry in stats.values():
+            entry[0] = int(entry[0])
+        return stats
+
+class PIGPIO_STATS:
+    """
+    PIGPIO パーツ群（PIGPIO_INSTRUMENTED のサブクラス）の pigpiod 呼び出しを
+    Vehicle ループごとに集計し、Vehicle メモリへ出力するパーツクラス。
+    ディスパッチャやサンプラのスレッドから発行された呼び出しも、
+    前回の run 以降に完了したものとして集計される。
+    """
+    def __init__(self, parts=None, debug=False):
+        """
+        集計対象を設定する。
+        引数：
+            parts   list    集計対象のパーツ、Noneの場合は生成済みの全パーツ
             debug   boolean デバッグフラグ、デフォルトはFalse
+        戻り値：
+            なし
+        """
+        self.parts = parts
+        self.debug = debug
+
+    def run(self):
+        """
+        前回呼び出し以降の pigpiod 呼び出しを集計する。
+        引数：
+            なし
+        戻り値：
+            calls       int     呼び出し回数
+            total_us    float   合計所要時間(マイクロ秒)
+            max_us      float   最大所要時間(マイクロ秒)
+            detail      dict    'パーツ名/操作名' → (呼び出し回数, 合計時間(us), 最大時間(us))
+        """
+        merged = {}
+        parts = INSTRUMENTED_PARTS if self.parts is None else self.parts
+        for part in list(parts):
+            for op, entry in part.take_stats().items():
+                key = '{}/{}'.format(part.stats_label, op)
+                if key in merged:
+                    # 同名パーツ（ピン番号を持たないパーツなど）は合算する
+                    count, total, longest = merged[key]
+                    entry = [count + entry[0], total + entry[1], max(longest, entry[2])]
+                merged[key] = entry
+        calls = sum(entry[0] for entry in merged.values())
+        total_us = sum(entry[1] for entry in merged.values()) * 1e6
+        max_us = max([entry[2] for entry in merged.values()] or [0.0]) * 1e6
+        detail = {key: (count, total * 1e6, longest * 1e6)
+            for key, (count, total, longest) in merged.items()}
+        if self.debug and calls > 0:
+            print('[PIGPIO_STATS] calls:{} total:{:.1f}us max:{:.1f}us'.format(
+                str(calls), total_us, max_us))
+        return calls, total_us, max_us, detail
+
+class PIGPIO(PIGPIO_INSTRUMENTED):
+    """
+    pigpioパッケージを使用するGPIOピンの基底クラス。
+    piインスタンスの呼び出しは PIGPIO_INSTRUMENTED.call 経由で回数・所要時間を集計する。
+    出力系コマンドは send 経由で発行し、書き込み省略(elision)が有効な場合は
+    前回送信値と同じ値の再送を refresh_interval 秒間省略する。
+    ディスパッチャが指定された場合、出力系コマンドはディスパッチャの
+    スレッドから送信される。トレースが指定された場合、送信したコマンドを
+    トレースへ記録する。
+    run から呼び出される send は、定常状態（送信済みの op）では新たなオブジェクトを
+    保持しない（前回送信値は op ごとのリストを書き換える）。
+    send は共有piインスタンスの再接続を検出すると、モードを設定し直し
+    前回送信値を破棄してから送信する。
+    """
+    __slots__ = ('debug', 'pgio', 'pin', 'mode', 'elision', 'refresh_interval', 'dispatcher',
+        'trace', 'last_sent', 'sent_count', 'elided_count')
+
+    def __init__(self, pin, mode=None, pgio=None,
+    elision=False, refresh_interval=None, dispatcher=None, trace=None, debug=False):
+        """
+        引数の各値をインスタンス変数へ格納する。piインスタンスがNoneの場合は
+        共有piインスタンスを取得する。モードを対象ピンへ設定する。
+        引数：
+            pin                 int     GPIOピン番号(0-31の整数)
+            pgio                        piインスタンス、Noneの場合共有piインスタンスを使用する
+            elision             boolean 前回と同じ値の送信を省略するかどうか、デフォルトはFalse
+            refresh_interval    float   省略中でも再送する間隔(秒)、Noneの場合DEFAULT_REFRESH_INTERVAL
+            dispatcher          PIGPIO_DISPATCHER   出力系コマンドを非同期送信するディスパッチャ、Noneの場合は同期送信
+            trace               PIGPIO_TRACE        送信したコマンドを記録するトレース、Noneの場合は記録しない
+            debug               boolean デバッグフラグ、デフォルトはFalse
         """
         self.debug = debug
-        import pigpio
         #pigpio.exceptions = self.debug
-        self.pgio = pgio or pigpio.pi()
+        self.pgio = retain(pgio)
         self.pin = pin
+        self.mode = mode
+        self.elision = elision
+        self.refresh_interval = DEFAULT_REFRESH_INTERVAL \
+            if refresh_interval is None else refresh_interval
+        self.dispatcher = dispatcher
+        self.trace = trace
+        self.last_sent = {}
+        # 257以上の int は加算のたびにメモリ確保されるため、送信数・省略数は float で数える
+        # （フリーリストから再利用される）。参照は get_elision_stats を使用する
+        self.sent_count = 0.0
+        self.elided_count = 0.0
+        self.init_stats(type(self).__name__ if pin is None else 'gpio{}'.format(str(pin)))
+        self.track_connection()
         if mode is not None:
-            self.pgio.set_mode(pin, mode)
+            self.call('set_mode', pin, mode)
             if self.debug:
                 print('gpio:{} set mode {}'.format(str(pin), str(mode)))
 
+    def restore(self):
+        """
+        再接続後の pigpiod へモードを設定し直し、前回送信値を破棄する
+        （次回の send は値にかかわらず送信される）。
+        引数：
+            なし
+        戻り値：
+            なし
+        """
+        self.last_sent.clear()
+        if self.mode is not None:
+            self.call('set_mode', self.pin, self.mode)
+
+    def send(self, op, value, *args):
+        """
+        piインスタンスの op メソッドを args を引数として呼び出す。
+        書き込み省略が有効で、op ごとの前回送信値と value が同じかつ
+        前回送信から refresh_interval 秒未満の場合は送信しない。
+        ディスパッチャが指定されている場合は、送信を依頼するだけで即座に戻る。
+        引数：
+            op          str     piインスタンスのメソッド名（'write' など）
+            value               前回送信値と比較する出力値
+            args                op メソッドへ渡す引数
+        戻り値：
+            sent        boolean 送信した場合True、省略した場合False
+        """
+        if self.pgio_generation is not None and self.pgio.generation != self.pgio_generation:
+            self.check_connection()
+        now = _monotonic()
+        last = self.last_sent.get(op)
+        if self.elision and last is not None and last[0] == value and \
+            now - last[1] < self.refresh_interval:
+            self.elided_count += 1.0
+            return False
+        if self.dispatcher is None:
+            self.call_args(op, args)
+        else:
+            self.dispatcher.submit((id(self), op), self.call_args, op, args)
+        if self.trace is not None:
+            self.trace.record(self.pin, op, args,
+                0 if self.dispatcher is None else TRACE_DISPATCHED)
+        if last is None:
+            self.last_sent[op] = [value, now]
+        else:
+            last[0] = value
+            last[1] = now
+        self.sent_count += 1.0
+        return True
+
+    def send_now(self, op, *args):
+        """
+        書き込み省略とディスパッチャを経由せず、呼び出したスレッドからその場で
+        piインスタンスの op メソッドを呼び出す（停止処理用）。
+        ディスパッチャの未送信コマンドは破棄し、前回送信値も破棄するため、
+        次回の send は値にかかわらず送信される。
+        引数：
+            op          str     piインスタンスのメソッド名（'write' など）
+            args                op メソッドへ渡す引数
+        戻り値：
+            なし
+        """
+        if self.dispatcher is not None:
+            self.dispatcher.cancel(id(self))
+        self.call(op, *args)
+        if self.trace is not None:
+            self.trace.record(self.pin, op, args)
+        self.last_sent.clear()
+        self.sent_count += 1.0
+
+    def get_elision_stats(self):
+        """
+        送信済みコマンド数と省略したコマンド数を返却する。
+        引数：
+            なし
+        戻り値：
+            sent_count      int     送信したコマンド数
+            elided_count    int     省略したコマンド数
+        """
+        return int(self.sent_count), int(self.elided_count)
+
     def shutdown(self):
         """
-        piインスタンスを開放する（クローズしない）。
+        piインスタンスを開放する。共有piインスタンスの場合は参照を解放し、
+        最後の参照であれば接続をクローズする。
         引数：
             なし
         戻り値：
             なし
         """
         if self.debug:
-            print('gpio:{} shutdown'.format(str(self.pin)))
+            sent_count, elided_count = self.get_elision_stats()
+            print('gpio:{} shutdown (sent:{}, elided:{})'.format(
+                str(self.pin), str(sent_count), str(elided_count)))
+        release(self.pgio)
         self.pgio = None
 
+class PIGPIO_DISPATCHER:
+    """
+    PIGPIO パーツの出力系コマンドを専用スレッドから pigpiod へ送信する
+    latest-wins 方式のディスパッチャパーツクラス。
+    各パーツの run() は対象ピン・コマンドごとの最新値をメールボックスへ
+    格納するだけで戻るため、Vehicle ループの処理時間が pigpiod との
+    通信遅延に左右されなくなる。送信前に上書きされた値は破棄(合流)される。
+    Vehicle へ threaded=True で登録すること。
+    """
+    def __init__(self, interval=0.1, debug=False):
+        """
+        メールボックスおよび統計値を初期化する。
+        引数：
+            interval    float   メールボックスが空の場合の待ち合わせ最大時間(秒)
+            debug       boolean デバッグフラグ、デフォルトはFalse
+        戻り値：
+            なし
+        """
+        self.interval = interval
+        self.debug = debug
+        self.mailbox = {}
+        self.cond = threading.Condition()
+        self.flush_lock = threading.Lock()
+        self.inflight_since = None
+        self.running = True
+        self.submitted_count = 0
+        self.coalesced_count = 0
+        self.flushed_count = 0
+        self.last_latency = 0.0
+
+    def submit(self, key, func, *args):
+        """
+        送信対象コマンドをメールボックスへ格納する。同じキーの未送信コマンドが
+        ある場合は上書きする（上書きされた側は送信されない）。
+        引数：
+            key                 ピン・コマンドを識別するキー
+            func                送信時に呼び出す関数（piインスタンスのメソッド）
+            args                func へ渡す引数
+        戻り値：
+            なし
+        """
+        now = time.monotonic()
+        with self.cond:
+            pending = self.mailbox.get(key)
+            if pending is not None:
+                # 滞留時間を正しく計測するため最初に格納された時刻を引き継ぐ
+                now = pending[2]
+                self.coalesced_count += 1
+            self.mailbox[key] = (func, args, now)
+            self.submitted_count += 1
+            self.cond.notify()
+
+    def cancel(self, owner):
+        """
+        指定パーツの未送信コマンドを破棄する。送信中のコマンドがある場合は
+        送信完了を待ってから破棄するため、戻った後に破棄前の値が送信されることはない。
+        引数：
+            owner       int     パーツの id（submit のキーの先頭要素）
+        戻り値：
+            なし
+        """
+        with self.flush_lock:
+            with self.cond:
+                for key in [key for key in self.mailbox if key[0] == owner]:
+                    del self.mailbox[key]
+
+    def flush(self):
+        """
+        メールボックス内の全コマンドを送信する。
+        引数：
+            なし
+        戻り値：
+            なし
+        """
+        with self.flush_lock:
+            with self.cond:
+                mailbox, self.mailbox = self.mailbox, {}
+                if not mailbox:
+                    return
+                self.inflight_since = min(entry[2] for entry in mailbox.values())
+            for func, args, enqueued in mailbox.values():
+                try:
+                    func(*args)
+                except Exception as e:
+                    print('[PIGPIO_DISPATCHER] {}{} failed: {}'.format(
+                        getattr(func, '__name__', str(func)), str(args), str(e)))
+                self.last_latency = time.monotonic() - enqueued
+                self.flushed_count += 1
+            self.inflight_since = None
+
+    def get_queue_age(self):
+        """
+        未送信（送信中含む）コマンドのうち最も古いものの滞留時間を返却する。
+        引数：
+            なし
+        戻り値：
+            age     float   滞留時間(秒)、未送信コマンドがない場合は0.0
+        """
+        now = time.monotonic()
+        with self.cond:
+            oldest = self.inflight_since
+            for entry in self.mailbox.values():
+                if oldest is None or entry[2] < oldest:
+                    oldest = entry[2]
+        return 0.0 if oldest is None else now - oldest
+
+    def update(self):
+        """
+        スレッド処理。メールボックスにコマンドが格納されるたびに送信する。
+        引数：
+            なし
+        戻り値：
+            なし
+        """
+        while self.running:
+            with self.cond:
+                if not self.mailbox:
+                    self.cond.wait(self.interval)
+            self.flush()
+
+    def run_threaded(self):
+        """
+        キュー滞留時間と直近の送信遅延を返却する。
+        引数：
+            なし
+        戻り値：
+            queue_age       float   最も古い未送信コマンドの滞留時間(秒)
+            last_latency    float   直近に送信したコマンドの格納から送信完了までの時間(秒)
+        """
+        return self.get_queue_age(), self.last_latency
+
+    def run(self):
+        """
+        スレッドを使用しない場合、その場で全コマンドを送信する。
+        引数：
+            なし
+        戻り値：
+            queue_age       float   最も古い未送信コマンドの滞留時間(秒)
+            last_latency    float   直近に送信したコマンドの格納から送信完了までの時間(秒)
+        """
+        self.flush()
+        return self.run_threaded()
+
+    def shutdown(self):
+        """
+        スレッドを停止し、残っているコマンドを送信する。
+        引数：
+            なし
+        戻り値：
+            なし
+        """
+        self.running = False
+        with self.cond:
+            self.cond.notify()
+        self.flush()
+        if self.debug:
+            print('[PIGPIO_DISPATCHER] submitted:{}, coalesced:{}, flushed:{}'.format(
+                str(self.submitted_count), str(self.coalesced_count), str(self.flushed_count)))
+
 class PIGPIO_OUT(PIGPIO):
     """
     デジタル出力ピンをあらわすクラス。
     """
-    def __init__(self, pin, pgio=None, debug=False):
+    __slots__ = ()
+
+    def __init__(self, pin, pgio=None, debug=False, **kwargs):
         """
         親コンストラクタ処理後、指定ピンへ０値を出力する。
         引数：
             pin     int     GPIOピン番号(0-31の整数)
             pgio            piインスタンス、Noneの場合生成する
             debug   boolean デバッグフラグ、デフォルトはFalse
+            kwargs          基底クラスPIGPIOへ渡す引数(elision, refresh_interval, dispatcher)
         """
-        import pigpio
-        super().__init__(pin, mode=pigpio.OUTPUT, pgio=pgio, debug=debug)
-        self.pgio.write(self.pin, 0)
+        super().__init__(pin, mode=OUTPUT, pgio=pgio, debug=debug, **kwargs)
+        self.send('write', 0, self.pin, 0)
         if self.debug:
             print('gpio:{} set value 0'.format(str(pin)))
         
@@ -69,21 +715,161 @@ class PIGPIO_OUT(PIGPIO):
         戻り値：
             なし
         """
-        if pulse > 0:
-            self.pgio.write(self.pin, 1)
-            if self.debug:
+        if pulse is not None and pulse > 0:
+            if self.send('write', 1, self.pin, 1) and self.debug:
                 print('gpio:{} set value 1'.format(str(self.pin)))
         else:
-            self.pgio.write(self.pin, 0)
-            if self.debug:
+            if self.send('write', 0, self.pin, 0) and self.debug:
                 print('gpio:{} set value 0'.format(str(self.pin)))
 
+    def stop(self):
+        """
+        書き込み省略とディスパッチャを経由せず、その場で指定ピンへ０を出力する。
+        引数：
+            なし
+        戻り値：
+            なし
+        """
+        self.send_now('write', self.pin, 0)
+
+class PIGPIO_OUT_BANK(PIGPIO):
+    """
+    TB6612 の左右モータ IN1/IN2 ピンおよび STBY ピンを
+    バンク単位（GPIO 0-31）でまとめて出力するクラス。
+    1回の run 呼び出しにつき set_bank_1/clear_bank_1 を
+    それぞれ最大1回だけ発行するため、pigpiod との通信回数を削減でき、
+    左右どちらか一方だけ向きが切り替わった中間状態も発生しない。
+    """
+    def __init__(self, left_in1, left_in2, right_in1, right_in2,
+    stby=None, pgio=None, debug=False, **kwargs):
+        """
+        親コンストラクタ処理後、全対象ピンを出力モードに設定し０値を出力する。
+        STBY ピンが指定されている場合は１を出力し、以降常に１を維持する。
+        引数：
+            left_in1    int     左モータIN1 GPIOピン番号(0-31の整数)
+            left_in2    int     左モータIN2 GPIOピン番号(0-31の整数)
+            right_in1   int     右モータIN1 GPIOピン番号(0-31の整数)
+            right_in2   int     右モータIN2 GPIOピン番号(0-31の整数)
+            stby        int     TB6612 STBY GPIOピン番号(0-31の整数)、Noneの場合は操作しない
+            pgio                piインスタンス、Noneの場合生成する
+            debug       boolean デバッグフラグ、デフォルトはFalse
+            kwargs              基底クラスPIGPIOへ渡す引数(elision, refresh_interval, dispatcher)
+        """
+        super().__init__(None, mode=None, pgio=pgio, debug=debug, **kwargs)
+        self.pins = [left_in1, left_in2, right_in1, right_in2]
+        for pin in self.pins + ([] if stby is None else [stby]):
+            if pin < 0 or pin > 31:
+                raise ValueError('gpio:{} out of bank 1 range [0, 31]'.format(str(pin)))
+            self.call('set_mode', pin, OUTPUT)
+            if self.debug:
+                print('gpio:{} set mode {}'.format(str(pin), str(OUTPUT)))
+        self.stby = stby
+        self.stby_bits = 0 if stby is None else (1 << stby)
+        self.all_bits = 0
+        for pin in self.pins:
+            self.all_bits |= (1 << pin)
+        self.send('clear_bank_1', self.all_bits, self.all_bits)
+        if self.stby_bits:
+            self.send('set_bank_1', self.stby_bits, self.stby_bits)
+        if self.debug:
+            print('gpio bank:{:#010x} set value 0, stby:{:#010x} set value 1'.format(
+                self.all_bits, self.stby_bits))
+
+    def run(self, left_in1, left_in2, right_in1, right_in2):
+        """
+        引数で渡された各値が０より大きい値の場合は１，
+        None含むそうでない場合０として、対象ピンへ一括出力する。
+        STBY ピンは常に１を出力する。
+        引数：
+            left_in1    int     左モータIN1値（0もしくは1）
+            left_in2    int     左モータIN2値（0もしくは1）
+            right_in1   int     右モータIN1値（0もしくは1）
+            right_in2   int     右モータIN2値（0もしくは1）
+        戻り値：
+            なし
+        """
+        set_bits = self.to_set_bits(left_in1, left_in2, right_in1, right_in2)
+        clear_bits = self.all_bits & ~set_bits
+        # 先にクリアすることで IN1/IN2 が同時に１となる瞬間を作らない
+        if clear_bits:
+            self.send('clear_bank_1', clear_bits, clear_bits)
+        if set_bits:
+            self.send('set_bank_1', set_bits, set_bits)
+        if self.debug:
+            print('gpio bank set:{:#010x} clear:{:#010x}'.format(set_bits, clear_bits))
+
+    def to_set_bits(self, left_in1, left_in2, right_in1, right_in2):
+        """
+        １を出力するピンのビット列（STBY ピン含む）を返却する。
+        引数：
+            left_in1    int     左モータIN1値（0もしくは1）
+            left_in2    int     左モータIN2値（0もしくは1）
+            right_in1   int     右モータIN1値（0もしくは1）
+            right_in2   int     右モータIN2値（0もしくは1）
+        戻り値：
+            set_bits    int     １を出力するピンのビット列
+        """
+        set_bits = self.stby_bits
+        for pin, value in zip(self.pins, (left_in1, left_in2, right_in1, right_in2)):
+            if value is not None and value > 0:
+                set_bits |= (1 << pin)
+        return set_bits
+
+    def restore(self):
+        """
+        再接続後の pigpiod へ全対象ピンの出力モードを設定し直し、前回送信値を破棄する。
+        STBY ピンは次回の run で１となる。
+        引数：
+            なし
+        戻り値：
+            なし
+        """
+        self.last_sent.clear()
+        for pin in self.pins + ([] if self.stby is None else [self.stby]):
+            self.call('set_mode', pin, OUTPUT)
+
+    def stop(self):
+        """
+        書き込み省略とディスパッチャを経由せず、その場で STBY ピンを含む全対象ピンへ
+        ０を出力する（clear_bank_1 1回）。次回の run で STBY ピンは再び１となる。
+        引数：
+            なし
+        戻り値：
+            なし
+        """
+        self.send_now('clear_bank_1', self.all_bits | self.stby_bits)
+
+    def shutdown(self):
+        """
+        全対象ピンへ０値を出力し、STBY ピンを０にしてからpiインスタンスを開放する。
+        引数：
+            なし
+        戻り値：
+            なし
+        """
+        if self.pgio is not None:
+            self.call('clear_bank_1', self.all_bits | self.stby_bits)
+        if self.debug:
+            sent_count, elided_count = self.get_elision_stats()
+            print('gpio bank:{:#010x} shutdown (sent:{}, elided:{})'.format(
+                self.all_bits | self.stby_bits, str(sent_count), str(elided_count)))
+        release(self.pgio)
+        self.pgio = None
+
 class PIGPIO_PWM(PIGPIO):
     """
     PWM出力ピンを表すクラス。
+    ハードウェアPWMモードが有効かつ指定ピンがハードウェアPWMに対応する場合
+    (GPIO12/13/18/19)は hardware_PWM で操作し、PWMサイクル値の範囲は
+    HARDWARE_PWM_RANGE となる。
     指定ピンがハードウェアPWMに対応しない場合は、疑似PWMとして操作する。
+    なお GPIO12/18、GPIO13/19 はそれぞれ同じPWMチャネルを共有する。
     """
-    def __init__(self, pin, pgio=None, freq=None, range=None, threshold=0.01, debug=False):
+    __slots__ = ('freq', 'threshold', 'neg_threshold', 'hardware', 'range', 'scale',
+        'latency', 'input_time')
+
+    def __init__(self, pin, pgio=None, freq=None, range=None, threshold=0.01,
+    hardware=False, latency=None, debug=False, **kwargs):
         """
         親クラスのコンストラクタ処理後、指定のピンに対しPWM出力ピンとして設定を行う。
         初期値としてPWMサイクル値をゼロに指定する。
@@ -91,40 +877,97 @@ class PIGPIO_PWM(PIGPIO):
             pin     int     GPIOピン番号、必須
             pgio            piインスタンス、Noneの場合は生成する
             freq    int     PWM Frequency値（Hz）
-            range   int     PWMサイクル値の範囲(25から40,000までの整数)
+            range   int     PWMサイクル値の範囲(25から40,000までの整数)、ハードウェアPWM時は無視
             threshold   float   入力値を0として認識するしきい値(-threshold < value< threshold => 0)
+            hardware    boolean 対応ピンの場合ハードウェアPWMを使用するかどうか、デフォルトはFalse
+            latency     LatencyHistogram    入力から送信までの遅延の記録先、Noneの場合は記録しない
+            kwargs          基底クラスPIGPIOへ渡す引数(elision, refresh_interval, dispatcher)
         """
-        import pigpio
-        super().__init__(pin, mode=pigpio.OUTPUT, pgio=pgio, debug=debug)
+        super().__init__(pin, mode=OUTPUT, pgio=pgio, debug=debug, **kwargs)
+        self.latency = latency
+        self.input_time = None
         self.freq = freq or DEFAULT_FREQ
+        self.threshold = float(threshold)
+        self.neg_threshold = -self.threshold
+        self.hardware = hardware and pin in HARDWARE_PWM_PINS
+        if hardware and not self.hardware and self.debug:
+            print('gpio:{} hardware pwm not supported, use software pwm'.format(str(pin)))
+        if self.hardware:
+            self.range = HARDWARE_PWM_RANGE
+            self.scale = float(self.range)
+            self.send('hardware_PWM', 0, self.pin, self.freq, 0)
+            if self.debug:
+                print('gpio:{} set hardware pwm freq {} cycle 0'.format(str(pin), str(self.freq)))
+            return
+
         self.range = range or DEFAULT_RANGE
+        # to_duty_cycle で毎回 float 変換しないよう事前に求めておく
+        self.scale = float(self.range)
         if self.freq is not None:
-            self.pgio.set_PWM_frequency(self.pin, self.freq)
+            self.call('set_PWM_frequency', self.pin, self.freq)
             if self.debug:
                 print('gpio:{} set pwm freq {}'.format(str(pin), str(self.freq)))
-        self.threshold = threshold
 
         if self.range is not None:
-            self.pgio.set_PWM_range(self.pin, self.range)
+            self.call('set_PWM_range', self.pin, self.range)
             if self.debug:
                 print('gpio:{} set pwm range {}'.format(str(pin), str(self.range)))
         
-        self.pgio.set_PWM_dutycycle(self.pin, 0)
+        self.send('set_PWM_dutycycle', 0, self.pin, 0)
         if self.debug:
             print('gpio:{} set cycle 0'.format(str(pin)))
 
-    def run(self, input_value):
+    def run(self, input_value, input_time=None):
         """
         引数で渡されたpulse値をPWMサイクル値に変換し、指定ピンへ出力する。
+        新しい入力時刻を受け取ったループで送信した場合は、送信までの遅延を記録する
+        （送信が省略された入力や、再送時の古い入力時刻は記録しない）。
         引数：
             input_value float       コントローラ/AIからの入力値
+            input_time  float       入力イベントの時刻(time.monotonic() 基準の秒)、None可
         戻り値：
             なし
         """
         cycle = self.to_duty_cycle(input_value)
-        if self.debug:
+        if self.hardware:
+            sent = self.send('hardware_PWM', cycle, self.pin, self.freq, cycle)
+        else:
+            sent = self.send('set_PWM_dutycycle', cycle, self.pin, cycle)
+        if self.latency is not None and input_time is not None and \
+            input_time != self.input_time:
+            self.input_time = input_time
+            if sent:
+                self.latency.record(input_time)
+        if sent and self.debug:
             print('gpio:{} set cycle {}(input_value:{})'.format(str(self.pin), str(cycle), str(input_value)))
-        self.pgio.set_PWM_dutycycle(self.pin, cycle)
+
+    def restore(self):
+        """
+        再接続後の pigpiod へモード、疑似PWMの場合は周波数と範囲を設定し直し、
+        前回送信値を破棄する。
+        引数：
+            なし
+        戻り値：
+            なし
+        """
+        super().restore()
+        if self.hardware:
+            return
+        self.call('set_PWM_frequency', self.pin, self.freq)
+        self.call('set_PWM_range', self.pin, self.range)
+
+    def stop(self):
+        """
+        書き込み省略とディスパッチャを経由せず、その場でPWMサイクル値を0にする。
+        引数：
+            なし
+        戻り値：
+            なし
+        """
+        if self.hardware:
+            self.send_now('hardware_PWM', self.pin, self.freq, 0)
+        else:
+            self.send_now('set_PWM_dutycycle', self.pin, 0)
 
 
     def to_duty_cycle(self, input_value):
@@ -139,41 +982,407 @@ class PIGPIO_PWM(PIGPIO):
         if input_value is None:
             if self.debug:
                 print('gpio:{} input_value None to zero'.format(str(self.pin)))
-            return int(0)
-        elif abs(float(input_value)) < self.threshold:
+            return 0
+        if input_value.__class__ is not float:
+            input_value = float(input_value)
+        if self.neg_threshold < input_value < self.threshold:
             if self.debug:
                 print('gpio:{} input_value {} to zero'.format(str(input_value), str(self.pin)))
-            return int(0)
-        return int(float(self.range) * float(abs(float(input_value))))
+            return 0
+        if input_value < 0.0:
+            input_value = -input_value
+        return int(self.scale * input_value)
+
+class PIGPIO_MOTOR_SCRIPT(PIGPIO):
+    """
+    TB6612 の左右モータ（IN1/IN2/PWM）を pigpiod 上のスクリプトで
+    まとめて更新するクラス。
+    起動時に store_script でスクリプトを登録し、run 呼び出しごとに
+    run_script を1回だけ発行する。向きピンはバンク単位で一括更新され、
+    2モータ分の更新が pigpiod 内で連続して実行される。
+    スクリプトが使用できない場合は、従来どおりピンごとに送信する。
+    """
+    def __init__(self, left_pwm, left_in1, left_in2, right_pwm, right_in1, right_in2,
+    stby=None, pgio=None, freq=None, range=None, threshold=0.01, hardware=False,
+    use_script=True, debug=False, **kwargs):
+        """
+        各ピンを初期化し、pigpiod へスクリプトを登録する。
+        登録に失敗した場合はピンごとの送信へ切り替える。
+        引数：
+            left_pwm    int     左モータPWM GPIOピン番号
+            left_in1    int     左モータIN1 GPIOピン番号(0-31の整数)
+            left_in2    int     左モータIN2 GPIOピン番号(0-31の整数)
+            right_pwm   int     右モータPWM GPIOピン番号
+            right_in1   int     右モータIN1 GPIOピン番号(0-31の整数)
+            right_in2   int     右モータIN2 GPIOピン番号(0-31の整数)
+            stby        int     TB6612 STBY GPIOピン番号(0-31の整数)、Noneの場合は操作しない
+            pgio                piインスタンス、Noneの場合生成する
+            freq        int     PWM Frequency値（Hz）
+            range       int     PWMサイクル値の範囲(25から40,000までの整数)
+            threshold   float   入力値を0として認識するしきい値
+            hardware    boolean 対応ピンの場合ハードウェアPWMを使用するかどうか
+            use_script  boolean スクリプトを使用するかどうか、Falseの場合はピンごとに送信する
+            debug       boolean デバッグフラグ、デフォルトはFalse
+            kwargs              基底クラスPIGPIOへ渡す引数(elision, refresh_interval, dispatcher)
+        """
+        super().__init__(None, mode=None, pgio=pgio, debug=debug, **kwargs)
+        self.bank = PIGPIO_OUT_BANK(left_in1, left_in2, right_in1, right_in2,
+            stby=stby, pgio=self.pgio, debug=debug, **kwargs)
+        self.left = PIGPIO_PWM(left_pwm, pgio=self.pgio, freq=freq, range=range,
+            threshold=threshold, hardware=hardware, debug=debug, **kwargs)
+        self.right = PIGPIO_PWM(right_pwm, pgio=self.pgio, freq=freq, range=range,
+            threshold=threshold, hardware=hardware, debug=debug, **kwargs)
+        self.script_id = self.store_script() if use_script else None
+
+    def to_script(self):
+        """
+        pigpiod へ登録するスクリプト文字列を生成する。
+        パラメータ p0:クリアするビット列、p1:セットするビット列、
+        p2:左PWMサイクル値、p3:右PWMサイクル値。
+        引数：
+            なし
+        戻り値：
+            script      bytes   スクリプト
+        """
+        commands = ['bc1 p0', 'bs1 p1']
+        for pwm, param in ((self.left, 'p2'), (self.right, 'p3')):
+            if pwm.hardware:
+                commands.append('hp {} {} {}'.format(str(pwm.pin), str(pwm.freq), param))
+            else:
+                commands.append('pwm {} {}'.format(str(pwm.pin), param))
+        return ' '.join(commands).encode()
+
+    def store_script(self):
+        """
+        スクリプトを pigpiod へ登録し、初期化完了を待つ。
+        引数：
+            なし
+        戻り値：
+            script_id   int     スクリプトID、登録できなかった場合None
+        """
+        script = self.to_script()
+        try:
+            script_id = self.call('store_script', script)
+            if script_id < 0:
+                # スクリプトに対応しないバックエンド（fake/gpiod）
+                print('[PIGPIO_MOTOR_SCRIPT] store_script returned {}, use per-pin path'.format(
+                    str(script_id)))
+                return None
+            status = PI_SCRIPT_INITING
+            for _ in range(100):
+                status, _ = self.call('script_status', script_id)
+                if status != PI_SCRIPT_INITING:
+                    break
+                time.sleep(0.01)
+            if status in (PI_SCRIPT_HALTED, PI_SCRIPT_RUNNING,
+                PI_SCRIPT_WAITING):
+                if self.debug:
+                    print('script:{} stored "{}"'.format(str(script_id), script.decode()))
+                return script_id
+            self.call('delete_script', script_id)
+            print('[PIGPIO_MOTOR_SCRIPT] script status {}, use per-pin path'.format(str(status)))
+        except Exception as e:
+            print('[PIGPIO_MOTOR_SCRIPT] store_script failed: {}, use per-pin path'.format(str(e)))
+        return None
+
+    def run(self, left_vref, left_in1, left_in2, right_vref, right_in1, right_in2):
+        """
+        CaterpillerMotorDriver の出力値を各ピンへ出力する。
+        スクリプト使用時は run_script を1回だけ発行する。
+        引数：
+            left_vref       float   左モータVref値（0.0～1.0）
+            left_in1        int     左モータIN1値（0もしくは1）
+            left_in2        int     左モータIN2値（0もしくは1）
+            right_vref      float   右モータVref値（0.0～1.0）
+            right_in1       int     右モータIN1値（0もしくは1）
+            right_in2       int     右モータIN2値（0もしくは1）
+        戻り値：
+            なし
+        """
+        if self.script_id is None:
+            self.bank.run(left_in1, left_in2, right_in1, right_in2)
+            self.left.run(left_vref)
+            self.right.run(right_vref)
+            return
+        set_bits = self.bank.to_set_bits(left_in1, left_in2, right_in1, right_in2)
+        params = (self.bank.all_bits & ~set_bits, set_bits,
+            self.left.to_duty_cycle(left_vref), self.right.to_duty_cycle(right_vref))
+        if self.send('run_script', params, self.script_id, list(params)) and self.debug:
+            print('script:{} run params {}'.format(str(self.script_id), str(params)))
+
+    def restore(self):
+        """
+        再接続後の pigpiod へ各ピンの設定をやり直し、スクリプトを登録し直す。
+        登録済みのスクリプトは再起動した pigpiod には存在しないため、削除しない。
+        登録できなかった場合はピンごとの送信へ切り替える。
+        引数：
+            なし
+        戻り値：
+            なし
+        """
+        self.last_sent.clear()
+        self.bank.check_connection()
+        self.left.check_connection()
+        self.right.check_connection()
+        if self.script_id is not None:
+            self.script_id = self.store_script()
+
+    def stop(self):
+        """
+        未送信のスクリプト実行要求を破棄し、その場で STBY ピンを含む全向きピンへ０、
+        左右のPWMサイクル値へ0を出力する。次回の run は値にかかわらず送信される。
+        引数：
+            なし
+        戻り値：
+            なし
+        """
+        if self.dispatcher is not None:
+            self.dispatcher.cancel(id(self))
+        self.last_sent.clear()
+        self.bank.stop()
+        self.left.stop()
+        self.right.stop()
+
+    def shutdown(self):
+        """
+        スクリプトを削除し、各ピンのパーツをシャットダウンする。
+        引数：
+            なし
+        戻り値：
+            なし
+        """
+        if self.script_id is not None and self.pgio is not None:
+            try:
+                self.call('delete_script', self.script_id)
+            except Exception as e:
+                print('[PIGPIO_MOTOR_SCRIPT] delete_script failed: {}'.format(str(e)))
+            self.script_id = None
+        self.left.shutdown()
+        self.right.shutdown()
+        self.bank.shutdown()
+        super().shutdown()
 
 class PIGPIO_IN(PIGPIO):
     """
     INPUT ピンを操作するための基底クラス。
     """
-    def __init__(self, pin, pgio=None, debug=False):
+    def __init__(self, pin, pgio=None, pull_up_down=None, debug=False, **kwargs):
         """
-        親クラスのコンストラクタを呼び出すだけ。
+        親クラスのコンストラクタを呼び出し、必要であればプルアップ/プルダウンを設定する。
 
         引数：
-            pin     int         GPIOピン番号、必須
-            pgio                piインスタンス、すでに生成している場合のみ指定する 
-            debug   boolean     デバッグフラグ、デフォルトはFalse
+            pin             int         GPIOピン番号、必須
+            pgio                        piインスタンス、すでに生成している場合のみ指定する 
+            pull_up_down    int         PUD_UP/PUD_DOWN/PUD_OFF、Noneの場合は設定しない
+            debug           boolean     デバッグフラグ、デフォルトはFalse
+            kwargs                      PIGPIO へ渡すその他の引数
         戻り値：
             なし
         """
-        import pigpio
-        super().__init__(pin, mode=pigpio.INPUT, pgio=pgio, debug=debug)
+        super().__init__(pin, mode=INPUT, pgio=pgio, debug=debug, **kwargs)
+        self.pull_up_down = pull_up_down
+        if pull_up_down is not None:
+            self.call('set_pull_up_down', pin, pull_up_down)
+            if self.debug:
+                print('gpio:{} set pull up down {}'.format(str(pin), str(pull_up_down)))
+
+    def restore(self):
+        """
+        再接続後の pigpiod へモードとプルアップ/プルダウンを設定し直す。
+        引数：
+            なし
+        戻り値：
+            なし
+        """
+        super().restore()
+        if self.pull_up_down is not None:
+            self.call('set_pull_up_down', self.pin, self.pull_up_down)
     
     def run(self):
         """
         デジタル値を読み取る
         """
-        value = self.pgio.read(self.pin)
+        self.check_connection()
+        value = self.call('read', self.pin)
         if self.debug:
             print('gpio:{} read value {}'.format(str(self.pin), str(value)))
         return value
 
-class PIGPIO_SPI_ADC:
+class PIGPIO_ENCODER(PIGPIO_IN):
+    """
+    pigpio のエッジコールバックでエンコーダのティックを数えるクラス。
+    ティック数と最終ティック時刻は pigpio のコールバックスレッドだけが
+    (count, tick) のタプルとして一度に書き換えるため、ロック不要で読み出せる。
+    Vehicle ループ側は read を発行しないので、高回転でもティックを取りこぼさない。
+    """
+    def __init__(self, pin, pgio=None, edge=None, glitch_us=0,
+    pull_up_down=None, stop_timeout=0.5, debug=False, **kwargs):
+        """
+        エッジコールバックを登録する。
+
+        引数：
+            pin             int     GPIOピン番号、必須
+            pgio                    piインスタンス、Noneの場合共有piインスタンスを使用する
+            edge            int     RISING_EDGE/FALLING_EDGE/EITHER_EDGE、Noneの場合RISING_EDGE
+            glitch_us       int     グリッチフィルタ(マイクロ秒)、0の場合は設定しない
+            pull_up_down    int     PUD_UP/PUD_DOWN/PUD_OFF、Noneの場合は設定しない
+            stop_timeout    float   ティックが途絶えてから速度を0とみなすまでの秒数
+            debug           boolean デバッグフラグ、デフォルトはFalse
+        戻り値：
+            なし
+        """
+        super().__init__(pin, pgio=pgio, pull_up_down=pull_up_down, debug=debug, **kwargs)
+        self.tick_diff = tick_diff
+        self.glitch_us = glitch_us
+        if glitch_us > 0:
+            self.call('set_glitch_filter', pin, glitch_us)
+            if self.debug:
+                print('gpio:{} set glitch filter {}us'.format(str(pin), str(glitch_us)))
+        self.stop_timeout = stop_timeout
+        # (累計ティック数, 最終ティック時刻) コールバックスレッドのみが書き換える
+        self.state = (0, None)
+        self.prev_state = (0, None)
+        self.speed = 0.0
+        self.changed_at = time.monotonic()
+        self.edge = RISING_EDGE if edge is None else edge
+        self.cb = self.call('callback', pin, self.edge, self.on_edge)
+
+    def restore(self):
+        """
+        再接続後の pigpiod へピンとグリッチフィルタを設定し直し、
+        エッジコールバックを登録し直す（旧接続のコールバックは通知されない）。
+        ティック数は引き継ぐ。
+        引数：
+            なし
+        戻り値：
+            なし
+        """
+        super().restore()
+        if self.glitch_us > 0:
+            self.call('set_glitch_filter', self.pin, self.glitch_us)
+        try:
+            self.cb.cancel()
+        except Exception:
+            # 旧接続はクローズ済み
+            pass
+        self.cb = self.call('callback', self.pin, self.edge, self.on_edge)
+
+    def on_edge(self, gpio, level, tick):
+        """
+        pigpio のコールバックスレッドから呼び出され、ティック数を加算する。
+        引数：
+            gpio    int     GPIOピン番号
+            level   int     0/1:エッジ、2:ウォッチドッグタイムアウト
+            tick    int     エッジ検出時刻(マイクロ秒)
+        戻り値：
+            なし
+        """
+        if level == 2:
+            return
+        self.state = (self.state[0] + 1, tick)
+
+    def run(self):
+        """
+        前回呼び出し以降のティック数と速度を返却する。
+        速度はティック間隔（pigpio のタイムスタンプ）から算出するため、
+        ループ周期の揺らぎの影響を受けない。
+        引数：
+            なし
+        戻り値：
+            delta   int     前回呼び出し以降のティック数
+            speed   float   速度(ticks/sec)
+        """
+        self.check_connection()
+        now = time.monotonic()
+        count, tick = self.state
+        prev_count, prev_tick = self.prev_state
+        delta = count - prev_count
+        if delta > 0:
+            if prev_tick is not None:
+                self.speed = delta * 1000000.0 / max(1, self.tick_diff(prev_tick, tick))
+            self.changed_at = now
+            self.prev_state = (count, tick)
+        elif now - self.changed_at >= self.stop_timeout:
+            self.speed = 0.0
+        elif self.speed > 0.0:
+            # ティックが来ていない間は経過時間から速度の上限を見積もる
+            self.speed = min(self.speed, 1.0 / (now - self.changed_at))
+        if self.debug:
+            print('gpio:{} ticks {} speed {}'.format(
+                str(self.pin), str(delta), str(self.speed)))
+        return delta, self.speed
+
+    def shutdown(self):
+        """
+        コールバックを解除し、piインスタンスを開放する。
+        引数：
+            なし
+        戻り値：
+            なし
+        """
+        if self.cb is not None:
+            self.cb.cancel()
+            self.cb = None
+        if self.glitch_us > 0:
+            self.call('set_glitch_filter', self.pin, 0)
+        super().shutdown()
+
+class PIGPIO_TRACK_ENCODER:
+    """
+    左右キャタピラそれぞれのエンコーダ(PIGPIO_ENCODER)をまとめたパーツクラス。
+    """
+    def __init__(self, left_pin, right_pin, pgio=None, distance_per_tick=1.0,
+    edge=None, glitch_us=0, pull_up_down=None, stop_timeout=0.5, debug=False):
+        """
+        左右のエンコーダを生成する。
+
+        引数：
+            left_pin            int     左エンコーダのGPIOピン番号
+            right_pin           int     右エンコーダのGPIOピン番号
+            pgio                        piインスタンス、Noneの場合共有piインスタンスを使用する
+            distance_per_tick   float   1ティックあたりの移動距離、1.0の場合速度はticks/sec
+            edge                int     RISING_EDGE/FALLING_EDGE/EITHER_EDGE
+            glitch_us           int     グリッチフィルタ(マイクロ秒)
+            pull_up_down        int     PUD_UP/PUD_DOWN/PUD_OFF
+            stop_timeout        float   ティックが途絶えてから速度を0とみなすまでの秒数
+            debug               boolean デバッグフラグ
+        戻り値：
+            なし
+        """
+        opts = dict(pgio=pgio, edge=edge, glitch_us=glitch_us,
+            pull_up_down=pull_up_down, stop_timeout=stop_timeout, debug=debug)
+        self.left = PIGPIO_ENCODER(left_pin, **opts)
+        self.right = PIGPIO_ENCODER(right_pin, **opts)
+        self.distance_per_tick = distance_per_tick
+
+    def run(self):
+        """
+        左右それぞれの前回呼び出し以降のティック数と速度を返却する。
+        引数：
+            なし
+        戻り値：
+            left_ticks      int     左のティック数
+            left_speed      float   左の速度(distance_per_tick 単位/sec)
+            right_ticks     int     右のティック数
+            right_speed     float   右の速度(distance_per_tick 単位/sec)
+        """
+        left_ticks, left_speed = self.left.run()
+        right_ticks, right_speed = self.right.run()
+        return left_ticks, left_speed * self.distance_per_tick, \
+            right_ticks, right_speed * self.distance_per_tick
+
+    def shutdown(self):
+        """
+        左右のエンコーダを停止する。
+        引数：
+            なし
+        戻り値：
+            なし
+        """
+        self.left.shutdown()
+        self.right.shutdown()
+
+class PIGPIO_SPI_ADC(PIGPIO_INSTRUMENTED):
     """
     MCP3208CI-P ADコンバータをあらわすクラス。
     """
@@ -184,7 +1393,7 @@ class PIGPIO_SPI_ADC:
         SPI通信を開く。
 
         引数：
-            pi              pigpio piオブジェクト
+            pi              pigpio piオブジェクト、Noneの場合共有piインスタンスを使用する
             vref_volts      Vrefに接続した電圧(V)
             spi_channel     SPIチャネル
             baud            SPI通信速度(bits/sec)
@@ -193,16 +1402,29 @@ class PIGPIO_SPI_ADC:
             なし
         """
         #pigpio.exceptions = debug
-        import pigpio
-        self.pgio = pgio or pigpio.pi()
+        self.pgio = retain(pgio)
         self.vref_volts = vref_volts
         self.debug = debug
         self.spi_channel = spi_channel
-        self.handler = self.pgio.spi_open(spi_channel, spi_baud, spi_flags)
+        self.spi_baud = spi_baud
+        self.spi_flags = spi_flags
+        self.init_stats('spi{}'.format(str(spi_channel)))
+        self.track_connection()
+        self.handler = self.call('spi_open', spi_channel, spi_baud, spi_flags)
         if self.debug:
             print('spi channel:{} set baud {}, flags {}'.format(
                 str(spi_channel), str(spi_baud), str(spi_flags)))
 
+    def restore(self):
+        """
+        再接続後の pigpiod でSPI通信を開き直す（旧接続のハンドルは無効）。
+        引数：
+            なし
+        戻り値：
+            なし
+        """
+        self.handler = self.call('spi_open', self.spi_channel, self.spi_baud, self.spi_flags)
+
     def read_volts(self, channel):
         """
         指定されたチャネルの電圧を取得する。
@@ -212,12 +1434,53 @@ class PIGPIO_SPI_ADC:
         戻り値
             volts       電圧(V)
         """
-        c, raw = self.pgio.spi_xfer(self.handler, [1, (8 + channel)<<4, 0])
+        self.check_connection()
+        c, raw = self.call('spi_xfer', self.handler, [1, (8 + channel)<<4, 0])
         if self.debug:
             print("spi channel:{} xfer c: {0} raw: {1}".format(str(self.spi_channel), c, raw))
         raw2 = ((raw[1] & 3) << 8) + raw[2]
         volts = (raw2 * self.vref_volts ) / float(1023)
         return round(volts, 4)
+
+    def read_all(self, channels):
+        """
+        指定された複数チャネルの電圧をまとめて取得する。
+        全チャネルの変換要求フレームを1回の spi_xfer_frames で転送し
+        （pigpiod へは1往復）、受信バッファを NumPy で一括して電圧値へ変換する。
+        MCP3x08 は変換ごとに CS を一度 HIGH へ戻す必要があるため、
+        1回の SPI 転送へ複数フレームを詰めることはできず、
+        フレームごとの CS の切り替えはバックエンド側（pigpiod/spidev）で行う。
+
+        引数：
+            channels    チャネル(0～7)のリスト
+        戻り値
+            volts       numpy.ndarray   電圧(V)の配列（float32）
+        """
+        import numpy as np
+        self.check_connection()
+        xfers = [[1, (8 + channel)<<4, 0] for channel in channels]
+        if hasattr(self.pgio, 'spi_xfer_frames'):
+            c, buf = self.call('spi_xfer_frames', self.handler, xfers)
+        else:
+            # 利用者が生成した pigpio.pi を渡された場合はフレームごとに転送する
+            c, buf = 0, bytearray()
+            for xfer in xfers:
+                count, raw = self.call('spi_xfer', self.handler, xfer)
+                if count < 0:
+                    c = count
+                    break
+                c += count
+                buf += raw
+        if c != 3 * len(xfers):
+            raise IOError('spi channel:{} xfer channels {} failed: {}'.format(
+                str(self.spi_channel), str(list(channels)), str(c)))
+        frames = np.frombuffer(bytes(buf), dtype=np.uint8).reshape(-1, 3)
+        raw2 = ((frames[:, 1] & 3).astype(np.uint16) << 8) | frames[:, 2]
+        volts = (raw2 * np.float32(self.vref_volts / 1023.0)).astype(np.float32)
+        if self.debug:
+            print('spi channel:{} read_all channels {} volts {}'.format(
+                str(self.spi_channel), str(list(channels)), str(volts)))
+        return volts
     
     def run(self, channel):
         """
@@ -241,18 +1504,181 @@ class PIGPIO_SPI_ADC:
         戻り値：
             なし
         """
-        self.pgio.spi_close(self.handler)
+        self.shutdown()
+    
+    def shutdown(self):
+        """
+        SPIチャネルを閉じ、piインスタンスを開放する。
+        共有piインスタンスの場合は参照を解放し、最後の参照であれば
+        接続をクローズする。
+        引数：
+            なし
+        戻り値：
+            なし
+        """
+        if self.pgio is None:
+            return
+        self.call('spi_close', self.handler)
         if self.debug:
             print('spi channel:{} close'.format(str(self.spi_channel)))
+        release(self.pgio)
         self.pgio = None
-    
-    def shutdown(self):
+        if self.debug:
+            print('spi channel:{} shutdown'.format(str(self.spi_channel)))
+
+class PIGPIO_SPI_ADC_SAMPLER(PIGPIO_SPI_ADC):
+    """
+    PIGPIO_SPI_ADC の指定チャネルを別スレッドで一定周期でサンプリングし、
+    事前確保した NumPy リングバッファへタイムスタンプ付きで格納するクラス。
+    Vehicle ループ側は前回呼び出し以降のサンプルの最小/平均/最大値を
+    受け取るだけなので、ループ周期より短い電流スパイクも取りこぼさない。
+    threaded=True で Vehicle へ追加すること。
+    """
+
+    def __init__(self, channels=(0,), rate_hz=1000, capacity=4096,
+    pgio=None, vref_volts=3.3, spi_channel=0, spi_baud=1000000, spi_flags=0,
+    debug=False):
         """
-        実装なし。
+        SPI通信を開き、リングバッファを確保する。
+
+        引数：
+            channels        サンプリングするチャネル(0～7)のリスト
+            rate_hz         サンプリング周期(Hz)
+            capacity        リングバッファに保持するサンプル数
+            pgio            pigpio piオブジェクト、Noneの場合共有piインスタンスを使用する
+            vref_volts      Vrefに接続した電圧(V)
+            spi_channel     SPIチャネル
+            spi_baud        SPI通信速度(bits/sec)
+            spi_flags       SPI フラグ
+            debug           デバッグフラグ
+        戻り値：
+            なし
+        """
+        import numpy as np
+        super().__init__(pgio=pgio, vref_volts=vref_volts,
+            spi_channel=spi_channel, spi_baud=spi_baud, spi_flags=spi_flags,
+            debug=debug)
+        self.channels = list(channels)
+        self.interval = 1.0 / float(rate_hz)
+        self.capacity = int(capacity)
+        self.values = np.zeros((self.capacity, len(self.channels)), dtype=np.float32)
+        self.times = np.zeros(self.capacity, dtype=np.float64)
+        # 書き込み済みサンプルの累計数（書き込みはサンプリングスレッドのみ）
+        self.count = 0
+        # 前回 run_threaded で読み出した時点の累計数
+        self.read_count = 0
+        self.overruns = 0
+        empty = np.zeros(len(self.channels), dtype=np.float32)
+        self.last = (empty, empty.copy(), empty.copy(), 0)
+        self.running = True
+        self.sampling = False
+
+    def sample(self):
+        """
+        全チャネルを一度だけ読み取り、リングバッファへ格納する。
         引数：
             なし
         戻り値：
             なし
         """
+        volts = self.read_all(self.channels)
+        i = self.count % self.capacity
+        self.values[i] = volts
+        self.times[i] = time.monotonic()
+        # 値を書き終えてから累計数を進める
+        self.count += 1
+
+    def update(self):
+        """
+        スレッドで実行される処理。rate_hz の周期でサンプリングを続ける。
+        処理が周期に間に合わなかった場合は次回の予定時刻を現在時刻へ合わせる。
+        引数：
+            なし
+        戻り値：
+            なし
+        """
+        self.sampling = True
+        next_time = time.monotonic()
+        while self.running:
+            try:
+                self.sample()
+            except Exception as e:
+                if self.debug:
+                    print('[PIGPIO_SPI_ADC_SAMPLER] sample failed: {}'.format(str(e)))
+            next_time += self.interval
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                self.overruns += 1
+                next_time = time.monotonic()
+        self.sampling = False
+
+    def get_window(self):
+        """
+        前回呼び出し以降に格納されたサンプルを返却する。
+        リングバッファ容量を超えた分は古いものから捨てられる。
+        引数：
+            なし
+        戻り値：
+            values      numpy.ndarray   (サンプル数, チャネル数) の電圧値
+            times       numpy.ndarray   各サンプルのタイムスタンプ(time.monotonic)
+        """
+        import numpy as np
+        count = self.count
+        n = min(count - self.read_count, self.capacity)
+        self.read_count = count
+        idx = np.arange(count - n, count) % self.capacity
+        return self.values[idx], self.times[idx]
+
+    def run_threaded(self):
+        """
+        前回呼び出し以降のサンプルをチャネルごとに間引き（最小/平均/最大）して返却する。
+        新しいサンプルがない場合は前回の値を返却する。
+        引数：
+            なし
+        戻り値：
+            mins        numpy.ndarray   チャネルごとの最小電圧(V)
+            means       numpy.ndarray   チャネルごとの平均電圧(V)
+            maxs        numpy.ndarray   チャネルごとの最大電圧(V)
+            samples     int             集計したサンプル数
+        """
+        import numpy as np
+        values, _ = self.get_window()
+        if len(values) > 0:
+            self.last = (values.min(axis=0), values.mean(axis=0, dtype=np.float32),
+                values.max(axis=0), len(values))
+        elif self.last[3] != 0:
+            self.last = self.last[:3] + (0,)
         if self.debug:
-            print('spi channel:{} shutdown'.format(str(self.spi_channel)))
\ No newline at end of file
+            print('[PIGPIO_SPI_ADC_SAMPLER] min {} mean {} max {} samples {}'.format(
+                str(self.last[0]), str(self.last[1]), str(self.last[2]), str(self.last[3])))
+        return self.last
+
+    def run(self):
+        """
+        スレッドを使わない場合は一度だけサンプリングして集計値を返却する。
+        引数：
+            なし
+        戻り値：
+            run_threaded と同じ
+        """
+        self.sample()
+        return self.run_threaded()
+
+    def shutdown(self):
+        """
+        サンプリングスレッドを停止し、SPIチャネルを閉じる。
+        引数：
+            なし
+        戻り値：
+            なし
+        """
+        self.running = False
+        # サンプリング中のSPI転送が終わるのを待ってから閉じる
+        deadline = time.monotonic() + 1.0
+        while getattr(self, 'sampling', False) and time.monotonic() < deadline:
+            time.sleep(0.001)
+        if self.debug and getattr(self, 'overruns', 0) > 0:
+            print('[PIGPIO_SPI_ADC_SAMPLER] overruns {}'.format(str(self.overruns)))
+        super().shutdown()
@@ -0,0 +1,668 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+pigpiod のソケットプロトコルのうち、GPIOパーツが使用するサブセットを
+話すローカルサーバ（スタブ）。
+Raspberry Pi や pigpiod のない開発機で、PIGPIO_OUT/PIGPIO_PWM/PIGPIO_IN/
+PIGPIO_SPI_ADC などのパーツを変更なしで動作・計測するために使用する。
+受信したコマンドはすべてタイムスタンプ付きで記録し、
+応答前に任意の遅延を挿入できる。
+
+Usage:
+    pigpiod_stub.py [--host=<host>] [--port=<port>] [--pipe-dir=<dir>] [--latency=<sec>] [--jitter=<sec>] [--record=<filename>]
+
+Options:
+    -h --help               Show this screen.
+    --host=<host>           Listen address. [default: localhost]
+    --port=<port>           Listen port. [default: 8888]
+    --pipe-dir=<dir>        Also serve the pipe interface (pigpio/pigout fifos) in this directory.
+    --latency=<sec>         Delay inserted before each response. [default: 0.0]
+    --jitter=<sec>          Additional random delay (0 to jitter). [default: 0.0]
+    --record=<filename>     Write the recorded commands as CSV on exit.
+"""
+import collections
+import os
+import random
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+# pigpiod コマンド番号
+CMD_MODES = 0
+CMD_NO = 18
+CMD_MODEG = 1
+CMD_PUD = 2
+CMD_READ = 3
+CMD_WRITE = 4
+CMD_PWM = 5
+CMD_PRS = 6
+CMD_PFS = 7
+CMD_BR1 = 10
+CMD_BC1 = 12
+CMD_BS1 = 14
+CMD_TICK = 16
+CMD_HWVER = 17
+CMD_NB = 19
+CMD_NC = 21
+CMD_PRG = 22
+CMD_PFG = 23
+CMD_PROC = 38
+CMD_PROCD = 39
+CMD_PROCR = 40
+CMD_PROCS = 41
+CMD_PROCP = 45
+CMD_SPIO = 71
+CMD_SPIC = 72
+CMD_SPIX = 75
+CMD_GDC = 83
+CMD_HP = 86
+CMD_FG = 97
+CMD_NOIB = 99
+
+# pigpiod エラーコード/ステータス
+PI_BAD_DUTYCYCLE = -8
+PI_BAD_HANDLE = -25
+PI_BAD_SCRIPT = -47
+PI_BAD_SCRIPT_ID = -48
+PI_UNKNOWN_COMMAND = -88
+PI_SCRIPT_HALTED = 1
+PI_SCRIPT_FAILED = 4
+
+HWVER = 0xa02082
+DEFAULT_PWM_RANGE = 255
+DEFAULT_PWM_FREQ = 800
+
+# スクリプトコマンド名: (コマンド番号, オペランド数)
+SCRIPT_COMMANDS = {
+    'w': (CMD_WRITE, 2),
+    'pwm': (CMD_PWM, 2),
+    'prs': (CMD_PRS, 2),
+    'pfs': (CMD_PFS, 2),
+    'bc1': (CMD_BC1, 1),
+    'bs1': (CMD_BS1, 1),
+    'hp': (CMD_HP, 3),
+    'mils': (None, 1),
+}
+
+# パイプインターフェースのコマンド名: コマンド番号
+PIPE_COMMANDS = {
+    'm': CMD_MODES, 'mg': CMD_MODEG, 'pud': CMD_PUD, 'r': CMD_READ, 'w': CMD_WRITE,
+    'pwm': CMD_PWM, 'prs': CMD_PRS, 'pfs': CMD_PFS, 'prg': CMD_PRG, 'pfg': CMD_PFG,
+    'gdc': CMD_GDC, 'hp': CMD_HP, 'br1': CMD_BR1, 'bc1': CMD_BC1, 'bs1': CMD_BS1,
+    'tick': CMD_TICK, 'hwver': CMD_HWVER, 'no': CMD_NO, 'nb': CMD_NB, 'nc': CMD_NC,
+    'fg': CMD_FG, 'spio': CMD_SPIO, 'spic': CMD_SPIC, 'spix': CMD_SPIX,
+    'proc': CMD_PROC, 'procr': CMD_PROCR, 'procp': CMD_PROCP, 'procs': CMD_PROCS,
+    'procd': CMD_PROCD,
+}
+# pigs のモード文字/プルアップ・ダウン文字 → pigpio の値
+PIPE_MODES = {'r': 0, 'w': 1, '0': 4, '1': 5, '2': 6, '3': 7, '4': 3, '5': 2}
+PIPE_PULLS = {'o': 0, 'd': 1, 'u': 2}
+
+Record = collections.namedtuple('Record', ['t_ns', 'cmd', 'p1', 'p2', 'ext', 'script'])
+
+class PigpiodStubHandler(socketserver.BaseRequestHandler):
+    """
+    1接続分のコマンドを処理するハンドラクラス。
+    NOIB を受信した接続は以降通知用ソケットとして扱う。
+    """
+    def recv_exact(self, size):
+        """
+        指定バイト数を受信する。切断された場合は None を返却する。
+        """
+        buf = b''
+        while len(buf) < size:
+            chunk = self.request.recv(size - len(buf))
+            if not chunk:
+                return None
+            buf += chunk
+        return buf
+
+    def handle(self):
+        """
+        16バイトのコマンドヘッダ（と p3 バイトの拡張データ）を受信し、
+        実行結果を応答する。
+        """
+        server = self.server
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        notify_handle = None
+        try:
+            while True:
+                header = self.recv_exact(16)
+                if header is None:
+                    break
+                cmd, p1, p2, p3 = struct.unpack('IIII', header)
+                ext = b''
+                if p3 > 0:
+                    ext = self.recv_exact(p3)
+                    if ext is None:
+                        break
+                if cmd == CMD_NOIB:
+                    server.record(cmd, p1, p2, ext)
+                    notify_handle = server.open_notify(self.request)
+                    server.delay()
+                    self.request.sendall(struct.pack('IIIi', cmd, p1, p2, notify_handle))
+                    continue
+                if cmd == CMD_NC and notify_handle is not None and p1 == notify_handle:
+                    # 通知用ソケットからの NC には応答しない
+                    server.record(cmd, p1, p2, ext)
+                    break
+                res, data = server.execute(cmd, p1, p2, ext)
+                server.delay()
+                self.request.sendall(struct.pack('IIIi', cmd, p1, p2, res) + data)
+        except OSError:
+            pass
+        finally:
+            if notify_handle is not None:
+                server.close_notify(notify_handle)
+
+class PigpiodStub(socketserver.ThreadingTCPServer):
+    """
+    pigpiod 互換のローカルサーバクラス。
+    GPIOのレベル、PWM、SPI、スクリプト、通知の状態をメモリ上に保持する。
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='localhost', port=8888, latency=0.0, jitter=0.0,
+    record=True, debug=False):
+        """
+        サーバソケットを生成する（待ち受けは start もしくは serve_forever で開始）。
+
+        引数：
+            host        str     待ち受けアドレス
+            port        int     待ち受けポート番号、0の場合は空きポートを使用する
+            latency     float   各応答の前に挿入する遅延(秒)
+            jitter      float   latency に加算するランダム遅延の最大値(秒)
+            record      boolean 受信したコマンドを記録するかどうか
+            debug       boolean デバッグフラグ
+        戻り値：
+            なし
+        """
+        super().__init__((host, port), PigpiodStubHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.recording = record
+        self.debug = debug
+        self.lock = threading.RLock()
+        self.records = []
+        self.modes = {}
+        self.pulls = {}
+        self.levels = 0
+        self.duty = {}
+        self.ranges = {}
+        self.freqs = {}
+        self.glitch = {}
+        self.hardware_pwm = {}
+        self.adc = {}
+        self.spi = {}
+        self.scripts = {}
+        self.notifies = {}
+        self.next_handle = 0
+        self.thread = None
+        self.pipe_dir = None
+
+    @property
+    def port(self):
+        """
+        待ち受けポート番号を返却する。
+        """
+        return self.server_address[1]
+
+    def start(self):
+        """
+        別スレッドで待ち受けを開始する。
+        引数：
+            なし
+        戻り値：
+            self    PigpiodStub     自身
+        """
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        if self.debug:
+            print('[PigpiodStub] listening on {}:{}'.format(
+                str(self.server_address[0]), str(self.port)))
+        return self
+
+    def stop(self):
+        """
+        待ち受けを停止し、サーバソケットを閉じる。
+        引数：
+            なし
+        戻り値：
+            なし
+        """
+        self.shutdown()
+        self.server_close()
+        with self.lock:
+            for notify in self.notifies.values():
+                try:
+                    notify['close']()
+                except OSError:
+                    pass
+            self.notifies.clear()
+        if self.pipe_dir is not None:
+            for name in ('pigpio', 'pigout'):
+                try:
+                    os.unlink(os.path.join(self.pipe_dir, name))
+                except OSError:
+                    pass
+            self.pipe_dir = None
+
+    def delay(self):
+        """
+        設定された遅延を挿入する。
+        """
+        delay = self.latency
+        if self.jitter > 0:
+            delay += random.uniform(0.0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def record(self, cmd, p1, p2, ext, script=None):
+        """
+        受信したコマンドをタイムスタンプ付きで記録する。
+        引数：
+            cmd     int     コマンド番号
+            p1      int     パラメータ1
+            p2      int     パラメータ2
+            ext     bytes   拡張データ
+            script  int     スクリプトから実行された場合はスクリプトID、それ以外はNone
+        戻り値：
+            なし
+        """
+        if self.recording:
+            self.records.append(Record(time.monotonic_ns(), cmd, p1, p2, ext, script))
+
+    def get_records(self):
+        """
+        記録済みコマンドのリストを返却する。
+        """
+        with self.lock:
+            return list(self.records)
+
+    def clear_records(self):
+        """
+        記録済みコマンドを破棄する。
+        """
+        with self.lock:
+            self.records = []
+
+    def dump(self, filename):
+        """
+        記録済みコマンドをCSV形式で書き出す。
+        引数：
+            filename    str     出力ファイルパス
+        戻り値：
+            なし
+        """
+        with open(filename, 'w') as f:
+            f.write('t_ns,cmd,p1,p2,ext,script\n')
+            for r in self.get_records():
+                f.write('{},{},{},{},{},{}\n'.format(
+                    r.t_ns, r.cmd, r.p1, r.p2, r.ext.hex(),
+                    '' if r.script is None else r.script))
+
+    def set_level(self, gpio, level):
+        """
+        GPIOの入力レベルを変更し、監視中の通知ハンドルへレポートを送信する。
+        エンコーダなど外部入力の模擬に使用する。
+        引数：
+            gpio    int     GPIOピン番号(0-31)
+            level   int     0もしくは1
+        戻り値：
+            なし
+        """
+        with self.lock:
+            if level:
+                self.set_levels(self.levels | (1 << gpio))
+            else:
+                self.set_levels(self.levels & ~(1 << gpio))
+
+    def set_adc(self, channel, raw):
+        """
+        SPI ADC の指定チャネルが返却する変換値(0-1023)を設定する。
+        引数：
+            channel     int     ADCチャネル(0-7)
+            raw         int     変換値
+        戻り値：
+            なし
+        """
+        with self.lock:
+            self.adc[channel] = raw & 0x3ff
+
+    def set_levels(self, levels):
+        """
+        バンク1のレベルを更新し、変化したビットを監視している
+        通知ハンドルへレポートを送信する。
+        """
+        levels &= 0xffffffff
+        changed = levels ^ self.levels
+        self.levels = levels
+        if changed == 0:
+            return
+        tick = self.tick()
+        for handle, notify in list(self.notifies.items()):
+            if notify['bits'] & changed == 0:
+                continue
+            notify['seq'] = (notify['seq'] + 1) & 0xffff
+            try:
+                notify['write'](struct.pack('HHII', notify['seq'], 0, tick, levels))
+            except OSError:
+                self.notifies.pop(handle, None)
+
+    def tick(self):
+        """
+        pigpiod と同じくマイクロ秒単位の32ビットティックを返却する。
+        """
+        return (time.monotonic_ns() // 1000) & 0xffffffff
+
+    def open_notify(self, sock):
+        """
+        ソケット接続へ通知ハンドルを割り当てる。
+        """
+        return self.add_notify(sock.sendall, sock.close)
+
+    def add_notify(self, write, close):
+        """
+        通知ハンドルを割り当てる。
+        引数：
+            write   callable    レポートを書き込む関数
+            close   callable    通知先を閉じる関数
+        戻り値：
+            handle  int         通知ハンドル
+        """
+        with self.lock:
+            handle = self.next_handle
+            self.next_handle += 1
+            self.notifies[handle] = {'write': write, 'close': close, 'bits': 0, 'seq': 0}
+            return handle
+
+    def open_pipe_notify(self):
+        """
+        パイプインターフェースの NO コマンド。通知用 fifo (pigpioN) を生成し、
+        通知ハンドルを割り当てる。pigpiod と同じく O_RDWR で開くため、
+        読み取り側が開く前でもブロックしない。
+        """
+        with self.lock:
+            handle = self.next_handle
+            path = os.path.join(self.pipe_dir, 'pigpio{}'.format(handle))
+            if not os.path.exists(path):
+                os.mkfifo(path)
+            fd = os.open(path, os.O_RDWR)
+            def close():
+                os.close(fd)
+                os.unlink(path)
+            return self.add_notify(lambda data: os.write(fd, data), close)
+
+    def serve_pipe(self, pipe_dir):
+        """
+        pipe_dir に pigpio/pigout の fifo を生成し、パイプインターフェースの
+        コマンド処理を別スレッドで開始する。
+        引数：
+            pipe_dir    str     fifo を生成するディレクトリ
+        戻り値：
+            self        PigpiodStub     自身
+        """
+        self.pipe_dir = pipe_dir
+        for name in ('pigpio', 'pigout'):
+            path = os.path.join(pipe_dir, name)
+            if not os.path.exists(path):
+                os.mkfifo(path)
+        # O_RDWR で開き、クライアントの接続/切断に関係なく開いたままにする
+        cmd_fd = os.open(os.path.join(pipe_dir, 'pigpio'), os.O_RDWR)
+        out_fd = os.open(os.path.join(pipe_dir, 'pigout'), os.O_RDWR)
+        threading.Thread(target=self.pipe_loop, args=(cmd_fd, out_fd), daemon=True).start()
+        if self.debug:
+            print('[PigpiodStub] serving pipes in {}'.format(pipe_dir))
+        return self
+
+    def pipe_loop(self, cmd_fd, out_fd):
+        """
+        パイプからコマンドを1行ずつ読み取り、結果を1行で書き込む。
+        """
+        with os.fdopen(cmd_fd, 'rb', 0) as commands:
+            for line in commands:
+                try:
+                    reply = self.execute_text(line.decode('ascii').strip())
+                except (KeyError, ValueError, IndexError, struct.error):
+                    reply = str(PI_UNKNOWN_COMMAND)
+                if reply is None:
+                    continue
+                self.delay()
+                os.write(out_fd, (reply + '\n').encode('ascii'))
+
+    def execute_text(self, text):
+        """
+        pigs 形式のコマンドを実行し、結果行を返却する。
+        引数：
+            text    str     pigs 形式のコマンド
+        戻り値：
+            reply   str     結果行、空行の場合はNone
+        """
+        if not text:
+            return None
+        name, _, rest = text.partition(' ')
+        cmd = PIPE_COMMANDS[name.lower()]
+        if cmd == CMD_PROC:
+            res, data = self.execute(cmd, 0, 0, rest.encode('ascii'))
+            return str(res)
+        args = rest.split()
+        if cmd == CMD_MODES:
+            args[1] = str(PIPE_MODES[args[1].lower()])
+        elif cmd == CMD_PUD:
+            args[1] = str(PIPE_PULLS[args[1].lower()])
+        values = [int(a, 0) for a in args]
+        if cmd == CMD_NO:
+            self.record(cmd, 0, 0, b'')
+            return str(self.open_pipe_notify())
+        if cmd == CMD_NC:
+            self.record(cmd, values[0], 0, b'')
+            with self.lock:
+                notify = self.notifies.pop(values[0], None)
+            if notify is None:
+                return str(PI_BAD_HANDLE)
+            notify['close']()
+            return '0'
+        p1 = values[0] if len(values) > 0 else 0
+        p2 = values[1] if len(values) > 1 else 0
+        ext = b''
+        if cmd == CMD_HP:
+            ext = struct.pack('I', values[2])
+        elif cmd == CMD_SPIO:
+            ext = struct.pack('I', values[2] if len(values) > 2 else 0)
+        elif cmd == CMD_SPIX:
+            p2, ext = 0, bytes(values[1:])
+        elif cmd == CMD_PROCR:
+            p2, ext = 0, struct.pack('{}I'.format(len(values) - 1), *values[1:])
+        res, data = self.execute(cmd, p1, p2, ext)
+        if cmd == CMD_SPIX and res > 0:
+            return ' '.join([str(res)] + [str(b) for b in data])
+        if cmd == CMD_PROCP and res > 0:
+            return ' '.join(str(v) for v in struct.unpack('11i', data))
+        return str(res)
+
+    def close_notify(self, handle):
+        """
+        通知ハンドルを解放する。
+        """
+        with self.lock:
+            self.notifies.pop(handle, None)
+
+    def execute(self, cmd, p1, p2, ext, script=None):
+        """
+        コマンドを実行し、結果を返却する。
+        引数：
+            cmd     int     コマンド番号
+            p1      int     パラメータ1
+            p2      int     パラメータ2
+            ext     bytes   拡張データ
+            script  int     スクリプトから実行された場合はスクリプトID
+        戻り値：
+            res     int     結果コード
+            data    bytes   結果コードに続けて返却するデータ
+        """
+        with self.lock:
+            self.record(cmd, p1, p2, ext, script)
+            if self.debug:
+                print('[PigpiodStub] cmd {} p1 {} p2 {} ext {}'.format(
+                    str(cmd), str(p1), str(p2), ext.hex()))
+            if cmd == CMD_MODES:
+                self.modes[p1] = p2
+            elif cmd == CMD_MODEG:
+                return self.modes.get(p1, 0), b''
+            elif cmd == CMD_PUD:
+                self.pulls[p1] = p2
+            elif cmd == CMD_READ:
+                return (self.levels >> p1) & 1, b''
+            elif cmd == CMD_WRITE:
+                self.duty.pop(p1, None)
+                self.set_level(p1, p2)
+            elif cmd == CMD_PWM:
+                if p2 > self.ranges.get(p1, DEFAULT_PWM_RANGE):
+                    return PI_BAD_DUTYCYCLE, b''
+                self.duty[p1] = p2
+            elif cmd == CMD_PRS:
+                self.ranges[p1] = p2
+                return p2, b''
+            elif cmd == CMD_PFS:
+                self.freqs[p1] = p2
+                return p2, b''
+            elif cmd == CMD_PRG:
+                return self.ranges.get(p1, DEFAULT_PWM_RANGE), b''
+            elif cmd == CMD_PFG:
+                return self.freqs.get(p1, DEFAULT_PWM_FREQ), b''
+            elif cmd == CMD_GDC:
+                return self.duty.get(p1, 0), b''
+            elif cmd == CMD_HP:
+                self.hardware_pwm[p1] = (p2, struct.unpack('I', ext[:4])[0])
+            elif cmd == CMD_BR1:
+                return self.levels, b''
+            elif cmd == CMD_BC1:
+                self.set_levels(self.levels & ~p1)
+            elif cmd == CMD_BS1:
+                self.set_levels(self.levels | p1)
+            elif cmd == CMD_TICK:
+                return self.tick(), b''
+            elif cmd == CMD_HWVER:
+                return HWVER, b''
+            elif cmd == CMD_NB:
+                if p1 not in self.notifies:
+                    return PI_BAD_HANDLE, b''
+                self.notifies[p1]['bits'] = p2
+            elif cmd == CMD_NC:
+                self.notifies.pop(p1, None)
+            elif cmd == CMD_FG:
+                self.glitch[p1] = p2
+            elif cmd == CMD_SPIO:
+                handle = self.next_handle
+                self.next_handle += 1
+                self.spi[handle] = (p1, p2)
+                return handle, b''
+            elif cmd == CMD_SPIC:
+                if self.spi.pop(p1, None) is None:
+                    return PI_BAD_HANDLE, b''
+            elif cmd == CMD_SPIX:
+                if p1 not in self.spi:
+                    return PI_BAD_HANDLE, b''
+                data = self.spi_reply(ext)
+                return len(data), data
+            elif cmd == CMD_PROC:
+                return self.store_script(ext)
+            elif cmd == CMD_PROCR:
+                return self.run_script(p1, ext)
+            elif cmd == CMD_PROCS:
+                if p1 not in self.scripts:
+                    return PI_BAD_SCRIPT_ID, b''
+                self.scripts[p1]['status'] = PI_SCRIPT_HALTED
+            elif cmd == CMD_PROCP:
+                if p1 not in self.scripts:
+                    return PI_BAD_SCRIPT_ID, b''
+                status, params = self.scripts[p1]['status'], self.scripts[p1]['params']
+                return 44, struct.pack('11i', status, *params)
+            elif cmd == CMD_PROCD:
+                if self.scripts.pop(p1, None) is None:
+                    return PI_BAD_SCRIPT_ID, b''
+            else:
+                return PI_UNKNOWN_COMMAND, b''
+            return 0, b''
+
+    def spi_reply(self, data):
+        """
+        MCP3x08 の単一チャネル変換要求([1, (8+ch)<<4, 0])であれば、
+        設定済みの変換値を返却する。それ以外は同じ長さの0を返却する。
+        """
+        if len(data) == 3 and data[0] == 1:
+            raw = self.adc.get((data[1] >> 4) & 7, 512)
+            return bytes([0, (raw >> 8) & 3, raw & 0xff])
+        return bytes(len(data))
+
+    def store_script(self, text):
+        """
+        スクリプトを解析して保存する。対応コマンドは SCRIPT_COMMANDS のみ。
+        """
+        tokens = text.decode('ascii', 'replace').lower().split()
+        program = []
+        i = 0
+        while i < len(tokens):
+            name = tokens[i]
+            if name not in SCRIPT_COMMANDS:
+                return PI_BAD_SCRIPT, b''
+            cmd, nargs = SCRIPT_COMMANDS[name]
+            args = tokens[i + 1:i + 1 + nargs]
+            if len(args) != nargs:
+                return PI_BAD_SCRIPT, b''
+            program.append((name, cmd, args))
+            i += 1 + nargs
+        script_id = self.next_handle
+        self.next_handle += 1
+        self.scripts[script_id] = {'program': program, 'status': PI_SCRIPT_HALTED,
+            'params': [0] * 10}
+        return script_id, b''
+
+    def run_script(self, script_id, ext):
+        """
+        保存済みスクリプトを同期的に実行する。
+        """
+        script = self.scripts.get(script_id)
+        if script is None:
+            return PI_BAD_SCRIPT_ID, b''
+        values = struct.unpack('{}I'.format(len(ext) // 4), ext)
+        script['params'] = list(values) + [0] * (10 - len(values))
+        try:
+            for name, cmd, args in script['program']:
+                args = [script['params'][int(a[1:])] if a.startswith('p') else int(a)
+                    for a in args]
+                if cmd is None:
+                    time.sleep(args[0] / 1000.0)
+                elif cmd == CMD_HP:
+                    self.execute(cmd, args[0], args[1], struct.pack('I', args[2]), script_id)
+                else:
+                    self.execute(cmd, args[0], args[1] if len(args) > 1 else 0, b'', script_id)
+            script['status'] = PI_SCRIPT_HALTED
+        except (ValueError, IndexError):
+            script['status'] = PI_SCRIPT_FAILED
+        return 0, b''
+
+if __name__ == '__main__':
+    from docopt import docopt
+    args = docopt(__doc__)
+    server = PigpiodStub(host=args['--host'], port=int(args['--port']),
+        latency=float(args['--latency']), jitter=float(args['--jitter']),
+        record=args['--record'] is not None)
+    print('pigpiod stub listening on {}:{}'.format(args['--host'], str(server.port)))
+    if args['--pipe-dir'] is not None:
+        server.serve_pipe(args['--pipe-dir'])
+        print('pigpiod stub serving pipes in {}'.format(args['--pipe-dir']))
+    try:
+        server.start()
+        server.thread.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        if args['--record'] is not None:
+            server.dump(args['--record'])
+            print('{} commands written to {}'.format(
+                str(len(server.records)), args['--record']))